@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import signal
 import argparse
 import tempfile
 import configparser
@@ -11,6 +12,11 @@ from os.path import basename, exists, isfile, join, splitext
 
 from libs.TorrentsCli import TorrentsCli
 from libs.Video import Video
+from libs.jobLedger import JobLedger
+from libs.probeCache import ProbeCache
+from libs.probeEngine import ProbeEngine
+from libs.transcodeScheduler import TranscodeScheduler
+from libs.watcher import Watcher
 from libs.commons import TelegramCli, pidFile, removePID, printHelp
 
 from libs.mediaLogger import MediaLogger
@@ -31,6 +37,7 @@ T_HOST          = None
 T_PORT          = 9091
 T_USER          = None
 T_PSW           = None
+T_TIMEOUT       = 30.0
 MAX_SIZE        = 1200.0
 MAX_RES         = '720'
 LANG            = None
@@ -40,6 +47,12 @@ CONFIG_FILE     = None
 TOKEN           = None
 CHAT_ID         = None
 FORCE_EXT       = None
+CACHE_SIZE      = 50000
+SCAN_WORKERS    = 4
+JOBS            = 1
+THREAD_BUDGET   = None
+WATCH           = False
+RECONCILE       = 60
 
 PARSER = argparse.ArgumentParser(version     = '%(prog)s 1.0',
                                  add_help    = True, conflict_handler = 'resolve',
@@ -47,24 +60,31 @@ PARSER = argparse.ArgumentParser(version     = '%(prog)s 1.0',
 
 
 def config_file_read():
+    global CACHE_SIZE
     global CONFIG_FILE
     global DEL_SRC
     global DST_DIR
     global EXTRA
     global FILE_PATH
     global FORCE_EXT
+    global JOBS
     global LANG
     global MASK_DIR
     global MAX_RES
     global MAX_SIZE
     global OUT_EXT
+    global RECONCILE
+    global SCAN_WORKERS
     global SRC_DIR
+    global THREAD_BUDGET
     global TMP_DIR
     global TXT_PATH
     global T_HOST
     global T_PORT
     global T_PSW
+    global T_TIMEOUT
     global T_USER
+    global WATCH
     
     config = configparser.ConfigParser()
     config.read(CONFIG_FILE)
@@ -92,24 +112,31 @@ def config_file_read():
 
 
 def args_extraction(argv):
+    global CACHE_SIZE
     global CONFIG_FILE
     global DEL_SRC
     global DST_DIR
     global EXTRA
     global FILE_PATH
     global FORCE_EXT
+    global JOBS
     global LANG
     global MASK_DIR
     global MAX_RES
     global MAX_SIZE
     global OUT_EXT
+    global RECONCILE
+    global SCAN_WORKERS
     global SRC_DIR
+    global THREAD_BUDGET
     global TMP_DIR
     global TXT_PATH
     global T_HOST
     global T_PORT
     global T_PSW
+    global T_TIMEOUT
     global T_USER
+    global WATCH
 
     e_group = PARSER.add_argument_group('Extra argument')
     g_group = PARSER.add_argument_group('Input Scan')
@@ -121,6 +148,7 @@ def args_extraction(argv):
     e_group.add_argument(       '--extra',       action='store',      default=None,   dest='EXTRA',     type=str,   required=False, metavar='Extra Opt',  nargs='+', help='Set extra parameter (use one of: %s)' % ', '.join(EXTRA_OPTS))
     e_group.add_argument(       '--debug',       action='store_true', default=False,  dest='DEBUG',                 required=False,                       help='Set log level to Debug')
     e_group.add_argument(       '--config',      action='store',      default=None,   dest='CONFIG_FILE',           required=False,                       help='Set Configuration File')
+    e_group.add_argument(       '--cache-size',  action='store',      default=50000,  dest='CACHE_SIZE', type=int,   required=False, metavar='Entries',    help='Max entries in the probe cache, 0 disables it (default=50000)')
     e_group.add_argument('-F',  '--force',       action='store',      default=False,  dest='FORCE_EXT',             required=False,                       help='Force MKV extension')
     g_group.add_argument('-D',  '--delete',      action='store_true', default=False,  dest='DEL_SRC',               required=False,                       help='Delete Source file')
     g_group.add_argument('-s',  '--source',      action='store',      default=None,   dest='SRC_DIR',   type=str,   required=False, metavar='SourcePath', help='Source path used for scan')
@@ -133,19 +161,25 @@ def args_extraction(argv):
                                                                                                                                                                Used if you are running this script outside of Transmission
                                                                                                                                                                This is the local raggiungible path for Transmission downloads
                                                                                                                                                                ''')
+    g_group.add_argument(      '--scan-workers', action='store',      default=4,      dest='SCAN_WORKERS', type=int, required=False, metavar='Workers',    help='Number of files probed in parallel during scan (default=4)')
+    g_group.add_argument('-w', '--watch',        action='store_true', default=False,  dest='WATCH',                 required=False,                       help='Keep running and convert new files as they appear in source and mask paths')
+    g_group.add_argument(      '--reconcile',    action='store',      default=60,     dest='RECONCILE', type=int,   required=False, metavar='Minutes',    help='Minutes between two full scans and Transmission resyncs (default=60)')
     g_group.add_argument('-T', '--txt',          action='store',      default=None,   dest='TXT_PATH',  type=str,   required=False, metavar='TextFile',   help='List of files in a *.txt list')
     g_group.add_argument('-f', '--file',         action='store',      default=None,   dest='FILE_PATH', type=str,   required=False, metavar='SingleFile', help='One shot execution for a single file')
     v_group.add_argument('-e', '--extension',    action='store',      default=None,   dest='OUT_EXT',   type=str,   required=False, metavar='Extension',  help='Extension for output transcoded file')
-    t_group.add_argument(      '--host',         action='store',      default=None,   dest='T_HOST',    type=str,   required=False, metavar='Host',       help='Transmission host address')
+    t_group.add_argument(      '--host',         action='store',      default=None,   dest='T_HOST',    type=str,   required=False, metavar='Host',       help='Transmission host address, comma separated host[:port] list for several daemons')
     t_group.add_argument(      '--port',         action='store',      default=9091,   dest='T_PORT',    type=int,   required=False, metavar='Port',       help='Transmission host port (default=9091)')
     t_group.add_argument(      '--user',         action='store',      default=None,   dest='T_USER',    type=str,   required=False, metavar='User',       help='Transmission username')
     t_group.add_argument(      '--psw',          action='store',      default=None,   dest='T_PSW',     type=str,   required=False, metavar='Password',   help='Transmission password')
+    t_group.add_argument(      '--timeout',      action='store',      default=30.0,   dest='T_TIMEOUT', type=float, required=False, metavar='Seconds',    help='Timeout of each Transmission request, per host (default=30)')
     v_group.add_argument('-S', '--size',         action='store',      default=1200.0, dest='MAX_SIZE',  type=float, required=False, metavar='Size',       help='The minimum file size limit for conversion')
     v_group.add_argument('-r', '--resolution',   action='store',      default='720',  dest='MAX_RES',   type=str,   required=False, metavar='VideoRes',   help='''
                                                                                                                                                                Resolution for output transcoded file.
                                                                                                                                                                The value is one of:
                                                                                                                                                                480, 576, 720, 1080, 2K, WQXGA, SHD, 4K
                                                                                                                                                                ''')
+    v_group.add_argument('-j', '--jobs',         action='store',      default=1,      dest='JOBS',      type=int,   required=False, metavar='Jobs',       help='Number of HandBrakeCLI jobs running in parallel (default=1)')
+    v_group.add_argument(      '--threads',      action='store',      default=None,   dest='THREAD_BUDGET', type=int, required=False, metavar='Threads',    help='Encoder threads shared by all the jobs (default=number of CPUs)')
     v_group.add_argument('-l', '--language',     action='store',      default=None,   dest='LANG',      type=str,   required=False, metavar='Language', nargs='+', help='''
                                                                                                                                                                         List of language needed in the file for start the conversion
                                                                                                                                                                         ''')
@@ -188,6 +222,9 @@ def check_parameters():
     if FILE_PATH and TXT_PATH:
         printHelp('Cannot read list if single file is defined')
 
+    if WATCH and not (SRC_DIR or MASK_DIR):
+        printHelp('Watch mode needs a source and/or a mask directory')
+
     if SRC_DIR:
         if not exists(SRC_DIR):
             printHelp('Source path don\'t exist!')
@@ -230,7 +267,7 @@ def scan_file(filePath):
 
 
 def scan_txt(txtPath):
-    retList = []
+    filePaths = []
 
     logger.info('Evaluating file list: %s' % txtPath)
     with open(txtPath) as f:
@@ -239,44 +276,170 @@ def scan_txt(txtPath):
         for line in lines:
             line_cleaned = line.strip('\r').strip()
             if line_cleaned != '':
-                videoFile = Video(line_cleaned)
-                if videoFile.isVideo: retList.append( videoFile )
+                filePaths.append( line_cleaned )
+
+    retList = ProbeEngine(SCAN_WORKERS).scan(filePaths)
 
     logger.info('Found %d files in the text file' % len(retList))
     return retList
 
 
 def scan_path(videoList, srcDir):
+    filePaths = []
     for path, subdirs, files in walk(srcDir, topdown=True):
         for f in files:
-            try:
-                videoFile = Video( join(path, f) )
-                if videoFile.isVideo:
-                    if videoFile.fileSize >= MAX_SIZE:
-                        videoList.append( videoFile )
-            except Exception:
-                logger.error('Cannot open file \'%s\'' % f, exc_info=True)
-                pass
+            filePaths.append( join(path, f) )
+
+    videoList += ProbeEngine(SCAN_WORKERS).scan(filePaths, minSize=float(MAX_SIZE))
+
+    return videoList
+
+
+def process_video(videoFile, telegram, encoderThreads=None):
+    try:
+        validate_video(videoFile, telegram, encoderThreads)
+    except (Exception, SystemExit) as e:
+        videoFile.set_job_state('failed', error=str(e))
+        raise
+
+
+def validate_video(videoFile, telegram, encoderThreads=None):
+    logger.info('Validating %s' % videoFile.fileName)
+    utils = {}
+    this_lang = []
+
+    if videoFile.probe.isISO:
+        logger.debug('Start Processing ISO file')
+        telegram.send_telegram_notification('Transcoding started for file \'%s\'' % videoFile.fileName)
+        videoFile.setNewResolution(MAX_RES)
+        videoFile.copy_transcode(utils=utils, tmpDir=TMP_DIR, dstDir=DST_DIR, delSrc=DEL_SRC,
+                                 newExtension=OUT_EXT, encoderThreads=encoderThreads)
+        telegram.send_telegram_notification('Transcoding finished for file \'%s\'' % videoFile.fileName)
+        return
+
+    if not videoFile.probe.hasVideo:
+        logger.debug('Missing \'Video\' tag in mediainfo for \'%s\'' % videoFile.fileName)
+        videoFile.set_job_state('skipped')
+        return
+
+    logger.debug('Video original resolution: %dx%d' % (videoFile.width, videoFile.height))
+    logger.debug('Video target resolution: %dx%d' % (Video.RESOLUTIONS[MAX_RES]['X'], Video.RESOLUTIONS[MAX_RES]['Y']))
+
+    if videoFile.height > Video.RESOLUTIONS[MAX_RES]['Y']:
+        if videoFile.probe.audioTracks:
+            this_lang = videoFile.get_video_lang(videoFile.probe.audioTracks)
+            utils['audio_naming'] = this_lang
+
+        if videoFile.lang_exists(this_lang):
+            telegram.send_telegram_notification('Transcoding started for file \'%s\'' % videoFile.fileName)
+            videoFile.setNewResolution(MAX_RES)
+            videoFile.copy_transcode(utils=utils, tmpDir=TMP_DIR, dstDir=DST_DIR, delSrc=DEL_SRC,
+                                     newExtension=OUT_EXT, encoderThreads=encoderThreads)
+            telegram.send_telegram_notification('Transcoding finished for file \'%s\'' % videoFile.fileName)
+        else:
+            videoFile.set_job_state('skipped')
+    else:
+        logger.info('Resolution is less than required. Skipping.')
+        videoFile.set_job_state('skipped')
+
+
+def job_settings():
+    """ The settings a skip depends on, a file skipped under other settings is looked at again """
+    return 'resolution=%s languages=%s' % (MAX_RES, ','.join(sorted(LANG)) if LANG else '')
+
+
+def scan_sources(videoList, transmissionClient):
+    cont = len(videoList)
+
+    if transmissionClient:
+        videoList = transmissionClient.scan_torrents(videoList, SRC_DIR)
+        cont = len(videoList)
+
+    if SRC_DIR:
+        videoList = scan_path(videoList, SRC_DIR)
+        logger.info('Found %d video files during scan' % (len(videoList) - cont))
 
     return videoList
 
 
+def submit_videos(scheduler, telegram, videoList):
+    for videoFile in videoList:
+        try:
+            # the same file can show up more than once, from inotify, a reconciliation scan or a previous run
+            reason = Video.JOB_LEDGER.check(videoFile)
+            if reason:
+                logger.debug('Skipping \'%s\': %s' % (videoFile.fileName, reason))
+                continue
+            videoFile.jobID = Video.JOB_LEDGER.enqueue(videoFile)
+        except (OSError, IOError) as e:
+            # deleted or renamed since it was found, or a torrent file missing locally
+            logger.error('Skipping \'%s\': %s' % (videoFile.filePath, e))
+            continue
+        scheduler.submit(videoFile.fileName, process_video, videoFile, telegram)
+
+
+def watch_sources(watcher, scheduler, telegram, videoList, transmissionClient):
+
+    def submit(videoList):
+        submit_videos(scheduler, telegram, videoList)
+
+    def on_files(paths):
+        srcPaths = [path for path in paths if not MASK_DIR or not path.startswith(join(MASK_DIR, ''))]
+        try:
+            if srcPaths and SRC_DIR:
+                submit(ProbeEngine(SCAN_WORKERS).scan(srcPaths, minSize=float(MAX_SIZE)))
+            if transmissionClient and len(srcPaths) < len(paths):
+                submit(transmissionClient.get_completed_downloads())
+        except Exception as e:
+            # the next event or reconciliation scan picks the files up again
+            logger.error('Cannot submit %d changed files: %s' % (len(paths), e))
+
+    def on_reconcile():
+        try:
+            submit(scan_sources([], transmissionClient))
+        except Exception as e:
+            logger.error('Reconciliation scan failed: %s' % e)
+
+    if SRC_DIR:
+        watcher.add_tree(SRC_DIR)
+    if MASK_DIR:
+        watcher.add_tree(MASK_DIR)
+
+    submit(videoList)
+    watcher.run(on_files, on_reconcile)
+
+
+def stop(scheduler, watcher):
+    if watcher:
+        watcher.stop()
+    if scheduler:
+        scheduler.shutdown(wait=False, cancel=True)
+
+
 def main(argv):
     
     global LANG
 
+    scheduler = None
+    watcher = None
+    transmissionClient = None
+
     try:
-        cont = 0
         videoList = []
 
         telegram = TelegramCli(TOKEN, CHAT_ID)
 
         args_extraction(argv)
 
+        if int(CACHE_SIZE) > 0:
+            Video.PROBE_CACHE = ProbeCache(maxEntries=int(CACHE_SIZE))
+
         if LANG:
             LANG = LANG.lower().split()
             # LANG = [x.lower().strip() for x in LANG]
 
+        Video.JOB_LEDGER = JobLedger(settings=job_settings())
+
         if FILE_PATH:
             videoList = scan_file(FILE_PATH)
 
@@ -284,53 +447,39 @@ def main(argv):
             videoList = scan_txt(TXT_PATH)
 
         if T_HOST:
-            transmissionClient = TorrentsCli(T_USER, T_PSW, T_HOST, T_PORT, maskDir=MASK_DIR, maxSize=MAX_SIZE)
-            videoList = transmissionClient.scan_torrents(videoList, SRC_DIR)
-            cont = len(videoList)
-
-        if SRC_DIR:
-            videoList = scan_path(videoList, SRC_DIR)
-            logger.info('Found %d video files during scan' % (len(videoList) - cont))
+            transmissionClient = TorrentsCli(T_USER, T_PSW, T_HOST, T_PORT, maskDir=MASK_DIR, maxSize=float(MAX_SIZE),
+                                             scanWorkers=SCAN_WORKERS, resyncInterval=int(RECONCILE) * 60,
+                                             timeout=T_TIMEOUT)
 
+        videoList = scan_sources(videoList, transmissionClient)
         logger.info('%d total files in list for evaluating' % len(videoList))
 
-        for videoFile in videoList:
-            logger.info('Validating %s' % videoFile.fileName)
-            utils = {}
-            this_lang = []
-
-            if 'ISO' in videoFile.media_info['General']['Format']:
-                logger.debug('Start Processing ISO file')
-                telegram.send_telegram_notification('Transcoding started for file \'%s\'' % videoFile.fileName)
-                videoFile.setNewResolution(MAX_RES)
-                videoFile.copy_transcode(utils=utils, tmpDir=TMP_DIR, dstDir=DST_DIR, delSrc=DEL_SRC,
-                                         newExtension=OUT_EXT)
-                telegram.send_telegram_notification('Transcoding finished for file \'%s\'' % videoFile.fileName)
-                continue
-
-            if 'Video' not in videoFile.media_info:
-                logger.debug('Missing \'Video\' tag in mediainfo for \'%s\'' % videoFile.fileName)
-                continue
-
-            logger.debug('Video original resolution: %dx%d' % (videoFile.width, videoFile.height))
-            logger.debug('Video target resolution: %dx%d' % (Video.RESOLUTIONS[MAX_RES]['X'], Video.RESOLUTIONS[MAX_RES]['Y']))
+        scheduler = TranscodeScheduler(jobs=int(JOBS), threadBudget=THREAD_BUDGET)
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop(scheduler, watcher))
+        scheduler.start()
 
-            if videoFile.height > Video.RESOLUTIONS[MAX_RES]['Y']:
-                if 'Audio' in videoFile.media_info:
-                    this_lang = videoFile.get_video_lang(videoFile.media_info['Audio'])
-                    utils['audio_naming'] = this_lang
+        if WATCH:
+            watcher = Watcher(reconcileInterval=int(RECONCILE) * 60)
+            watch_sources(watcher, scheduler, telegram, videoList, transmissionClient)
+        else:
+            submit_videos(scheduler, telegram, videoList)
 
-                if videoFile.lang_exists(this_lang):
-                    telegram.send_telegram_notification('Transcoding started for file \'%s\'' % videoFile.fileName)
-                    videoFile.setNewResolution(MAX_RES)
-                    videoFile.copy_transcode(utils=utils, tmpDir=TMP_DIR, dstDir=DST_DIR, delSrc=DEL_SRC,
-                                             newExtension=OUT_EXT)
-                    telegram.send_telegram_notification('Transcoding finished for file \'%s\'' % videoFile.fileName)
-            else: logger.info('Resolution is less than required. Skipping.')
+        scheduler.shutdown(wait=True)
 
+    except KeyboardInterrupt:
+        logger.info('Interrupted, shutting down.')
+        stop(scheduler, watcher)
+        if scheduler:
+            scheduler.shutdown(wait=True)
     except Exception as e:
         logger.error(e.message, exc_info=True)
     finally:
+        if Video.PROBE_CACHE:
+            Video.PROBE_CACHE.close()
+        if Video.JOB_LEDGER:
+            Video.JOB_LEDGER.close()
+        if transmissionClient:
+            transmissionClient.close()
         removePID(PID)
 
 ########################################
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Small RPCs per second through transmissionrpc, DefaultHTTPHandler against PooledHTTPHandler.
+
+session-get calls through Client._request to the stand-in server of tests/rpcserver.py, which
+answers the 409 session-id handshake and Basic or Digest authentication like Transmission does.
+Python 2 and 3.
+
+    python bench/http_keepalive.py [calls]
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+from os.path import abspath, dirname
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from tests.rpcserver import RPCServer
+from transmissionrpc import Client, DefaultHTTPHandler, PooledHTTPHandler
+
+
+def rate(server, handler, calls):
+    login = server.login if server.auth else None
+    password = server.password if server.auth else None
+    client = Client('127.0.0.1', server.port, login, password, http_handler=handler)
+    start = time.time()
+    for _ in range(calls):
+        client._request('session-get')
+    return calls / (time.time() - start)
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print('%d session-get calls, requests/s' % calls)
+    print('%-8s %10s %10s %12s' % ('auth', 'default', 'pooled', 'connections'))
+    for auth in (None, 'basic', 'digest'):
+        server = RPCServer(auth)
+        try:
+            default = rate(server, DefaultHTTPHandler(), calls)
+            server.connections = 0
+            pooled_handler = PooledHTTPHandler()
+            pooled = rate(server, pooled_handler, calls)
+            pooled_handler.close()
+            print('%-8s %10.0f %10.0f %12d' % (auth or 'none', default, pooled, server.connections))
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
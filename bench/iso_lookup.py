@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ISO9660 path lookups: get_file latency and repeated tree() walks on one image object.
+
+Two synthetic images written by tests/isoimage.py: 160 directories of 20 files and 6 directories
+of 700 files, whose listings span many sectors. The first lookup on a new object is timed apart
+from the following ones, which may use what it cached. Pass the root of another checkout to
+measure it instead, e.g. one made with `git worktree add /tmp/before <commit>`. Python 2.
+
+    python bench/iso_lookup.py [root]
+"""
+
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+from os.path import abspath, dirname, join
+
+HERE = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, HERE)
+
+from tests.isoimage import build_image
+
+ROOT = sys.argv[1] if len(sys.argv) > 1 else HERE
+sys.path.insert(0, ROOT)
+
+from iso9660.iso9660 import ISO9660
+
+SHAPES = [('160 dirs x 20 files', 160, 20), ('6 dirs x 700 files', 6, 700)]
+LOOKUPS = 500
+
+
+def timed(function):
+    start = time.time()
+    result = function()
+    return time.time() - start, result
+
+
+def main():
+    tmpDir = tempfile.mkdtemp()
+    try:
+        print '%s: %d lookups' % (ROOT, LOOKUPS)
+        for label, dirs, files in SHAPES:
+            path = join(tmpDir, 'lookup.iso')
+            contents = dict(('/D%03d/FILE%04d.DAT' % (d, f), 'file %d %d' % (d, f))
+                            for d in range(dirs) for f in range(files))
+            build_image(path, contents)
+            names = random.Random(1).sample(sorted(contents), LOOKUPS)
+
+            cd = ISO9660(path)
+            first, data = timed(lambda: cd.get_file(names[0]))
+            assert data == contents[names[0]], names[0]
+            rest, _ = timed(lambda: [cd.get_file(name) for name in names[1:]])
+            walks, _ = timed(lambda: [sum(1 for _ in cd.tree()) for _ in range(10)])
+            print '%-20s first get_file %8.2f ms, then %8.1f us, tree() %6.1f ms' \
+                  % (label, first * 1e3, rest / (LOOKUPS - 1) * 1e6, walks / 10 * 1e3)
+    finally:
+        shutil.rmtree(tmpDir)
+
+
+if __name__ == '__main__':
+    main()
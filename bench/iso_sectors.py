@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ISO9660 sector access: random sector loads, a 4 MB extent read and a full tree walk.
+
+The image is synthetic, 40 directories of 3 subdirectories of 20 files plus a 5 MB VOB, written
+to a temporary directory and read with a hot page cache. Pass the root of another checkout to
+measure it instead, e.g. one made with `git worktree add /tmp/before <commit>`. Python 2.
+
+    python bench/iso_sectors.py [root]
+"""
+
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+from os.path import abspath, dirname, join
+
+HERE = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, HERE)
+
+from tests.isoimage import build_image
+
+ROOT = sys.argv[1] if len(sys.argv) > 1 else HERE
+sys.path.insert(0, ROOT)
+
+from iso9660.iso9660 import ISO9660
+
+EXTENT = 4 * 1024 * 1024
+
+
+def best(function, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main():
+    files = {'/VIDEO_TS/VIDEO_TS.IFO': 'DVDVIDEO-VMG' + '\x00' * 4000,
+             '/VIDEO_TS/VTS_01_1.VOB': '\x00\x00\x01\xba' + 'v' * (5 * 1024 * 1024)}
+    for d in range(40):
+        for s in range(3):
+            for f in range(20):
+                files['/D%03d/S%d/F%04d.DAT' % (d, s, f)] = 'x' * (100 + f)
+
+    tmpDir = tempfile.mkdtemp()
+    try:
+        path = join(tmpDir, 'bench.iso')
+        build_image(path, files)
+        cd = ISO9660(path)
+        image_sectors = cd._pvd['volume_space_size']
+
+        rnd = random.Random(1)
+        sectors = [rnd.randrange(0, image_sectors) for _ in range(20000)]
+
+        def sector_loads():
+            for sector in sectors:
+                cd._get_sector(sector, 2048)
+                cd._unpack('B')
+
+        def extent_reads():
+            for _ in range(20):
+                cd._get_sector(0, EXTENT)
+                cd._unpack_raw(EXTENT)
+
+        def tree_walk():
+            # a new object, nothing cached
+            return sum(1 for _ in ISO9660(path).tree())
+
+        entries = tree_walk()
+        print '%s: %d sectors, %d entries' % (ROOT, image_sectors, entries)
+        print 'random sector load %.2f us, 4 MB extent read %.2f ms, full tree walk %.1f ms' \
+              % (best(sector_loads) / len(sectors) * 1e6, best(extent_reads) / 20 * 1e3, best(tree_walk) * 1e3)
+    finally:
+        shutil.rmtree(tmpDir)
+
+
+if __name__ == '__main__':
+    main()
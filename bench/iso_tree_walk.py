@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ISO9660 directory walk throughput, entries decoded per second by a full tree() walk.
+
+Two synthetic images written by tests/isoimage.py: 160 directories of 15 files, the shape of a
+disc with many small folders, and 6 directories of 700 files, whose listings span many sectors.
+Every walk uses a new ISO9660 object, nothing cached. Pass the root of another checkout to
+measure it instead, e.g. one made with `git worktree add /tmp/before <commit>`. Python 2.
+
+    python bench/iso_tree_walk.py [root]
+"""
+
+import sys
+import time
+import shutil
+import tempfile
+
+from os.path import abspath, dirname, join
+
+HERE = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, HERE)
+
+from tests.isoimage import build_image
+
+ROOT = sys.argv[1] if len(sys.argv) > 1 else HERE
+sys.path.insert(0, ROOT)
+
+from iso9660.iso9660 import ISO9660
+
+SHAPES = [('160 dirs x 15 files', 160, 15), ('6 dirs x 700 files', 6, 700)]
+
+
+def walk(path):
+    return sum(1 for _ in ISO9660(path).tree())
+
+
+def main():
+    tmpDir = tempfile.mkdtemp()
+    try:
+        print '%s: best of 10 walks' % ROOT
+        for label, dirs, files in SHAPES:
+            path = join(tmpDir, 'walk.iso')
+            build_image(path, dict(('/D%03d/FILE%04d.DAT' % (d, f), 'x' * 64)
+                                   for d in range(dirs) for f in range(files)))
+            entries = walk(path)
+            best = None
+            for _ in range(10):
+                start = time.time()
+                walk(path)
+                elapsed = time.time() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print '%-20s %6d entries %8.1f ms %10.0f entries/s' % (label, entries, best * 1e3, entries / best)
+    finally:
+        shutil.rmtree(tmpDir)
+
+
+if __name__ == '__main__':
+    main()
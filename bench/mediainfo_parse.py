@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+mediainfo report parsing: the JSON parser of MediaProbe against the text parser it replaced.
+
+Both run over the reports recorded in tests/fixtures/mediainfo and extract what the scan uses,
+the video height and width and the audio languages.
+
+    python bench/mediainfo_parse.py [rounds]
+"""
+
+import sys
+import timeit
+
+from os import listdir
+from os.path import abspath, dirname, join, splitext
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from libs.mediaProbe import MediaProbe
+
+FIXTURES = join(ROOT, 'tests', 'fixtures', 'mediainfo')
+
+
+def parse_text(output):
+    """ The text parser of Video.get_media_info before the JSON output was used """
+    mainKey = {}
+    category = subCategory = sub = subsub = None
+    # make a dict of it
+    for line in output.splitlines()[:-1]:
+        if ':' not in line and line != '':
+            oldCategory = category
+            subsub = {}
+
+            category = line.strip('\r')
+            if "#" in category:
+                subCategory = category.split('#')[1]
+                category = category.split('#')[0].strip()
+                if oldCategory != category:
+                    sub = []
+            else:
+                sub = {}
+                subCategory = None
+            mainKey[category] = ''
+        elif line == '':
+            if subCategory:
+                sub.append(subsub)
+            mainKey[category] = sub
+        elif ':' in line:
+            if category != "Menu":
+                z = line.split(':', 1)
+                k = z[0].strip('\r').strip()
+                v = z[1].strip('\r').strip()
+            else:
+                z = line.split(' : ', 1)
+                k = z[0].strip('\r').strip()
+                v = z[1].strip('\r').strip()
+            if subCategory:
+                subsub[k] = v
+            else:
+                sub[k] = v
+
+    return mainKey
+
+
+def summary_text(output):
+    media_info = parse_text(output)
+    video = media_info.get('Video')
+    height = int(video['Height'].replace(' ', '').replace('pixels', '')) if video else None
+    width = int(video['Width'].replace(' ', '').replace('pixels', '')) if video else None
+    audio = media_info.get('Audio', [])
+    if not isinstance(audio, list):
+        audio = [audio]
+    return height, width, [a['Language'].lower() for a in audio if 'Language' in a]
+
+
+def summary_json(output):
+    probe = MediaProbe.from_json(output)
+    return probe.height, probe.width, [t.language.lower() for t in probe.audioTracks if t.language]
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    names = sorted(set(splitext(name)[0] for name in listdir(FIXTURES)))
+
+    print '%-8s %12s %12s  %s' % ('fixture', 'text us', 'json us', 'height, width, languages')
+    for name in names:
+        with open(join(FIXTURES, name + '.txt')) as f:
+            text = f.read()
+        with open(join(FIXTURES, name + '.json')) as f:
+            report = f.read()
+
+        # the text parser drops the last section of a report, the audio languages of a file
+        # with one audio track and no subtitles are lost, the video size has to agree
+        from_text, from_json = summary_text(text), summary_json(report)
+        assert from_text[:2] == from_json[:2], (from_text, from_json)
+
+        t_text = min(timeit.repeat(lambda: summary_text(text), number=rounds, repeat=3)) / rounds
+        t_json = min(timeit.repeat(lambda: summary_json(report), number=rounds, repeat=3)) / rounds
+        print '%-8s %12.1f %12.1f  %s%s' % (name, t_text * 1e6, t_json * 1e6, from_json,
+                                            '' if from_text == from_json else ', text: %s' % (from_text[2],))
+
+
+if __name__ == '__main__':
+    main()
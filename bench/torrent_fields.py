@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cost of Torrent objects: build time, memory held and attribute/property access.
+
+10k synthetic torrents of 60 fields each. Pass the root of another checkout to measure it instead,
+e.g. one made with `git worktree add /tmp/before <commit>`. Memory is measured with tracemalloc,
+python 3 only.
+
+    python bench/torrent_fields.py [root] [torrents]
+"""
+from __future__ import print_function
+
+import gc
+import sys
+import time
+
+from os.path import abspath, dirname
+
+ROOT = sys.argv[1] if len(sys.argv) > 1 else dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from transmissionrpc.torrent import Torrent
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def payload(count):
+    torrents = []
+    for i in range(count):
+        fields = {'id': i, 'hashString': '%040x' % i, 'name': 'torrent %d' % i, 'status': 6, 'percentDone': 1.0,
+                  'sizeWhenDone': i * 1000, 'leftUntilDone': 0, 'downloadDir': '/data', 'doneDate': 1500000000,
+                  'peer-limit': 50, 'eta': -1, 'uploadRatio': 1.5, 'downloadLimited': False, 'downloadLimit': 100}
+        for k in range(46):
+            fields['field%02d' % k] = k
+        torrents.append(fields)
+    return torrents
+
+
+def per_call(function, calls, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / calls * 1e9
+
+
+def main():
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    data = payload(count)
+    gc.collect()
+
+    if tracemalloc:
+        tracemalloc.start()
+    start = time.time()
+    torrents = [Torrent(None, fields) for fields in data]
+    build = time.time() - start
+    memory = tracemalloc.get_traced_memory()[0] / 1e6 if tracemalloc else float('nan')
+    if tracemalloc:
+        tracemalloc.stop()
+
+    def attributes():
+        for torrent in torrents:
+            torrent.hashString, torrent.downloadDir, torrent.leftUntilDone, torrent.percentDone, torrent.name
+
+    def properties():
+        for torrent in torrents:
+            torrent.progress, torrent.ratio
+
+    print('%s: %d torrents' % (ROOT, count))
+    print('build %.0f ms, memory %.1f MB, attribute %.0f ns, property %.0f ns'
+          % (build * 1000, memory, per_call(attributes, count * 5), per_call(properties, count * 2)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Size and JSON decoding time of a torrent-get response, all fields against the named profiles.
+
+The response is synthetic, torrents of 1 to 12 files with peers, trackers and pieces filled in
+like a seeding Transmission daemon reports them.
+
+    python bench/torrent_get_profiles.py [torrents]
+"""
+from __future__ import print_function
+
+import sys
+import json
+import time
+import base64
+import random
+
+from os.path import abspath, dirname
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from transmissionrpc.constants import TORRENT_GET_PROFILES
+
+NUMBER_FIELDS = [
+    'activityDate', 'addedDate', 'bandwidthPriority', 'corruptEver', 'dateCreated', 'desiredAvailable',
+    'downloadedEver', 'downloadLimit', 'error', 'eta', 'etaIdle', 'haveUnchecked', 'haveValid',
+    'manualAnnounceTime', 'maxConnectedPeers', 'metadataPercentComplete', 'peer-limit', 'peersConnected',
+    'peersGettingFromUs', 'peersSendingToUs', 'queuePosition', 'rateDownload', 'rateUpload', 'recheckProgress',
+    'secondsDownloading', 'secondsSeeding', 'seedIdleLimit', 'seedIdleMode', 'seedRatioLimit', 'seedRatioMode',
+    'startDate', 'totalSize', 'torrentFile', 'uploadedEver', 'uploadLimit', 'uploadRatio', 'webseedsSendingToUs']
+
+BOOLEAN_FIELDS = ['downloadLimited', 'honorsSessionLimits', 'isFinished', 'isPrivate', 'isStalled', 'uploadLimited']
+
+
+def random_bytes(rnd, length):
+    return bytearray(rnd.getrandbits(8) for _ in range(length))
+
+
+def torrent(rnd, tid):
+    files = rnd.randint(1, 12)
+    fields = {
+        'id': tid,
+        'hashString': '%040x' % rnd.getrandbits(160),
+        'name': 'Show %d' % tid,
+        'status': 6,
+        'percentDone': 1.0,
+        'sizeWhenDone': 10 ** 10,
+        'leftUntilDone': 0,
+        'downloadDir': '/data/downloads',
+        'doneDate': 1500000000,
+        'files': [{'bytesCompleted': 10 ** 9, 'length': 10 ** 9, 'name': 'Show/Season 1/Episode %02d.mkv' % i}
+                  for i in range(files)],
+        'priorities': [0] * files,
+        'wanted': [1] * files,
+        'fileStats': [{'bytesCompleted': 10 ** 9, 'wanted': True, 'priority': 0}] * files,
+        'pieces': base64.b64encode(bytes(random_bytes(rnd, rnd.randint(200, 4000)))).decode('ascii'),
+        'pieceCount': 5000,
+        'pieceSize': 2 ** 21,
+        'peers': [{'address': '10.0.0.%d' % k, 'clientName': 'Transmission 2.94', 'flagStr': 'TEI', 'port': 51413,
+                   'progress': 1.0, 'rateToClient': 0, 'rateToPeer': 1000, 'isEncrypted': True,
+                   'isDownloadingFrom': False, 'isUploadingTo': True, 'clientIsChoked': False,
+                   'clientIsInterested': False, 'peerIsChoked': False, 'peerIsInterested': True,
+                   'isIncoming': False, 'isUTP': True} for k in range(rnd.randint(0, 15))],
+        'trackers': [{'announce': 'udp://tracker%d.example.org:1337/announce' % k, 'id': k,
+                      'scrape': 'udp://tracker%d.example.org:1337/scrape' % k, 'tier': k} for k in range(3)],
+        'trackerStats': [{'announce': 'udp://tracker%d.example.org:1337/announce' % k, 'announceState': 1,
+                          'downloadCount': 100, 'hasAnnounced': True, 'hasScraped': True,
+                          'host': 'udp://tracker%d.example.org:1337' % k, 'id': k, 'isBackup': False,
+                          'lastAnnouncePeerCount': 50, 'lastAnnounceResult': 'Success', 'lastAnnounceStartTime': 0,
+                          'lastAnnounceSucceeded': True, 'lastAnnounceTime': 1500000000,
+                          'lastAnnounceTimedOut': False, 'lastScrapeResult': '', 'lastScrapeStartTime': 0,
+                          'lastScrapeSucceeded': True, 'lastScrapeTime': 1500000000, 'lastScrapeTimedOut': 0,
+                          'leecherCount': 3, 'nextAnnounceTime': 1500001000, 'nextScrapeTime': 1500001000,
+                          'scrape': 'x', 'scrapeState': 1, 'seederCount': 40, 'tier': k} for k in range(3)],
+        'webseeds': [],
+        'comment': 'x' * 80,
+        'creator': 'mktorrent 1.0',
+        'errorString': '',
+        'magnetLink': 'magnet:?xt=urn:btih:' + 'a' * 40 + '&dn=Show&tr=udp%3A%2F%2Ftracker.example.org',
+        'peersFrom': {'fromCache': 0, 'fromDht': 3, 'fromIncoming': 1, 'fromLpd': 0, 'fromLtep': 0, 'fromPex': 2,
+                      'fromTracker': 10},
+    }
+    for key in NUMBER_FIELDS:
+        fields[key] = 12345
+    for key in BOOLEAN_FIELDS:
+        fields[key] = False
+    return fields
+
+
+def response(torrents, keys=None):
+    if keys is not None:
+        torrents = [dict((key, t[key]) for key in keys if key in t) for t in torrents]
+    return json.dumps({'arguments': {'torrents': torrents}, 'result': 'success', 'tag': 1})
+
+
+def decode_time(body, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        json.loads(body)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    rnd = random.Random(1)
+    torrents = [torrent(rnd, tid) for tid in range(count)]
+
+    print('%d torrents, json.loads best of 5' % count)
+    rows = [('all fields', None)] + sorted(TORRENT_GET_PROFILES.items())
+    for label, keys in rows:
+        body = response(torrents, keys)
+        print('%-12s %8.1f MB %8.3f s' % (label, len(body) / 1e6, decode_time(body)))
+
+
+if __name__ == '__main__':
+    main()
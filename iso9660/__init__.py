@@ -1 +1,2 @@
 from iso9660 import *
+from disc import *
@@ -0,0 +1,261 @@
+import struct
+
+from iso9660 import SECTOR_SIZE
+
+DVD_VIDEO = 'DVD-Video'
+BLURAY = 'Blu-ray'
+DATA = 'data'
+
+# root directories telling the kind of disc
+VIDEO_DIRS = {'VIDEO_TS': DVD_VIDEO, 'AUDIO_TS': DVD_VIDEO, 'BDMV': BLURAY}
+
+UDF_ANCHOR_SECTOR = 256
+UDF_MAX_VDS_SECTORS = 32
+
+# UDF descriptor tags
+TAG_ANCHOR = 2
+TAG_PARTITION = 5
+TAG_LOGICAL_VOLUME = 6
+TAG_TERMINATOR = 8
+TAG_FILE_SET = 256
+TAG_FILE_ID = 257
+TAG_FILE_ENTRY = 261
+TAG_EXTENDED_FILE_ENTRY = 266
+
+_uint16 = struct.Struct('<H')
+_uint32 = struct.Struct('<I')
+_short_ad = struct.Struct('<II')
+_long_ad = struct.Struct('<IIH')
+_file_id = struct.Struct('<16xHBBIIH6xH')
+
+
+class SectorReader(object):
+    """ Reads whole sectors of an image file, counting them """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self.reads = 0
+
+    def read(self, sector, count=1):
+        self.reads += count
+        self._file.seek(sector * SECTOR_SIZE)
+        return self._file.read(count * SECTOR_SIZE)
+
+    def close(self):
+        self._file.close()
+
+
+def disc_type(path):
+    """
+    Tell a DVD-Video or Blu-ray image from a data disc by its root directory.
+
+    The ISO9660 root is looked up first, from the primary volume descriptor.
+    Images without one, or without a video directory in it (Blu-ray discs are
+    often UDF only), have their UDF root read through the anchor at sector 256.
+    Neither the path table nor any directory below the root is read.
+    Returns DVD_VIDEO, BLURAY or DATA.
+    """
+    reader = SectorReader(path)
+    try:
+        return _classify(reader.read, _iso_root_names(reader.read)) or \
+            _classify(reader.read, _udf_root_names(reader.read)) or DATA
+    finally:
+        reader.close()
+
+
+def _classify(read, names):
+    for name in names or ():
+        kind = VIDEO_DIRS.get(name.upper())
+        if kind:
+            return kind
+    return None
+
+
+##
+## ISO9660
+##
+
+def _iso_root_names(read):
+    """ Names in the ISO9660 root directory, None without a primary volume descriptor """
+    sector = 0x10
+    while sector < UDF_ANCHOR_SECTOR:
+        data = read(sector)
+        if len(data) < SECTOR_SIZE or data[1:6] != 'CD001' or ord(data[0]) == 255:
+            return None
+        if ord(data[0]) == 1:
+            break
+        sector += 1
+    else:
+        return None
+
+    # root directory record, extent location and length at offsets 2 and 10 of it
+    ex_loc = _uint32.unpack_from(data, 156 + 2)[0]
+    ex_len = _uint32.unpack_from(data, 156 + 10)[0]
+    data = read(ex_loc, max(1, min(ex_len, 16 * SECTOR_SIZE) // SECTOR_SIZE))
+
+    names = []
+    read_pos = 0
+    end = min(ex_len, len(data))
+    while read_pos < end:
+        l0 = ord(data[read_pos])
+        if l0 == 0:
+            read_pos += SECTOR_SIZE - (read_pos % SECTOR_SIZE)
+            continue
+        l2 = ord(data[read_pos + 32])
+        names.append(data[read_pos + 33:read_pos + 33 + l2].split(';')[0])
+        read_pos += l0
+    return names
+
+
+##
+## UDF
+##
+
+def _tag(data, offset=0):
+    return _uint16.unpack_from(data, offset)[0] if len(data) >= offset + 2 else None
+
+
+def _udf_root_names(read):
+    """ Names in the UDF root directory, None without a valid UDF anchor """
+    anchor = read(UDF_ANCHOR_SECTOR)
+    if _tag(anchor) != TAG_ANCHOR:
+        return None
+
+    # main volume descriptor sequence
+    vds_len, vds_loc = _short_ad.unpack_from(anchor, 16)
+    vds = read(vds_loc, min(UDF_MAX_VDS_SECTORS, max(1, vds_len // SECTOR_SIZE)))
+    partitions = {}
+    volume = None
+    for offset in range(0, len(vds) - SECTOR_SIZE + 1, SECTOR_SIZE):
+        tag = _tag(vds, offset)
+        if tag == TAG_PARTITION:
+            partitions[_uint16.unpack_from(vds, offset + 22)[0]] = _uint32.unpack_from(vds, offset + 188)[0]
+        elif tag == TAG_LOGICAL_VOLUME:
+            volume = vds[offset:offset + SECTOR_SIZE]
+        elif tag == TAG_TERMINATOR:
+            break
+    if volume is None or not partitions:
+        return None
+
+    maps = _partition_maps(read, volume, partitions)
+    fsd_len, fsd_lbn, fsd_ref = _long_ad.unpack_from(volume, 248)
+    fsd = _read_block(read, maps, fsd_ref, fsd_lbn)
+    if _tag(fsd) != TAG_FILE_SET:
+        return None
+
+    root_len, root_lbn, root_ref = _long_ad.unpack_from(fsd, 400)
+    entry = _read_block(read, maps, root_ref, root_lbn)
+    directory = _file_data(read, maps, root_ref, entry)
+    if directory is None:
+        return None
+    return _file_ids(directory)
+
+
+def _partition_maps(read, volume, partitions):
+    """
+    Partition reference -> function mapping a logical block to a sector.
+    Blu-ray discs (UDF 2.50) keep their file system in a metadata partition, a file in the physical one.
+    """
+    count = _uint32.unpack_from(volume, 268)[0]
+    maps = []
+    offset = 440
+    for ref in range(min(count, 8)):
+        map_type, map_len = ord(volume[offset]), ord(volume[offset + 1])
+        if map_type == 1:
+            start = partitions.get(_uint16.unpack_from(volume, offset + 4)[0], 0)
+            maps.append(lambda lbn, start=start: start + lbn)
+        elif map_type == 2 and volume[offset + 5:offset + 28].rstrip('\x00') == '*UDF Metadata Partition':
+            start = partitions.get(_uint16.unpack_from(volume, offset + 38)[0], 0)
+            metadata_lbn = _uint32.unpack_from(volume, offset + 40)[0]
+            maps.append(_metadata_map(read, start, metadata_lbn))
+        else:
+            maps.append(None)
+        offset += map_len or 6
+    return maps
+
+
+def _metadata_map(read, start, metadata_lbn):
+    entry = read(start + metadata_lbn)
+    extents = []
+    for length, position in _allocation(entry):
+        extents.append((length // SECTOR_SIZE, start + position))
+
+    def to_sector(lbn):
+        for blocks, sector in extents:
+            if lbn < blocks:
+                return sector + lbn
+            lbn -= blocks
+        return None
+    return to_sector
+
+
+def _read_block(read, maps, ref, lbn):
+    to_sector = maps[ref] if ref < len(maps) else None
+    sector = to_sector(lbn) if to_sector else None
+    return read(sector) if sector is not None else ''
+
+
+def _entry_layout(entry):
+    """ (allocation type, allocation descriptors offset, allocation descriptors length) of a file entry """
+    tag = _tag(entry)
+    if tag == TAG_FILE_ENTRY:
+        l_ea, l_ad = _uint32.unpack_from(entry, 168)[0], _uint32.unpack_from(entry, 172)[0]
+        start = 176 + l_ea
+    elif tag == TAG_EXTENDED_FILE_ENTRY:
+        l_ea, l_ad = _uint32.unpack_from(entry, 208)[0], _uint32.unpack_from(entry, 212)[0]
+        start = 216 + l_ea
+    else:
+        return None
+    return _uint16.unpack_from(entry, 34)[0] & 7, start, l_ad
+
+
+def _allocation(entry):
+    """ (length, logical block) of the short allocation descriptors of a file entry """
+    layout = _entry_layout(entry)
+    if layout is None or layout[0] != 0:
+        return []
+    ad_type, start, l_ad = layout
+    extents = []
+    for offset in range(start, min(start + l_ad, len(entry) - 7), 8):
+        length, position = _short_ad.unpack_from(entry, offset)
+        if length & 0x3FFFFFFF:
+            extents.append((length & 0x3FFFFFFF, position))
+    return extents
+
+
+def _file_data(read, maps, ref, entry):
+    """ First sectors of the data of a file entry, enough for a root directory """
+    layout = _entry_layout(entry)
+    if layout is None:
+        return None
+    ad_type, start, l_ad = layout
+    if ad_type == 3:  # data embedded in the entry
+        return entry[start:start + l_ad]
+    if ad_type == 0:
+        length, lbn = _short_ad.unpack_from(entry, start)
+    elif ad_type == 1:
+        length, lbn, ref = _long_ad.unpack_from(entry, start)
+    else:
+        return None
+    length &= 0x3FFFFFFF
+    to_sector = maps[ref] if ref < len(maps) else None
+    sector = to_sector(lbn) if to_sector else None
+    if sector is None:
+        return None
+    return read(sector, max(1, min(length, 16 * SECTOR_SIZE) // SECTOR_SIZE))[:length]
+
+
+def _file_ids(data):
+    """ Names of the file identifier descriptors of a directory """
+    names = []
+    offset = 0
+    while offset + 38 <= len(data) and _tag(data, offset) == TAG_FILE_ID:
+        _, characteristics, l_fi, _, _, _, l_iu = _file_id.unpack_from(data, offset)
+        name = data[offset + 38 + l_iu:offset + 38 + l_iu + l_fi]
+        if name and not characteristics & 8:  # not the parent entry
+            if ord(name[0]) == 16:
+                names.append(name[1:].decode('utf-16-be').encode('utf-8'))
+            else:
+                names.append(name[1:])
+        offset += (38 + l_iu + l_fi + 3) & ~3
+    return names
@@ -1,6 +1,10 @@
-import urllib
+import io
+import mmap
 import struct
 import datetime
+from collections import OrderedDict
+
+from remote import RangeFetcher, BlockCache, BLOCK_SIZE, CACHE_BLOCKS, READ_AHEAD
 
 try:
     from cStringIO import StringIO
@@ -8,6 +12,89 @@ except ImportError:
     from StringIO import StringIO
 
 SECTOR_SIZE = 2048
+DIR_CACHE_SIZE = 256  # directory listings kept in memory
+FILE_CHUNK_SIZE = 32 * SECTOR_SIZE  # bytes fetched at once by ISO9660File from remote images
+
+_structs = {}
+
+
+def _struct(st):
+    """ struct.Struct for a format, compiled once """
+    s = _structs.get(st)
+    if s is None:
+        s = _structs[st] = struct.Struct(st)
+    return s
+
+
+def _dir_datetime(date):
+    epoch = datetime.datetime(1970, 1, 1)
+    t = list(struct.unpack('<6Bb', date))
+    t[0] += 1900
+    t_offset = t.pop(-1) * 15 * 60.  # Offset from GMT in 15min intervals, converted to secs
+    t_timestamp = (datetime.datetime(*t) - epoch).total_seconds() - t_offset
+    t_datetime = datetime.datetime.fromtimestamp(t_timestamp)
+    t_readable = t_datetime.strftime('%Y-%m-%d %H:%M:%S')
+    return t_readable
+
+
+class Record(object):
+    """ Slotted record, also readable as a dictionary for compatibility """
+    __slots__ = []
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+
+class PathRecord(Record):
+    """ Path table entry """
+    __slots__ = ['ex_loc', 'ex_len', 'parent', 'name']
+
+    def __init__(self, ex_loc, parent, name):
+        self.ex_loc = ex_loc
+        self.ex_len = None
+        self.parent = parent
+        self.name = name
+
+
+class DirRecord(Record):
+    """ Directory record, a file or folder. Its date is decoded on first access """
+    __slots__ = ['ex_loc', 'ex_len', 'flags', 'interleave_unit_size', 'interleave_gap_size', 'volume_sequence',
+                 'name', '_date', '_datetime']
+
+    # length, extended attribute length, extent location, extent length, date, flags, unit size, gap size,
+    # volume sequence and name length. Both-endian fields are read from their little-endian half.
+    HEADER = struct.Struct('<BBI4xI4x7sBBBH2xB')
+
+    @classmethod
+    def unpack_from(cls, data, offset=0):
+        (_, _, ex_loc, ex_len, date, flags, unit_size, gap_size, volume_sequence,
+         l2) = cls.HEADER.unpack_from(data, offset)
+        d = cls()
+        d.ex_loc = ex_loc
+        d.ex_len = ex_len
+        d.flags = flags
+        d.interleave_unit_size = unit_size
+        d.interleave_gap_size = gap_size
+        d.volume_sequence = volume_sequence
+        start = offset + cls.HEADER.size
+        d.name = data[start:start + l2].rstrip(' ').split(';')[0]
+        if d.name == '\x00':
+            d.name = ''
+        d._date = date
+        d._datetime = None
+        return d
+
+    @property
+    def datetime(self):
+        if self._datetime is None:
+            self._datetime = _dir_datetime(self._date)
+        return self._datetime
 
 
 class ISO9660IOError(IOError):
@@ -18,17 +105,130 @@ class ISO9660IOError(IOError):
         return 'Path not found: %s' % self.path
 
 
+class ISO9660File(io.RawIOBase):
+    """
+    Read-only, seekable file inside an image, see ISO9660.open_file.
+    readinto copies straight from the mapped image into the caller's buffer, remote images are fetched
+    FILE_CHUNK_SIZE bytes at a time. Nothing is kept between reads.
+    """
+
+    def __init__(self, iso, record, name):
+        io.RawIOBase.__init__(self)
+        self.name = name
+        self._iso = iso
+        self._ex_loc = record.ex_loc
+        self._size = record.ex_len
+        self._pos = 0
+
+    def __len__(self):
+        return self._size
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self._checkClosed()
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError('invalid whence (%r)' % whence)
+        if pos < 0:
+            raise IOError('negative seek position %d' % pos)
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        self._checkClosed()
+        n = max(0, min(len(b), self._size - self._pos))
+        if n == 0:
+            return 0
+        start = self._ex_loc * SECTOR_SIZE + self._pos
+        view = memoryview(b)
+        if self._iso._mmap is not None:
+            # shorter than n, or empty, past the end of a truncated image
+            data = buffer(self._iso._mmap, start, n)
+            n = len(data)
+            view[:n] = data
+        else:
+            if self._iso._get_sector == self._iso._get_sector_file:
+                raise ValueError('I/O operation on closed ISO9660 image')
+            done = 0
+            while done < n:
+                # sector aligned chunks, the first one may start inside a sector
+                sector, skip = divmod(start + done, SECTOR_SIZE)
+                length = min(FILE_CHUNK_SIZE - skip, n - done)
+                self._iso._get_sector(sector, skip + length)
+                self._iso._unpack_raw(skip)
+                chunk = self._iso._unpack_raw(length)
+                view[done:done + len(chunk)] = chunk
+                done += len(chunk)
+                if len(chunk) < length:  # the image is truncated
+                    break
+            n = done
+        self._pos += n
+        return n
+
+
 class ISO9660(object):
-    def __init__(self, url):
+    def __init__(self, url, block_size=BLOCK_SIZE, cache_blocks=CACHE_BLOCKS, read_ahead=READ_AHEAD):
         self._buff = None  # input buffer
         self._root = None  # root node
         self._pvd = {}  # primary volume descriptor
         self._paths = []  # path table
+        self._file = None  # image file, kept open for the life of the object
+        self._mmap = None  # read-only map of the image file
+        self._remote = None  # block cache over a remote image
+        self._dirs = {}  # full directory path -> path table record
+        self._path_children = {}  # path table index -> [(index, record)] of its subdirectories
+        self._dir_cache = OrderedDict()  # extent location -> (children, children by name), least recent first
 
         self._url = url
         if not hasattr(self, '_get_sector'):  # it might have been set by a subclass
             self._get_sector = self._get_sector_url if url.startswith('http') else self._get_sector_file
 
+        try:
+            if self._get_sector == self._get_sector_file:
+                self._open_file()
+            elif self._get_sector == self._get_sector_url:
+                self._remote = BlockCache(RangeFetcher(url), block_size, cache_blocks, read_ahead)
+            self._read_descriptors()
+        except:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        if self._buff:
+            self._buff.close()
+            self._buff = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._remote is not None:
+            self._remote.close()
+            self._remote = None
+
+    def _read_descriptors(self):
         ### Volume Descriptors
         sector = 0x10
         while True:
@@ -48,24 +248,33 @@ class ISO9660(object):
         self._get_sector(self._pvd['path_table_l_loc'], l0)
 
         while l0 > 0:
-            p = {}
-            l1 = self._unpack('B')
-            l2 = self._unpack('B')
-            p['ex_loc'] = self._unpack('<I')
-            p['parent'] = self._unpack('<H')
-            p['name'] = self._unpack_string(l1)
-            if p['name'] == '\x00':
-                p['name'] = ''
+            l1, l2, ex_loc, parent = self._unpack('<BBIH')
+            name = self._unpack_string(l1)
+            if name == '\x00':
+                name = ''
 
             if l1 % 2 == 1:
                 self._unpack('B')
 
-            self._paths.append(p)
+            self._paths.append(PathRecord(ex_loc, parent, name))
 
             l0 -= 8 + l1 + (l1 % 2)
 
         assert l0 == 0
 
+        self._index_paths()
+
+    def _index_paths(self):
+        # parents come before their children in the path table
+        full = []
+        for i, p in enumerate(self._paths):
+            if i == 0:
+                full.append('')
+                continue
+            full.append('%s/%s' % (full[p.parent - 1], p.name) if p.parent > 1 else p.name)
+            self._dirs.setdefault(full[i], p)
+            self._path_children.setdefault(p.parent, []).append((i, p))
+
     ##
     ## Generator listing available files/folders
     ##
@@ -82,25 +291,33 @@ class ISO9660(object):
 
     def _tree_path(self, name, index):
         spacer = lambda s: '%s/%s' % (name, s)
-        for i, c in enumerate(self._paths):
-            if c['parent'] == index and i != 0:
-                yield spacer(c['name'])
-                for d in self._tree_path(spacer(c['name']), i + 1):
-                    yield d
+        for i, c in self._path_children.get(index, []):
+            yield spacer(c.name)
+            for d in self._tree_path(spacer(c.name), i + 1):
+                yield d
 
     def _tree_node(self, node):
-        spacer = lambda s: '%s/%s' % (node['name'], s)
-        for c in list(self._unpack_dir_children(node)):
-            yield spacer(c['name'])
-            if c['flags'] & 2:
+        spacer = lambda s: '%s/%s' % (node.name, s)
+        for c in self._dir_listing(node)[0]:
+            yield spacer(c.name)
+            if c.flags & 2:
                 for d in self._tree_node(c):
                     yield spacer(d)
 
     ##
-    ## Retrieve file contents as a string
+    ## Retrieve file contents as a string, or as a file object
     ##
 
     def get_file(self, path):
+        f = self._file_record(path)
+        self._get_sector(f.ex_loc, f.ex_len)
+        return self._unpack_raw(f.ex_len)
+
+    def open_file(self, path):
+        """ File object streaming the file at path, for files too big to be read at once """
+        return ISO9660File(self, self._file_record(path), path)
+
+    def _file_record(self, path):
         path = path.upper().strip('/').split('/')
         path, filename = path[:-1], path[-1]
 
@@ -112,45 +329,43 @@ class ISO9660(object):
             except ISO9660IOError:
                 parent_dir = self._dir_record_by_root(path)
 
-        f = self._search_dir_children(parent_dir, filename)
-
-        self._get_sector(f['ex_loc'], f['ex_len'])
-        return self._unpack_raw(f['ex_len'])
+        return self._search_dir_children(parent_dir, filename)
 
     ##
     ## Methods for retrieving partial contents
     ##
 
     def _get_sector_url(self, sector, length):
-        start = sector * SECTOR_SIZE
-        if self._buff:
-            self._buff.close()
-        opener = urllib.FancyURLopener()
-        opener.http_error_206 = lambda *a, **k: None
-        opener.addheader('Range', 'bytes=%d-%d' % (start, start + length - 1))
-        self._buff = opener.open(self._url)
+        if self._remote is None:
+            raise ValueError('I/O operation on closed ISO9660 image')
+        self._buff = StringIO(self._remote.read(sector * SECTOR_SIZE, length))
+
+    def _open_file(self):
+        self._file = open(self._url, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
 
     def _get_sector_file(self, sector, length):
-        with open(self._url, 'rb') as f:
-            f.seek(sector * SECTOR_SIZE)
-            self._buff = StringIO(f.read(length))
+        if self._mmap is None:
+            raise ValueError('I/O operation on closed ISO9660 image')
+        # cStringIO reads straight from the buffer object, the sector is not copied
+        self._buff = StringIO(buffer(self._mmap, sector * SECTOR_SIZE, length))
+
+    def _read_extent(self, sector, length):
+        """ length bytes from sector on, as a buffer over the image when it is mapped """
+        if self._mmap is not None:
+            return buffer(self._mmap, sector * SECTOR_SIZE, length)
+        self._get_sector(sector, length)
+        return self._unpack_raw(length)
 
     ##
     ## Return the record for final directory in a path
     ##
 
     def _dir_record_by_table(self, path):
-        for e in self._paths[::-1]:
-            search = list(path)
-            f = e
-            while f['name'] == search[-1]:
-                search.pop()
-                f = self._paths[f['parent'] - 1]
-                if f['parent'] == 1:
-                    e['ex_len'] = SECTOR_SIZE  # TODO
-                    return e
-
-        raise ISO9660IOError(path)
+        e = self._dirs.get('/'.join(path))
+        if e is None:
+            raise ISO9660IOError(path)
+        return e
 
     def _dir_record_by_root(self, path):
         current = self._root
@@ -208,62 +423,49 @@ class ISO9660(object):
         if l0 == 0:
             return read + 1, None
 
-        l1 = self._unpack('B')
-
-        d = dict()
-        d['ex_loc'] = self._unpack_both('I')
-        d['ex_len'] = self._unpack_both('I')
-        d['datetime'] = self._unpack_dir_datetime()
-        d['flags'] = self._unpack('B')
-        d['interleave_unit_size'] = self._unpack('B')
-        d['interleave_gap_size'] = self._unpack('B')
-        d['volume_sequence'] = self._unpack_both('h')
-
-        l2 = self._unpack('B')
-        d['name'] = self._unpack_string(l2).split(';')[0]
-        if d['name'] == '\x00':
-            d['name'] = ''
+        return read + l0, DirRecord.unpack_from(chr(l0) + self._unpack_raw(l0 - 1))
+
+    # Children of the directory record d and the same by name, directories recently listed are cached
+    def _dir_listing(self, d):
+        listing = self._dir_cache.pop(d.ex_loc, None)
+        if listing is None:
+            children = list(self._unpack_dir_children(d))
+            by_name = {}
+            for c in children:
+                by_name.setdefault(c.name, c)
+            listing = (children, by_name)
+            if len(self._dir_cache) >= DIR_CACHE_SIZE:
+                self._dir_cache.popitem(last=False)
+        self._dir_cache[d.ex_loc] = listing
+        return listing
 
-        if l2 % 2 == 0:
-            self._unpack('B')
-
-        t = 34 + l2 - (l2 % 2)
+    # Assuming d is a directory record, this generator yields its children
+    def _unpack_dir_children(self, d):
+        data = self._read_extent(d.ex_loc, SECTOR_SIZE)
+        r_self = DirRecord.unpack_from(data)
+        d.ex_len = r_self.ex_len  # path table records come without it
+        if r_self.ex_len > SECTOR_SIZE:
+            data = self._read_extent(d.ex_loc, r_self.ex_len)
+        size = min(r_self.ex_len, len(data))
 
-        e = l0 - t
-        if e > 0:
-            extra = self._unpack_raw(e)
+        read = ord(data[0])  # skip the self record
+        read += ord(data[read])  # and the parent one
 
-        return read + l0, d
+        while read < size:  # Iterate over files in the directory
+            l0 = ord(data[read])
 
-    # Assuming d is a directory record, this generator yields its children
-    def _unpack_dir_children(self, d):
-        sector = d['ex_loc']
-        read = 0
-        self._get_sector(sector, 2048)
-
-        read, r_self = self._unpack_record(read)
-        read, r_parent = self._unpack_record(read)
-
-        while read < r_self['ex_len']:  # Iterate over files in the directory
-            if read % 2048 == 0:
-                sector += 1
-                self._get_sector(sector, 2048)
-            read, data = self._unpack_record(read)
-
-            if data == None:  # end of directory listing
-                to_read = 2048 - (read % 2048)
-                self._unpack_raw(to_read)
-                read += to_read
+            if l0 == 0:  # end of the records in this sector
+                read += SECTOR_SIZE - (read % SECTOR_SIZE)
             else:
-                yield data
+                yield DirRecord.unpack_from(data, read)
+                read += l0
 
     # Search for one child amongst the children
     def _search_dir_children(self, d, term):
-        for e in self._unpack_dir_children(d):
-            if e['name'] == term:
-                return e
-
-        raise ISO9660IOError(term)
+        e = self._dir_listing(d)[1].get(term)
+        if e is None:
+            raise ISO9660IOError(term)
+        return e
 
     ##
     ## Datatypes
@@ -272,12 +474,10 @@ class ISO9660(object):
     def _unpack_raw(self, l):
         return self._buff.read(l)
 
-    # both-endian
+    # both-endian, only the little-endian half is decoded
     def _unpack_both(self, st):
-        a = self._unpack('<' + st)
-        b = self._unpack('>' + st)
-        assert a == b
-        return a
+        s = _struct('<' + st)
+        return s.unpack_from(self._buff.read(2 * s.size))[0]
 
     def _unpack_string(self, l):
         return self._buff.read(l).rstrip(' ')
@@ -285,7 +485,8 @@ class ISO9660(object):
     def _unpack(self, st):
         if st[0] not in ('<', '>'):
             st = '<' + st
-        d = struct.unpack(st, self._buff.read(struct.calcsize(st)))
+        s = _struct(st)
+        d = s.unpack(self._buff.read(s.size))
         if len(st) == 2:
             return d[0]
         else:
@@ -295,20 +496,12 @@ class ISO9660(object):
         return self._unpack_raw(17)  # TODO
 
     def _unpack_dir_datetime(self):
-        epoch = datetime.datetime(1970, 1, 1)
-        date = self._unpack_raw(7)
-        t = [struct.unpack('<B', i)[0] for i in date[:-1]]
-        t.append(struct.unpack('<b', date[-1])[0])
-        t[0] += 1900
-        t_offset = t.pop(-1) * 15 * 60.  # Offset from GMT in 15min intervals, converted to secs
-        t_timestamp = (datetime.datetime(*t) - epoch).total_seconds() - t_offset
-        t_datetime = datetime.datetime.fromtimestamp(t_timestamp)
-        t_readable = t_datetime.strftime('%Y-%m-%d %H:%M:%S')
-        return t_readable
+        return _dir_datetime(self._unpack_raw(7))
 
 
 if __name__ == '__main__':
     import sys
+    import shutil
 
     if len(sys.argv) < 2:
         print 'usage: python iso9660.py isourl [path]'
@@ -317,7 +510,7 @@ if __name__ == '__main__':
         ret_path = sys.argv[2] if len(sys.argv) > 2 else None
         cd = ISO9660(iso_path)
         if ret_path:
-            sys.stdout.write(cd.get_file(ret_path))
+            shutil.copyfileobj(cd.open_file(ret_path), sys.stdout, FILE_CHUNK_SIZE)
         else:
             for path in cd.tree():
                 print path
@@ -0,0 +1,188 @@
+import base64
+import socket
+import httplib
+import urlparse
+from collections import OrderedDict
+
+BLOCK_SIZE = 64 * 1024  # bytes per cached block
+CACHE_BLOCKS = 256  # blocks kept in memory, 16 MB with the default block size
+READ_AHEAD = 4  # blocks fetched past the last one asked for
+MAX_REDIRECTS = 5
+REDIRECTS = (301, 302, 303, 307, 308)
+PERMANENT_REDIRECTS = (301, 308)  # the only ones moving the image for the following requests
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class RangeFetcher(object):
+    """ Byte ranges of a remote file, fetched over one persistent HTTP connection """
+
+    def __init__(self, url, timeout=60):
+        self.url = url
+        self.timeout = timeout
+        self.size = None  # size of the whole file, once a response told it
+        self.requests = 0
+        self.bytes_received = 0
+        self._conn = None
+        self._conn_key = None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def fetch(self, start, length):
+        """ length bytes from start on, less at the end of the file """
+        try:
+            return self._fetch(start, length)
+        except (httplib.HTTPException, socket.error):
+            # the server may have dropped the idle connection, retry once on a new one
+            self.close()
+            return self._fetch(start, length)
+
+    def _connection(self, parts):
+        key = (parts.scheme, parts.hostname, parts.port)
+        if self._conn is None or self._conn_key != key:
+            self.close()
+            cls = httplib.HTTPSConnection if parts.scheme == 'https' else httplib.HTTPConnection
+            self._conn = cls(parts.hostname, parts.port, timeout=self.timeout)
+            self._conn_key = key
+        return self._conn
+
+    def _fetch(self, start, length):
+        url = self.url
+        permanent = True  # self.url follows the redirects as long as they are all permanent
+        authorization = origin = None
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlparse.urlsplit(url)
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            if parts.username:
+                credentials = '%s:%s' % (urlparse.unquote(parts.username), urlparse.unquote(parts.password or ''))
+                authorization = 'Basic ' + base64.b64encode(credentials)
+                origin = _origin(parts)
+
+            headers = {'Range': 'bytes=%d-%d' % (start, start + length - 1)}
+            # the credentials are only sent to the scheme, host and port they were given for
+            if authorization and _origin(parts) == origin:
+                headers['Authorization'] = authorization
+
+            conn = self._connection(parts)
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            self.requests += 1
+
+            if response.status in REDIRECTS:
+                response.read()
+                url = urlparse.urljoin(url, response.getheader('location'))
+                permanent = permanent and response.status in PERMANENT_REDIRECTS
+                if permanent:
+                    self.url = url
+                continue
+            break
+        else:
+            raise IOError('Too many redirects fetching %s' % url)
+
+        if response.status == 206:
+            body = response.read()
+            self.bytes_received += len(body)
+            total = response.getheader('content-range', '').rpartition('/')[2]
+            if total.isdigit():
+                self.size = int(total)
+            return body
+        if response.status == 416:  # past the end of the file
+            response.read()
+            return ''
+
+        # do not download a whole image from a server ignoring the Range header
+        self.close()
+        if response.status == 200:
+            raise IOError('Range requests not supported fetching %s' % url)
+        raise IOError('HTTP %d %s fetching %s' % (response.status, response.reason, url))
+
+
+def _origin(parts):
+    return parts.scheme, parts.hostname, parts.port or DEFAULT_PORTS.get(parts.scheme)
+
+
+class BlockCache(object):
+    """
+    Least recently used blocks of a remote file.
+    The missing blocks of a read are fetched by runs of adjacent blocks, one ranged GET per run,
+    the last run carrying on read_ahead blocks further.
+    """
+
+    def __init__(self, fetcher, block_size=BLOCK_SIZE, cache_blocks=CACHE_BLOCKS, read_ahead=READ_AHEAD):
+        self.fetcher = fetcher
+        self.block_size = block_size
+        self.cache_blocks = max(1, cache_blocks)
+        self.read_ahead = read_ahead
+        self.hits = 0
+        self.misses = 0
+        self._blocks = OrderedDict()  # block index -> data, least recent first
+
+    def close(self):
+        self._blocks.clear()
+        self.fetcher.close()
+
+    def read(self, offset, length):
+        if length <= 0:
+            return ''
+        first = offset // self.block_size
+        last = (offset + length - 1) // self.block_size
+
+        blocks = {}
+        missing = []
+        for index in xrange(first, last + 1):
+            block = self._blocks.get(index)
+            if block is None:
+                missing.append(index)
+            else:
+                blocks[index] = block
+        self.hits += len(blocks)
+        self.misses += len(missing)
+
+        for run_first, run_last in self._runs(missing):
+            if run_last == last:
+                run_last = self._read_ahead(run_last)
+            blocks.update(self._fetch(run_first, run_last))
+
+        # read ahead blocks go in last, they are the next ones to be read
+        for index in sorted(blocks):
+            self._store(index, blocks[index])
+
+        start = offset - first * self.block_size
+        data = ''.join(blocks.get(index, '') for index in xrange(first, last + 1))
+        return data[start:start + length]
+
+    @staticmethod
+    def _runs(indexes):
+        """ (first, last) of each run of consecutive indexes """
+        runs = []
+        for index in indexes:
+            if runs and runs[-1][1] == index - 1:
+                runs[-1][1] = index
+            else:
+                runs.append([index, index])
+        return runs
+
+    def _read_ahead(self, last):
+        end = last + self.read_ahead
+        if self.fetcher.size is not None:
+            end = min(end, (self.fetcher.size - 1) // self.block_size)
+        while last < end and last + 1 not in self._blocks:
+            last += 1
+        return last
+
+    def _fetch(self, first, last):
+        data = self.fetcher.fetch(first * self.block_size, (last - first + 1) * self.block_size)
+        blocks = {}
+        for i, pos in enumerate(xrange(0, len(data), self.block_size)):
+            blocks[first + i] = data[pos:pos + self.block_size]
+        return blocks
+
+    def _store(self, index, block):
+        self._blocks.pop(index, None)
+        self._blocks[index] = block
+        if len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
@@ -1,13 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import time
 import transmissionrpc as trpc
 
-from os import walk
 from os.path import join
 
-from .Video import Video
-from .commons import convertBytes
+from .maskIndex import MaskIndex
+from .probeEngine import ProbeEngine
+from .torrentCache import TorrentCache
 from .mediaLogger import MediaLogger
 
 logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
@@ -15,56 +16,131 @@ logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
 
 class TorrentsCli(object):
 
-    def __init__(self, user, password, host, port, maskDir=None, maxSize=0):
+    # Transmission considers a torrent recently active for 60 seconds, keep a safety margin
+    RECENTLY_ACTIVE = 45
+
+    def __init__(self, user, password, host, port, maskDir=None, maxSize=0, scanWorkers=1, resyncInterval=3600,
+                 timeout=None):
+        """ host is a Transmission host or a comma separated list of host[:port], polled concurrently """
         self.user = user
         self.password = password
-        self.host = host
-        self.port = port
+        self.hosts = trpc.parse_hosts(host, int(port))
+        self.timeout = float(timeout) if timeout else trpc.DEFAULT_TIMEOUT
 
         self.maskDir = maskDir
-        self.maxSize = maxSize
+        self.maskIndex = MaskIndex(maskDir) if maskDir else None
+        self.maxSize = float(maxSize)  # MB, a string when it comes from the config file
+        self.probeEngine = ProbeEngine(scanWorkers)
+
+        self.trClients = trpc.MultiClient(self.hosts, user=self.user, password=self.password,
+                                          http_handler_factory=trpc.PooledHTTPHandler, timeout=self.timeout)
+        self.torrentCaches = dict((server, TorrentCache(server))
+                                  for server in map(trpc.MultiClient.server_name, self.hosts))
+        self.resyncInterval = resyncInterval
+
+    @staticmethod
+    def is_complete(torrent):
+        return torrent.status == 'stopped' and torrent.progress == 100
+
+    def poll_torrents(self, server, trClient):
+        """
+        Returns the completed torrents of one server to evaluate.
+
+        A full resync, every resyncInterval seconds, returns every completed
+        torrent and leaves to the job ledger the ones already converted. In
+        between only the torrents that reached 100% since the previous poll are
+        returned: Transmission's recently-active delta is used when the previous
+        poll is recent enough, otherwise a listing of the completion fields only.
+        """
+        cache = self.torrentCaches[server]
+        now = time.time()
+        start = now
+
+        if now - cache.lastFullSync >= self.resyncInterval:
+            torrents = trClient.get_torrents(profile='files')
+            cache.retain(torrent.hashString for torrent in torrents)
+            for torrent in torrents:
+                cache.put(torrent.hashString, torrent.id, torrent.name, self.is_complete(torrent))
+            cache.mark_sync(full=True)
+            completed = [torrent for torrent in torrents if self.is_complete(torrent)]
+            logger.debug('%s full resync: %d torrents, %d completed, in %.3f s.' %
+                         (server, len(torrents), len(completed), time.time() - start))
+            return completed
+
+        if now - cache.lastPoll < self.RECENTLY_ACTIVE:
+            mode = 'recently-active'
+            torrents, removed = trClient.get_recently_active_torrents(profile='files')
+            cache.remove_ids(removed)
+        else:
+            mode = 'completion'
+            torrents = trClient.get_torrents(profile='completion')
+            cache.retain(torrent.hashString for torrent in torrents)
 
-        self.trClient = trpc.Client(self.host, self.port, self.user, self.password)
+        completed = []
+        for torrent in torrents:
+            known = cache.get(torrent.hashString)
+            if known and known[0] != torrent.id:
+                # the daemon restarted and renumbered its torrents
+                logger.info('Transmission torrent ids changed, running a full resync.')
+                cache.lastFullSync = 0.0
+                return self.poll_torrents(server, trClient)
+            complete = self.is_complete(torrent)
+            if complete and not (known and known[1]):
+                completed.append(torrent)
+            cache.put(torrent.hashString, torrent.id, torrent.name, complete)
+        cache.mark_sync()
+
+        if completed and mode == 'completion':
+            completed = trClient.get_torrents([torrent.id for torrent in completed], profile='files')
+
+        logger.debug('%s delta sync (%s): %d torrents listed, %d newly completed, in %.3f s.' %
+                     (server, mode, len(torrents), len(completed), time.time() - start))
+        return completed
 
     def get_completed_downloads(self):
-        retList = []
-        maskFileList = []
-        trasmissionFiles = []
-
-        logger.info('Connecting to Transmission server.')
-        torrents = self.trClient.get_torrents()
-        logger.debug('%d Torrents found.' % len(torrents))
-
-        for torrent in torrents:
-            if torrent.status == 'stopped' and torrent.progress == 100:
-                for key, value in dict(torrent.files()).items():
-                    if convertBytes(value['size']) >= self.maxSize:
-                        logger.debug('Evaluating completed Download: %s' % value['name'])
-                        if self.maskDir:
-                            trasmissionFiles.append( Video( join(torrent._fields['downloadDir'].value, value['name']), torrentID=torrent._fields['id'].value ))
-                        else:
-                            videoFile = Video( join(torrent._fields['downloadDir'].value, value['name']) )
-                            if videoFile.isVideo: retList.append( videoFile )
-
-        # TODO: Riduci il ciclo
-        if self.maskDir:
-            for path, subdirs, files in walk(self.maskDir):
-                for name in files:
-                    videoFile = Video( join(path, name) )
-                    if videoFile.isVideo:
-                        maskFileList.append( videoFile )
-
-            for transmissionFile in trasmissionFiles:
-                for maskFile in maskFileList:
-                    if transmissionFile.fileName == maskFile.fileName:
-                        retList.append( transmissionFile )
-                        break
-
-        return retList
+        candidates = []
+
+        logger.info('Connecting to %d Transmission servers.' % len(self.hosts))
+        # a poll makes up to three requests, the first one to a host also negotiates the session
+        results, errors = self.trClients.map(self.poll_torrents, timeout=4 * self.timeout)
+        for server, error in errors.items():
+            logger.error('Cannot poll Transmission on %s: %s' % (server, error))
+
+        minSize = self.maxSize * 1024 * 1024
+        for torrent in [torrent for torrents in results.values() for torrent in torrents]:
+            fileTable = torrent.file_table()
+            # files left unselected in a finished torrent are not on disk, skip them with the partial ones
+            for fileID in fileTable.select(min_size=minSize, complete=True):
+                fileName = fileTable.names[fileID]
+                logger.debug('Evaluating completed Download: %s' % fileName)
+                if self.maskDir:
+                    candidates.append( (join(torrent.downloadDir, fileName), {'torrentID': torrent.hashString}) )
+                else:
+                    candidates.append( join(torrent.downloadDir, fileName) )
+
+        if not self.maskDir:
+            return self.probeEngine.scan(candidates)
+
+        # intersect by name first, only the mask files matching a download are probed
+        self.maskIndex.refresh()
+        matches = [(videoFile, self.maskIndex.lookup(videoFile.fileName))
+                   for videoFile in self.probeEngine.probe(candidates)]
+        maskFiles = sorted(set(path for videoFile, paths in matches for path in paths))
+        maskNames = set(maskFile.fileName for maskFile in self.probeEngine.scan(maskFiles))
+
+        return [videoFile for videoFile, paths in matches if videoFile.fileName in maskNames]
+
+    def close(self):
+        self.trClients.close()
+        for torrentCache in self.torrentCaches.values():
+            torrentCache.close()
+        if self.maskIndex:
+            self.maskIndex.close()
 
     def remove_torrent(self, torrentID):
         logger.info('Removing download from Transmission.')
-        self.trClient.remove_torrent(torrentID, True)
+        # torrentID is the hashString, the same on every server
+        self.trClients.remove_torrent(torrentID, True)
 
     def scan_torrents(self, fileList, srcDir):
         completeDownloads = self.get_completed_downloads()
@@ -1,18 +1,21 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import re
 import sys
 import magic
 import iso9660
+import threading
 import subprocess
 
 from .commons import convertBytes
+from .handbrakeProgress import ProgressLogger, ProgressNotifier, ProgressParser
+from .mediaProbe import MediaProbe, language_name
+from .placement import plan
+from .stagingIO import copy_file, discard_file, move_file
 
 from os import remove, stat
 from os.path import basename, dirname, isfile, join, splitext
 
-from shutil import copyfile, move
 from distutils.spawn import find_executable
 
 from libs.mediaLogger import MediaLogger
@@ -23,6 +26,41 @@ logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
 HANDBRAKE_PATH = "/bin/echo"  # Just for testing..
 
 NICE_PATH = find_executable('nice')
+MEDIAINFO_PATH = find_executable('mediainfo')
+
+ACTIVE_PROCESSES = set()
+ACTIVE_LOCK = threading.Lock()
+
+HANDBRAKE_JSON = None  # whether HandBrakeCLI knows --json, probed on the first transcode
+HANDBRAKE_JSON_LOCK = threading.Lock()
+
+
+def handbrake_json():
+    """ True when HandBrakeCLI has --json progress, older versions reject the flag and only print text """
+    global HANDBRAKE_JSON
+
+    with HANDBRAKE_JSON_LOCK:
+        if HANDBRAKE_JSON is None:
+            try:
+                process = subprocess.Popen([HANDBRAKE_PATH, '--help'],
+                                           stderr=subprocess.STDOUT,
+                                           stdout=subprocess.PIPE)
+                (output, error) = process.communicate()
+                HANDBRAKE_JSON = '--json' in output
+            except OSError as e:
+                logger.error('Cannot run \'%s --help\': %s' % (HANDBRAKE_PATH, e))
+                HANDBRAKE_JSON = False
+            logger.debug('HandBrakeCLI progress: %s' % ('json' if HANDBRAKE_JSON else 'text'))
+        return HANDBRAKE_JSON
+
+
+def terminate_transcodes():
+    """ Terminate every running HandBrakeCLI process """
+    with ACTIVE_LOCK:
+        for process in ACTIVE_PROCESSES:
+            if process.poll() is None:
+                logger.info('Terminating transcode process %d' % process.pid)
+                process.terminate()
 
 
 class Video(object):
@@ -37,6 +75,13 @@ class Video(object):
         "4K":    { 'X': 4096, 'Y': 2160 },
     }
     EXCLUDED_EXT = ['.part']
+    NON_VIDEO_EXT = ['.nfo', '.srt', '.sub', '.idx', '.ass', '.ssa', '.txt', '.jpg', '.jpeg', '.png', '.gif',
+                     '.torrent', '.sfv', '.md5', '.url', '.log', '.xml', '.json', '.db']
+    NON_VIDEO_MIME = ('text/', 'image/', 'application/x-bittorrent')
+    SNIFF_SIZE = 8192
+    PROBE_CACHE = None
+    JOB_LEDGER = None
+    PROGRESS = ProgressNotifier(ProgressLogger())
 
     def __init__(self, filePath, **kwargs):
         if type(filePath) == list: self.filePath = join(filePath[0], filePath[1])
@@ -46,24 +91,122 @@ class Video(object):
         self.fileExt = splitext(basename(self.filePath))[1].lstrip('.')
         self.fileName = splitext(basename(self.filePath))[0]
 
-        self.media_info = self.get_media_info()
-        self.isVideo = self.is_video_file()
-        self.isISO = self.is_iso_video()
-
-        self.height = int(self.media_info['Video']['Height'].replace(' ', '').replace('pixels', '')) if 'Video' in self.media_info else None
-        self.width = int(self.media_info['Video']['Width'].replace(' ', '').replace('pixels', '')) if 'Video' in self.media_info else None
-
-        self.fileInfo = stat(self.filePath)
-        self.fileSize = convertBytes(self.fileInfo.st_size)
+        self._probe = None
+        self._mimeType = None
+        self._isVideo = None
+        self._isISO = None
+        self._fileInfo = None
+        self._cacheChecked = False
+        self.jobID = None
 
         self.torrentID = (kwargs['torrentID'] if 'torrentID' in kwargs else None) if kwargs else None
         self.requiredLang = (kwargs['requiredLang'] if 'requiredLang' in kwargs else None) if kwargs else None
         self.newResolution = (kwargs['newResolution'] if 'newResolution' in kwargs else None) if kwargs else None
 
+    ##
+    ## Lazy attributes, nothing touches the disk until it is needed
+    ##
+
+    @property
+    def fileInfo(self):
+        if self._fileInfo is None:
+            self._fileInfo = stat(self.filePath)
+        return self._fileInfo
+
+    @property
+    def fileSize(self):
+        return convertBytes(self.fileInfo.st_size)
+
+    @property
+    def probe(self):
+        if self._probe is None:
+            self._run_probe()
+        return self._probe
+
+    @property
+    def mimeType(self):
+        if self._isVideo is None:
+            self._run_probe()
+        return self._mimeType
+
+    @property
+    def isVideo(self):
+        if self._isVideo is None:
+            self._run_probe()
+        return self._isVideo
+
+    @property
+    def isISO(self):
+        if self._isISO is None:
+            self._run_probe()
+        return self._isISO
+
+    @property
+    def height(self):
+        return self.probe.height
+
+    @property
+    def width(self):
+        return self.probe.width
+
+    def set_job_state(self, state, **kwargs):
+        if Video.JOB_LEDGER and self.jobID:
+            Video.JOB_LEDGER.update(self.jobID, state, **kwargs)
+
+    def load_cached_probe(self):
+        """ Fill mediainfo and the video verdicts from the probe cache, returns False on a miss """
+        if self._isVideo is not None:
+            return True
+
+        if self._cacheChecked or not Video.PROBE_CACHE:
+            return False
+
+        self._cacheChecked = True
+        cached = Video.PROBE_CACHE.lookup(self.filePath)
+        if not cached:
+            return False
+
+        self._probe = MediaProbe.from_json(cached['media_info'])
+        self._mimeType = cached['mime']
+        self._isVideo = cached['isVideo']
+        self._isISO = cached['isISO']
+        return True
+
+    def _run_probe(self):
+        if self.load_cached_probe():
+            return
+
+        mediaInfoJson = self.get_media_info()
+        self._probe = MediaProbe.from_json(mediaInfoJson)
+        self._isVideo = self.is_video_file()
+        if self._isISO is None:  # is_video_file has classified images already
+            self._isISO = self.is_iso_video()
+
+        if Video.PROBE_CACHE:
+            Video.PROBE_CACHE.store(self.filePath, mediaInfoJson, self._mimeType, self._isVideo, self._isISO)
+
+    def sniff_header(self):
+        """
+        Cheap libmagic check on the first bytes of the file.
+        Returns False only when the file is certainly not a video.
+        """
+        if splitext(self.filePath)[1].lower() in ['.iso']:
+            return True
+
+        try:
+            with open(self.filePath, 'rb') as f:
+                header = f.read(Video.SNIFF_SIZE)
+        except IOError:
+            return False
+
+        self._mimeType = magic.from_buffer(header, mime=True)
+        if self._mimeType.lower().startswith(Video.NON_VIDEO_MIME):
+            logger.debug("'%s' Skipped. Header looks like %s." % (self.filePath, self._mimeType))
+            return False
+
+        return True
+
     def copy_transcode(self, **kwargs):
-        this_inpDir = ''
-        this_trnDir = ''
-        this_outDir = ''
         this_lang = None
 
         if 'utils' in kwargs and 'extra' in kwargs:
@@ -75,124 +218,81 @@ class Video(object):
 
         out_fileName = '%s.%s'
         out_extension = kwargs['newExtension'] if kwargs['newExtension'] else self.fileExt
+        outDir = kwargs['dstDir'] if kwargs['dstDir'] else self.fileDir
 
-        if kwargs['tmpDir'] and kwargs['dstDir']:  # Case A
-            this_inpDir = this_trnDir = kwargs['tmpDir']
-            this_outDir = kwargs['dstDir']
-
-        elif kwargs['tmpDir'] and not kwargs['dstDir']:  # Case B
-            this_inpDir = this_trnDir = kwargs['tmpDir']
-            this_outDir = dirname(self.filePath)
-
-        elif not kwargs['tmpDir'] and kwargs['dstDir']:  # Case C
-            this_inpDir = dirname(self.filePath)
-            this_trnDir = this_outDir = kwargs['dstDir']
-
-        elif not kwargs['tmpDir'] and not kwargs['dstDir']:  # Case D
-            this_inpDir = this_trnDir = this_outDir = self.fileDir
-
-        inputFile = join(this_inpDir, '%s.%s' % (self.fileName, self.fileExt))
-        transFile = join(this_trnDir, '%s.%s' % (self.fileName + '_transcoded', out_extension))
-
+        transName = out_fileName % (self.fileName + '_transcoded', out_extension)
         # TODO: Output FileName personalization
         if this_lang:
-            outputFile = join(this_outDir, out_fileName % (self.fileName + '_' + this_lang, out_extension))
+            outName = out_fileName % (self.fileName + '_' + this_lang, out_extension)
         else:
-            outputFile = join(this_outDir, out_fileName % (
-            self.fileName + '_transcoded' if not kwargs['dstDir'] else self.fileName, out_extension))
+            outName = out_fileName % (self.fileName + '_transcoded' if not kwargs['dstDir'] else self.fileName,
+                                      out_extension)
 
-        # The magic begins..
-        if kwargs['tmpDir']:
-            logger.info('Start copying file to temporary directory.')
-            logger.debug('cp %s %s' % (self.filePath, inputFile))
-            copyfile(self.filePath, inputFile)
-            logger.debug('Finish copy file to temporary directory.')
-
-        retCode = self.transcode(inputFile, transFile, self.newResolution, out_extension)
-
-        if retCode == 0:
-            logger.info('Conversion finished without error.')
-            if kwargs['tmpDir']:
-                logger.info('Moving file from temporary to appropriate directory.')
-                logger.debug('mv "%s" "%s"' % (transFile, outputFile))
-                move(transFile, outputFile)
-                logger.debug('rm "%s"' % inputFile)
-                remove(inputFile)
-            elif kwargs['dstDir']:
-                logger.info('Moving file to appropriate directory.')
-                logger.debug('mv "%s" "%s"' % (transFile, outputFile))
-                move(transFile, outputFile)
-            elif this_lang:
-                logger.info('Renaming output file with extra informations.')
-                logger.debug('mv "%s" "%s"' % (transFile, outputFile))
-                move(transFile, outputFile)
-                this_inpDir = None
+        placement = plan(self.filePath, kwargs['tmpDir'], outDir, transName, outName)
+        outputFile = placement.outputFile
 
+        # The magic begins..
+        published = False
+        try:
+            if placement.stage == 'copy':
+                self.set_job_state('copying')
+                logger.info('Start copying file to temporary directory.')
+                logger.debug('cp %s %s' % (self.filePath, placement.inputFile))
+                copy_file(self.filePath, placement.inputFile)
+                logger.debug('Finish copy file to temporary directory.')
+
+            self.set_job_state('encoding')
+            retCode = self.transcode(placement.inputFile, placement.transFile, self.newResolution, out_extension,
+                                     kwargs['encoderThreads'] if 'encoderThreads' in kwargs else None)
+
+            if retCode == 0:
+                logger.info('Conversion finished without error.')
+                self.set_job_state('publishing')
+                if placement.publish != 'none':
+                    logger.info('Moving file to appropriate directory.')
+                    logger.debug('mv "%s" "%s"' % (placement.transFile, outputFile))
+                    move_file(placement.transFile, outputFile)
+                published = True
+        finally:
+            # a failed copy, transcode or move, a cancel included, leaves nothing behind in the tmp dir
+            if placement.stage == 'copy':
+                discard_file(placement.inputFile)
+            if not published:
+                discard_file(placement.transFile)
+
+        if published:
             if kwargs['delSrc']:
                 logger.info('Removing original file.')
                 logger.debug('rm "%s"' % self.filePath)
                 remove(self.filePath)
                 # if self.torrentID: remove_torrent(self.torrentID)
-                if this_inpDir == this_outDir and not kwargs['tmpDir']: move(transFile, outputFile)
+
+            self.set_job_state('done', output=outputFile)
         else:
             logger.error('Something goes wrong during conversion..')
+            self.set_job_state('failed', error='HandBrakeCLI exited with code %s' % retCode)
 
     def get_media_info(self):
-        """ Note this is media info cli """
-        mediainfoPath = find_executable('mediainfo')
-        cmd = '%s "%s"' % (mediainfoPath, self.filePath)
+        """ Note this is media info cli, returns its raw JSON report """
+        if not MEDIAINFO_PATH:
+            logger.error('mediainfo not found, cannot probe \'%s\'' % self.filePath)
+            return ''
 
-        process = subprocess.Popen(cmd,
-                                   shell=True,
+        process = subprocess.Popen([MEDIAINFO_PATH, '--Output=JSON', self.filePath],
                                    stderr=subprocess.PIPE,
                                    stdout=subprocess.PIPE)
         (output, error) = process.communicate()
 
-        mainKey = {}
-        category = subCategory = sub = subsub = None
-        # make a dict of it
-        for line in output.splitlines()[:-1]:
-            if ':' not in line and line != '':
-                oldCategory = category
-                subsub = {}
-
-                category = line.strip('\r')
-                if "#" in category:
-                    subCategory = category.split('#')[1]
-                    category = category.split('#')[0].strip()
-                    if oldCategory != category:
-                        sub = []
-                else:
-                    sub = {}
-                    subCategory = None
-                mainKey[category] = ''
-            elif line == '':
-                if subCategory:
-                    sub.append(subsub)
-                mainKey[category] = sub
-            elif ':' in line:
-                if category != "Menu":
-                    z = line.split(':', 1)
-                    k = z[0].strip('\r').strip()
-                    v = z[1].strip('\r').strip()
-                else:
-                    z = line.split(' : ', 1)
-                    k = z[0].strip('\r').strip()
-                    v = z[1].strip('\r').strip()
-                if subCategory:
-                    subsub[k] = v
-                else:
-                    sub[k] = v
-
-        return mainKey
+        return output
 
     def is_iso_video(self):
         try:
-            if splitext(self.fileName)[1].lower() != 'iso': return False
-            cd = iso9660.ISO9660(self.filePath)
-            cdTree = cd.tree()
+            if splitext(self.filePath)[1].lower() != '.iso': return False
+            # reads the volume descriptors and the root directory only
+            discType = iso9660.disc_type(self.filePath)
 
-            if '/VIDEO_TS' in cdTree or '/AUDIO_TS' in cdTree:
+            if discType != iso9660.DATA:
+                logger.info("'%s' %s image." % (basename(self.filePath), discType))
                 return True
 
             logger.debug("'%s' Skipped. The ISO file is not a Video file." % self.filePath)
@@ -214,16 +314,19 @@ class Video(object):
 
         if splitext(self.filePath)[1].lower() in ['.iso']:
             logger.info('%s ISO File found.' % self.filePath)
-            return self.is_iso_video()
+            self._isISO = self.is_iso_video()
+            return self._isISO
 
-        magicInfo = magic.from_file(self.filePath, mime=True)
+        if not self._mimeType:
+            self._mimeType = magic.from_file(self.filePath, mime=True)
+        magicInfo = self._mimeType
 
         if 'video' in magicInfo.lower():
             logger.info("'%s' OK: %s" % (basename(self.filePath), magicInfo))
             # Todo: verifica risoluzione, dimensione, lingue audio,
             return True
 
-        if 'Video' in self.media_info:
+        if self.probe.hasVideo:
             logger.info("'%s' OK: The file is a video." % basename(self.filePath))
             # Todo: verifica risoluzione, dimensione, lingue audio,
             return True
@@ -233,13 +336,16 @@ class Video(object):
     def lang_exists(self, fileLang):
         if fileLang == '' or fileLang == [] or not self.requiredLang: return True
 
+        # names and ISO codes are both accepted, on either side
+        requiredLang = [language_name(lang).lower() for lang in self.requiredLang]
+
         if type(fileLang) == list:
             for f_lang in fileLang:
-                if f_lang in self.requiredLang:
+                if language_name(f_lang).lower() in requiredLang:
                     return True
 
         elif type(fileLang) == str:
-            if fileLang in self.requiredLang:
+            if language_name(fileLang).lower() in requiredLang:
                 return True
 
         return False
@@ -248,29 +354,16 @@ class Video(object):
         self.newResolution = newRes
 
     @staticmethod
-    def get_video_lang(video_lang):
-        ret_lang = []
-
-        if type(video_lang) == list:
-            for audio in video_lang:
-                if 'Language' in audio:
-                    ret_lang.append(audio['Language'].lower())
-        else:
-            if 'Language' in video_lang:
-                ret_lang = video_lang['Language'].lower()
-
-        return ret_lang
+    def get_video_lang(tracks):
+        return [track.language.lower() for track in tracks if track.language]
 
     @staticmethod
-    def transcode(inPath, outPath, res, ext):
+    def transcode(inPath, outPath, res, ext, threads=None):
 
         if not HANDBRAKE_PATH:
             logger.error('HandBrakeCLI not found, exiting')
             sys.exit(9)
 
-        text = ''
-        perc = re.compile('\d{1,3}\.\d{1,3} %')
-
         PRESET = """
             --pfr
             --h264-level 4.0
@@ -283,10 +376,13 @@ class Video(object):
             --subtitle scan,1,2,3,4,5,6,7,8,9,10
             --audio-fallback ffac3 -X %d -Y %d
             --audio-copy-mask aac,ac3,dtshd,dts,mp3 %s
-            -E ffaac,copy:ac3 -B 160,160 -6 dpl2,none -R Auto,Auto -D 0.0,0.0
-            """ % (Video.RESOLUTIONS[res]["X"], Video.RESOLUTIONS[res]["Y"], '-f %s' % ext if ext else '')
+            -E ffaac,copy:ac3 -B 160,160 -6 dpl2,none -R Auto,Auto -D 0.0,0.0 %s
+            """ % (Video.RESOLUTIONS[res]["X"], Video.RESOLUTIONS[res]["Y"], '-f %s' % ext if ext else '',
+                   '--encopts threads=%d' % threads if threads else '')
 
-        cmd = '"%s" -n 19 "%s" -v -i "%s" %s -o "%s" ' % (NICE_PATH, HANDBRAKE_PATH, inPath, PRESET.replace('\n', ''), outPath)
+        # exec, so that terminating the process stops the encoder and not just the shell
+        cmd = 'exec "%s" -n 19 "%s" -v %s-i "%s" %s -o "%s" ' % (NICE_PATH, HANDBRAKE_PATH, '--json ' if handbrake_json() else '',
+                                                             inPath, PRESET.replace('\n', ''), outPath)
 
         logger.info('Starting video conversion')
         logger.debug('%s' % cmd)
@@ -294,29 +390,20 @@ class Video(object):
                                    shell=True,
                                    stderr=subprocess.PIPE,
                                    stdout=subprocess.PIPE)
+        with ACTIVE_LOCK:
+            ACTIVE_PROCESSES.add(process)
 
-        # (output, error) = process.communicate()
-
-        logCtl = False
-        while True:
-            out = process.stdout.read(1)
-            if out == '' and process.poll() is not None:
-                break
-            if out != '':
-                if '\r' != out:
-                    text += out
-                else:
-                    if text.strip() != '':
-                        percVal = int(round(float(perc.search(text).group()[:-2])))
-
-                        if percVal % 25 == 0 and not logCtl:
-                            logCtl = True
-                            logger.info(text)
-                        elif percVal % 25 != 0 and logCtl:
-                            logCtl = False
-
-                        # print(perc.search(text).group(), end=out)
-
-                    text = ''
+        parser = ProgressParser()
+        try:
+            for event in parser.read_process(process):
+                Video.PROGRESS.publish(basename(inPath), event)
+        finally:
+            with ACTIVE_LOCK:
+                ACTIVE_PROCESSES.discard(process)
+            Video.PROGRESS.finish(basename(inPath))
+
+        if process.returncode != 0:
+            for line in parser.stderrTail:
+                logger.debug('HandBrakeCLI: %s' % line)
 
         return process.returncode
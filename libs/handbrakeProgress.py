@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import select
+import threading
+
+from collections import deque, namedtuple
+
+from .mediaLogger import MediaLogger
+logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
+
+# percent 0-100, fps and avgFps may be None, eta in seconds (None if unknown), task is the encoding pass
+ProgressEvent = namedtuple('ProgressEvent', ['percent', 'fps', 'avgFps', 'eta', 'task', 'taskCount'])
+
+# Encoding: task 1 of 2, 45.67 % (30.12 fps, avg 28.50 fps, ETA 00h12m34s)
+PROGRESS_TEXT = re.compile(r'task (\d+) of (\d+), (\d{1,3}\.\d{1,3}) %'
+                           r'(?: \((\d+\.\d+) fps, avg (\d+\.\d+) fps, ETA (\d+)h(\d+)m(\d+)s\))?')
+PROGRESS_JSON = 'Progress: {'
+
+
+class ProgressParser(object):
+    """
+    Incremental parser for HandBrakeCLI progress.
+
+    Understands both the `--json` progress objects and the classic text
+    lines, so it works with any HandBrakeCLI version.
+    """
+    CHUNK_SIZE = 4096
+
+    def __init__(self):
+        self.buffer = ''
+        self.decoder = json.JSONDecoder()
+        self.stderrTail = deque(maxlen=20)
+        self._stderrBuffer = ''
+
+    def feed(self, data):
+        """ Consume a chunk of stdout and return the progress events it completed """
+        events = []
+        self.buffer += data
+
+        while True:
+            start = self.buffer.find(PROGRESS_JSON)
+            if start < 0:
+                break
+            try:
+                obj, end = self.decoder.raw_decode(self.buffer, start + len(PROGRESS_JSON) - 1)
+            except ValueError:
+                # object not complete yet, keep it for the next chunk
+                self.buffer = self.buffer[start:]
+                return events
+            self.buffer = self.buffer[end:]
+            event = self._from_json(obj)
+            if event:
+                events.append(event)
+
+        segments = re.split('[\r\n]', self.buffer)
+        self.buffer = segments.pop()
+        for segment in segments:
+            event = self._from_text(segment)
+            if event:
+                events.append(event)
+
+        return events
+
+    def feed_stderr(self, data):
+        lines = (self._stderrBuffer + data).split('\n')
+        self._stderrBuffer = lines.pop()
+        self.stderrTail.extend(line for line in lines if line.strip())
+
+    def read_process(self, process):
+        """ Generator yielding the progress events of a running process until it exits """
+        streams = {process.stdout.fileno(): self.feed, process.stderr.fileno(): self.feed_stderr}
+
+        while streams:
+            ready, _, _ = select.select(list(streams), [], [], 1.0)
+            for fd in ready:
+                data = os.read(fd, self.CHUNK_SIZE)
+                if not data:
+                    del streams[fd]
+                    continue
+                events = streams[fd](data.decode('utf-8', 'replace'))
+                for event in events or []:
+                    yield event
+
+        process.wait()
+
+    @staticmethod
+    def _from_json(obj):
+        if obj.get('State') != 'WORKING' or 'Working' not in obj:
+            return None
+
+        working = obj['Working']
+        eta = None
+        if working.get('Hours', -1) >= 0:
+            eta = working['Hours'] * 3600 + working.get('Minutes', 0) * 60 + working.get('Seconds', 0)
+
+        return ProgressEvent(percent=100.0 * working.get('Progress', 0.0),
+                             fps=working.get('Rate'),
+                             avgFps=working.get('RateAvg'),
+                             eta=eta,
+                             task=working.get('Pass', 1),
+                             taskCount=working.get('PassCount', 1))
+
+    @staticmethod
+    def _from_text(segment):
+        match = PROGRESS_TEXT.search(segment)
+        if not match:
+            return None
+
+        task, taskCount, percent, fps, avgFps, hours, minutes, seconds = match.groups()
+        return ProgressEvent(percent=float(percent),
+                             fps=float(fps) if fps else None,
+                             avgFps=float(avgFps) if avgFps else None,
+                             eta=int(hours) * 3600 + int(minutes) * 60 + int(seconds) if hours else None,
+                             task=int(task),
+                             taskCount=int(taskCount))
+
+
+class ProgressNotifier(object):
+    """
+    Observer hub for progress events.
+    Subscribers are called as callback(fileName, event), a failing subscriber is logged and skipped.
+    Subscribers keeping state per job also get callback.finish(fileName) when the job ends, if they have it.
+    """
+
+    def __init__(self, *subscribers):
+        self.lock = threading.Lock()
+        self.subscribers = list(subscribers)
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers = self.subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            self.subscribers = [s for s in self.subscribers if s != callback]
+
+    def publish(self, fileName, event):
+        for callback in self.subscribers:
+            try:
+                callback(fileName, event)
+            except Exception:
+                logger.error('Progress subscriber failed.', exc_info=True)
+
+    def finish(self, fileName):
+        """ The job of fileName ended, whether it completed, failed or was cancelled """
+        for callback in self.subscribers:
+            finish = getattr(callback, 'finish', None)
+            if finish is None:
+                continue
+            try:
+                finish(fileName)
+            except Exception:
+                logger.error('Progress subscriber failed.', exc_info=True)
+
+
+def format_event(event):
+    text = 'task %d of %d, %.2f %%' % (event.task, event.taskCount, event.percent)
+    if event.fps is not None:
+        text += ' (%.2f fps, avg %.2f fps' % (event.fps, event.avgFps or 0.0)
+        if event.eta is not None:
+            text += ', ETA %02dh%02dm%02ds' % (event.eta // 3600, event.eta % 3600 // 60, event.eta % 60)
+        text += ')'
+    return text
+
+
+class ProgressLogger(object):
+    """ Subscriber logging every job each time it crosses a multiple of `step` percent """
+
+    def __init__(self, step=25):
+        self.step = step
+        self.lastStep = {}
+
+    def __call__(self, fileName, event):
+        current = (event.task, int(event.percent) // self.step)
+        if self.lastStep.get(fileName) != current:
+            self.lastStep[fileName] = current
+            logger.info('%s: %s' % (fileName, format_event(event)))
+
+    def finish(self, fileName):
+        # a watcher runs for months, keep only the jobs in progress
+        self.lastStep.pop(fileName, None)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import errno
+import sqlite3
+import threading
+
+from os import getpid, kill, stat
+from os.path import join
+
+from .mediaLogger import MediaLogger
+logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
+
+
+class JobLedger(object):
+    """
+    Persistent record of every conversion job, so a rerun never redoes finished work.
+
+    A job is identified by the (st_dev, st_ino, size, mtime) of its source and
+    moves through queued -> copying -> encoding -> publishing -> done, or ends
+    as failed / skipped. Jobs left in flight by a crashed run are resumed, those
+    of a run still alive (a watcher next to a cron run) are left to it, and
+    files recorded as outputs are never taken as sources. A skip depends on the
+    settings of the run (resolution, languages), it is recorded with them and
+    only holds for a run with the same settings.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id          INTEGER PRIMARY KEY,
+            dev         INTEGER NOT NULL,
+            ino         INTEGER NOT NULL,
+            size        INTEGER NOT NULL,
+            mtime       REAL    NOT NULL,
+            source      TEXT    NOT NULL,
+            state       TEXT    NOT NULL,
+            output      TEXT,
+            out_dev     INTEGER,
+            out_ino     INTEGER,
+            error       TEXT,
+            attempts    INTEGER NOT NULL DEFAULT 0,
+            pid         INTEGER,
+            queued_at   REAL,
+            started_at  REAL,
+            finished_at REAL,
+            settings    TEXT,
+            UNIQUE (dev, ino, size, mtime)
+        )
+        """
+    STATES = ['queued', 'copying', 'encoding', 'publishing', 'done', 'failed', 'skipped']
+    IN_FLIGHT = ['queued', 'copying', 'encoding', 'publishing']
+    FINISHED = ['done', 'skipped']
+    OUTPUT_SUFFIX = '_transcoded'
+
+    def __init__(self, dbPath=None, maxAttempts=3, settings=''):
+        self.dbPath = dbPath if dbPath else join(logger.logPath, 'jobs.db')
+        self.maxAttempts = maxAttempts
+        self.settings = settings
+
+        self.lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        if self._conn is None or self._pid != getpid():
+            self._conn = sqlite3.connect(self.dbPath, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(self.SCHEMA)
+            columns = [row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')]
+            if 'settings' not in columns:  # ledger written before skips were tied to the settings
+                self._conn.execute('ALTER TABLE jobs ADD COLUMN settings TEXT')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_output ON jobs (output)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_out_ino ON jobs (out_dev, out_ino)')
+            self._conn.commit()
+            self._pid = getpid()
+        return self._conn
+
+    @staticmethod
+    def _alive(pid):
+        """ Whether the process that recorded a job is still running """
+        if not pid:
+            return False
+        try:
+            kill(pid, 0)
+        except OSError as e:
+            return e.errno == errno.EPERM  # running as another user
+        return True
+
+    @staticmethod
+    def _identity(videoFile):
+        fileInfo = videoFile.fileInfo
+        return fileInfo.st_dev, fileInfo.st_ino, fileInfo.st_size, fileInfo.st_mtime
+
+    def is_output(self, videoFile):
+        if videoFile.fileName.endswith(self.OUTPUT_SUFFIX):
+            return True
+
+        with self.lock:
+            row = self._connection().execute('SELECT 1 FROM jobs WHERE output = ? OR (out_dev = ? AND out_ino = ?)',
+                                             (videoFile.filePath, videoFile.fileInfo.st_dev,
+                                              videoFile.fileInfo.st_ino)).fetchone()
+        return row is not None
+
+    def check(self, videoFile):
+        """
+        Returns None if the file has to be converted, otherwise the reason to skip it.
+        """
+        if self.is_output(videoFile):
+            return 'output'
+
+        with self.lock:
+            row = self._connection().execute('SELECT state, attempts, pid, settings FROM jobs '
+                                             'WHERE dev = ? AND ino = ? AND size = ? AND mtime = ?',
+                                             self._identity(videoFile)).fetchone()
+        if row is None:
+            return None
+
+        state, attempts, pid, settings = row
+        if state == 'skipped' and settings != self.settings:
+            return None  # skipped under other settings, look at it again
+        if state in self.FINISHED:
+            return state
+        if state in self.IN_FLIGHT and (pid == getpid() or self._alive(pid)):
+            return 'running'
+        if attempts >= self.maxAttempts:
+            return 'failed'
+        return None
+
+    def enqueue(self, videoFile):
+        """ Record the job as queued, resuming it if a previous run left it unfinished """
+        identity = self._identity(videoFile)
+
+        with self.lock:
+            conn = self._connection()
+            row = conn.execute('SELECT id, state FROM jobs WHERE dev = ? AND ino = ? AND size = ? AND mtime = ?',
+                               identity).fetchone()
+            if row is None:
+                jobID = conn.execute('INSERT INTO jobs (dev, ino, size, mtime, source, state, attempts, pid, queued_at) '
+                                     'VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)',
+                                     identity + (videoFile.filePath, 'queued', getpid(), time.time())).lastrowid
+            else:
+                jobID = row[0]
+                if row[1] in self.IN_FLIGHT:
+                    logger.info('Resuming interrupted job for \'%s\' (was %s).' % (videoFile.filePath, row[1]))
+                conn.execute('UPDATE jobs SET state = ?, source = ?, pid = ?, attempts = attempts + 1, error = NULL, '
+                             'queued_at = ?, started_at = NULL, finished_at = NULL WHERE id = ?',
+                             ('queued', videoFile.filePath, getpid(), time.time(), jobID))
+            conn.commit()
+
+        return jobID
+
+    def update(self, jobID, state, output=None, error=None):
+        assert state in self.STATES
+
+        now = time.time()
+        with self.lock:
+            conn = self._connection()
+            if state == 'copying' or state == 'encoding':
+                conn.execute('UPDATE jobs SET state = ?, started_at = COALESCE(started_at, ?) WHERE id = ?',
+                             (state, now, jobID))
+            elif state == 'publishing':
+                conn.execute('UPDATE jobs SET state = ? WHERE id = ?', (state, jobID))
+            else:
+                outDev = outIno = None
+                if output:
+                    try:
+                        outInfo = stat(output)
+                        outDev, outIno = outInfo.st_dev, outInfo.st_ino
+                    except OSError:
+                        pass
+                conn.execute('UPDATE jobs SET state = ?, output = COALESCE(?, output), out_dev = COALESCE(?, out_dev), '
+                             'out_ino = COALESCE(?, out_ino), error = ?, finished_at = ?, settings = ? WHERE id = ?',
+                             (state, output, outDev, outIno, error, now, self.settings, jobID))
+            conn.commit()
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import sqlite3
+import threading
+
+from os import getpid, listdir, stat
+from os.path import isdir, join, splitext
+
+from .mediaLogger import MediaLogger
+logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
+
+
+def _native(names):
+    # json gives back unicode, on Python 2 keep the utf-8 byte strings listdir returns
+    if str is bytes:
+        return [name.encode('utf-8') for name in names]
+    return names
+
+
+class MaskIndex(object):
+    """
+    Index of the files under the mask directory, keyed by name without extension.
+
+    It is built from directory listings only, nothing is probed. Listings
+    are kept in SQLite across runs and a directory is read again only when
+    its mtime changed, which happens whenever an entry is added, removed or
+    renamed in it.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS mask_dirs (
+            path        TEXT    PRIMARY KEY,
+            mtime       REAL    NOT NULL,
+            files       TEXT    NOT NULL,
+            subdirs     TEXT    NOT NULL
+        )
+        """
+
+    def __init__(self, root, dbPath=None):
+        self.root = root
+        self.dbPath = dbPath if dbPath else join(logger.logPath, 'mask_index.db')
+
+        self.lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+
+        # path -> (mtime, files, subdirs)
+        self.dirs = {}
+        self.names = {}
+        self._load()
+
+    def _connection(self):
+        if self._conn is None or self._pid != getpid():
+            self._conn = sqlite3.connect(self.dbPath, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(self.SCHEMA)
+            self._conn.commit()
+            self._pid = getpid()
+        return self._conn
+
+    def _load(self):
+        with self.lock:
+            for path, mtime, files, subdirs in self._connection().execute('SELECT path, mtime, files, subdirs '
+                                                                          'FROM mask_dirs'):
+                if path == self.root or path.startswith(join(self.root, '')):
+                    self.dirs[_native([path])[0]] = (mtime, _native(json.loads(files)), _native(json.loads(subdirs)))
+
+    @staticmethod
+    def _list(path, mtime):
+        files = []
+        subdirs = []
+        try:
+            for name in listdir(path):
+                (subdirs if isdir(join(path, name)) else files).append(name)
+        except OSError as e:
+            logger.error('Cannot list \'%s\': %s' % (path, e.strerror))
+        return mtime, files, subdirs
+
+    def refresh(self):
+        """ Bring the index up to date, listing only the directories changed since the last refresh """
+        start = time.time()
+        seen = set()
+        changed = []
+        stack = [self.root]
+
+        while stack:
+            path = stack.pop()
+            try:
+                mtime = stat(path).st_mtime
+            except OSError:
+                continue
+            seen.add(path)
+
+            entry = self.dirs.get(path)
+            if entry is None or entry[0] != mtime:
+                entry = self.dirs[path] = self._list(path, mtime)
+                changed.append(path)
+            stack.extend(join(path, name) for name in entry[2])
+
+        removed = [path for path in self.dirs if path not in seen]
+        for path in removed:
+            del self.dirs[path]
+
+        if changed or removed or not self.names:
+            self.names = {}
+            for path, (mtime, files, subdirs) in self.dirs.items():
+                for name in files:
+                    self.names.setdefault(splitext(name)[0], []).append(join(path, name))
+
+        with self.lock:
+            conn = self._connection()
+            conn.executemany('INSERT OR REPLACE INTO mask_dirs VALUES (?, ?, ?, ?)',
+                             [(path, self.dirs[path][0], json.dumps(self.dirs[path][1]),
+                               json.dumps(self.dirs[path][2])) for path in changed])
+            conn.executemany('DELETE FROM mask_dirs WHERE path = ?', [(path,) for path in removed])
+            conn.commit()
+
+        logger.debug('Mask index: %d directories, %d listed again, %d removed, %d names, in %.3f s.' %
+                     (len(self.dirs), len(changed), len(removed), len(self.names), time.time() - start))
+
+    def lookup(self, fileName):
+        """ Paths of the mask files named fileName, extension excluded """
+        return self.names.get(fileName, [])
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
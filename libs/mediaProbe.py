@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+# ISO 639-1 and 639-2 codes, as found in mediainfo JSON reports, to the names of its text output
+LANGUAGE_NAMES = {
+    'ar': 'Arabic', 'ara': 'Arabic',
+    'bg': 'Bulgarian', 'bul': 'Bulgarian',
+    'ca': 'Catalan', 'cat': 'Catalan',
+    'cs': 'Czech', 'ces': 'Czech', 'cze': 'Czech',
+    'da': 'Danish', 'dan': 'Danish',
+    'de': 'German', 'deu': 'German', 'ger': 'German',
+    'el': 'Greek', 'ell': 'Greek', 'gre': 'Greek',
+    'en': 'English', 'eng': 'English',
+    'es': 'Spanish', 'spa': 'Spanish',
+    'et': 'Estonian', 'est': 'Estonian',
+    'fa': 'Persian', 'fas': 'Persian', 'per': 'Persian',
+    'fi': 'Finnish', 'fin': 'Finnish',
+    'fr': 'French', 'fra': 'French', 'fre': 'French',
+    'he': 'Hebrew', 'heb': 'Hebrew',
+    'hi': 'Hindi', 'hin': 'Hindi',
+    'hr': 'Croatian', 'hrv': 'Croatian',
+    'hu': 'Hungarian', 'hun': 'Hungarian',
+    'id': 'Indonesian', 'ind': 'Indonesian',
+    'is': 'Icelandic', 'isl': 'Icelandic', 'ice': 'Icelandic',
+    'it': 'Italian', 'ita': 'Italian',
+    'ja': 'Japanese', 'jpn': 'Japanese',
+    'ko': 'Korean', 'kor': 'Korean',
+    'lt': 'Lithuanian', 'lit': 'Lithuanian',
+    'lv': 'Latvian', 'lav': 'Latvian',
+    'nl': 'Dutch', 'nld': 'Dutch', 'dut': 'Dutch',
+    'no': 'Norwegian', 'nor': 'Norwegian', 'nb': 'Norwegian Bokmal', 'nob': 'Norwegian Bokmal',
+    'pl': 'Polish', 'pol': 'Polish',
+    'pt': 'Portuguese', 'por': 'Portuguese',
+    'ro': 'Romanian', 'ron': 'Romanian', 'rum': 'Romanian',
+    'ru': 'Russian', 'rus': 'Russian',
+    'sk': 'Slovak', 'slk': 'Slovak', 'slo': 'Slovak',
+    'sl': 'Slovenian', 'slv': 'Slovenian',
+    'sr': 'Serbian', 'srp': 'Serbian',
+    'sv': 'Swedish', 'swe': 'Swedish',
+    'th': 'Thai', 'tha': 'Thai',
+    'tr': 'Turkish', 'tur': 'Turkish',
+    'uk': 'Ukrainian', 'ukr': 'Ukrainian',
+    'vi': 'Vietnamese', 'vie': 'Vietnamese',
+    'zh': 'Chinese', 'zho': 'Chinese', 'chi': 'Chinese',
+}
+
+
+def language_name(language):
+    """ Language name for an ISO 639 code like 'en' or 'en-US', names and unknown codes are returned as they are """
+    if not language:
+        return language
+    return LANGUAGE_NAMES.get(language.split('-')[0].strip().lower(), language)
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class MediaTrack(object):
+    """ One audio or subtitle stream, its language is a name like 'English' as in the mediainfo text output """
+    __slots__ = ('codec', 'language', 'channels')
+
+    def __init__(self, codec=None, language=None, channels=None):
+        self.codec = codec
+        self.language = language
+        self.channels = channels
+
+    def __repr__(self):
+        return '<MediaTrack %s %s>' % (self.codec, self.language)
+
+
+class MediaProbe(object):
+    """
+    Typed summary of `mediainfo --Output=JSON`.
+
+    Durations are in seconds, bitrates in bit/s and frame rates in fps.
+    Only the first video stream is described, like HandBrake does by default.
+    """
+    __slots__ = ('format', 'duration', 'bitrate', 'codec', 'width', 'height', 'frameRate',
+                 'audioTracks', 'subtitleTracks')
+
+    def __init__(self):
+        self.format = None
+        self.duration = None
+        self.bitrate = None
+        self.codec = None
+        self.width = None
+        self.height = None
+        self.frameRate = None
+        self.audioTracks = []
+        self.subtitleTracks = []
+
+    def __repr__(self):
+        return '<MediaProbe %s %s %sx%s>' % (self.format, self.codec, self.width, self.height)
+
+    @property
+    def hasVideo(self):
+        return self.codec is not None or self.height is not None
+
+    @property
+    def isISO(self):
+        return self.format is not None and 'ISO' in self.format
+
+    @classmethod
+    def from_json(cls, text):
+        probe = cls()
+        if not text:
+            return probe
+
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return probe
+
+        tracks = (data.get('media') or {}).get('track') or []
+        if isinstance(tracks, dict):
+            tracks = [tracks]
+
+        for track in tracks:
+            kind = track.get('@type')
+
+            if kind == 'General':
+                probe.format = track.get('Format')
+                probe.duration = _to_float(track.get('Duration'))
+                probe.bitrate = _to_int(track.get('OverallBitRate'))
+
+            elif kind == 'Video' and probe.codec is None:
+                probe.codec = track.get('Format')
+                probe.width = _to_int(track.get('Width'))
+                probe.height = _to_int(track.get('Height'))
+                probe.frameRate = _to_float(track.get('FrameRate'))
+                if probe.duration is None:
+                    probe.duration = _to_float(track.get('Duration'))
+
+            elif kind == 'Audio':
+                probe.audioTracks.append(MediaTrack(track.get('Format'), language_name(track.get('Language')),
+                                                    _to_int(track.get('Channels'))))
+
+            elif kind == 'Text':
+                probe.subtitleTracks.append(MediaTrack(track.get('Format'), language_name(track.get('Language'))))
+
+        return probe
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from os import stat
+from os.path import basename, dirname, join
+
+from .commons import convertBytes
+
+from .mediaLogger import MediaLogger
+logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
+
+
+class Placement(object):
+    """
+    Where a job reads, writes and publishes its files, and how the data gets there.
+
+    stage is 'none' (HandBrake reads the source where it is) or 'copy' (the
+    source is staged into the temporary directory). publish is 'none' (the
+    transcode is already in place), 'rename' or 'copy' (across devices).
+    """
+    __slots__ = ['inputFile', 'transFile', 'outputFile', 'stage', 'publish', 'size']
+
+    def __init__(self, inputFile, transFile, outputFile, stage, publish, size):
+        self.inputFile = inputFile
+        self.transFile = transFile
+        self.outputFile = outputFile
+        self.stage = stage
+        self.publish = publish
+        self.size = size
+
+    def describe(self):
+        return 'stage %s, publish %s' % (self.stage, self.publish)
+
+
+def device(path):
+    return stat(path).st_dev
+
+
+def plan(srcPath, tmpDir, outDir, transName, outName):
+    """
+    Compare the devices of source, temporary and output directories and pick the cheapest
+    way to stage the source and publish the transcode.
+    """
+    srcDev = device(srcPath)
+    size = stat(srcPath).st_size
+
+    if tmpDir and device(tmpDir) != srcDev:
+        stage = 'copy'
+        inputFile = join(tmpDir, basename(srcPath))
+    else:
+        # same device, a staged copy would sit on the very same disk
+        stage = 'none'
+        inputFile = srcPath
+
+    transFile = join(tmpDir if tmpDir else outDir, transName)
+    outputFile = join(outDir, outName)
+
+    if transFile == outputFile:
+        publish = 'none'
+    elif device(dirname(transFile)) == device(outDir):
+        publish = 'rename'
+    else:
+        publish = 'copy'
+
+    placement = Placement(inputFile, transFile, outputFile, stage, publish, size)
+
+    avoided = []
+    if tmpDir and stage == 'none':
+        avoided.append('staging copy of %.1f MB' % convertBytes(size))
+    if tmpDir and publish == 'rename':
+        avoided.append('publishing copy')
+    logger.info('Placement for \'%s\': %s%s' % (basename(srcPath), placement.describe(),
+                                                ', avoided %s' % ' and '.join(avoided) if avoided else ''))
+    return placement
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import sqlite3
+import threading
+
+from os import getpid, stat
+from os.path import join
+
+from .mediaLogger import MediaLogger
+logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
+
+
+class ProbeCache(object):
+    """
+    On-disk cache for the results of mediainfo and libmagic.
+
+    Entries are keyed by (st_dev, st_ino) and are valid only while size and
+    mtime still match, so a file changed on disk is probed again. Negative
+    verdicts ("not a video") are cached as well. mediainfo is stored as its raw
+    JSON report, so the parsed record can change without invalidating the cache.
+    """
+    SCHEMA_VERSION = 2
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS probes (
+            dev         INTEGER NOT NULL,
+            ino         INTEGER NOT NULL,
+            size        INTEGER NOT NULL,
+            mtime       REAL    NOT NULL,
+            path        TEXT,
+            media_info  TEXT,
+            mime        TEXT,
+            is_video    INTEGER NOT NULL,
+            is_iso      INTEGER NOT NULL,
+            last_access REAL    NOT NULL,
+            PRIMARY KEY (dev, ino)
+        )
+        """
+    COMMIT_EVERY = 200
+
+    def __init__(self, dbPath=None, maxEntries=50000):
+        self.dbPath = dbPath if dbPath else join(logger.logPath, 'probe_cache.db')
+        self.maxEntries = maxEntries
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self.lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        self._pending = 0
+
+    def _connection(self):
+        # sqlite connections must not cross a fork, reopen in child processes
+        if self._conn is None or self._pid != getpid():
+            self._conn = sqlite3.connect(self.dbPath, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            if self._conn.execute('PRAGMA user_version').fetchone()[0] != self.SCHEMA_VERSION:
+                self._conn.execute('DROP TABLE IF EXISTS probes')
+                self._conn.execute('PRAGMA user_version = %d' % self.SCHEMA_VERSION)
+            self._conn.execute(self.SCHEMA)
+            self._conn.execute('CREATE INDEX IF NOT EXISTS probes_lru ON probes (last_access)')
+            self._conn.commit()
+            self._pid = getpid()
+        return self._conn
+
+    @staticmethod
+    def file_key(filePath):
+        fileInfo = stat(filePath)
+        return fileInfo.st_dev, fileInfo.st_ino, fileInfo.st_size, fileInfo.st_mtime
+
+    def lookup(self, filePath):
+        """
+        Return a dict with 'media_info', 'mime', 'isVideo' and 'isISO' or None on a miss.
+        """
+        try:
+            dev, ino, size, mtime = self.file_key(filePath)
+        except OSError:
+            return None
+
+        with self.lock:
+            conn = self._connection()
+            row = conn.execute('SELECT size, mtime, media_info, mime, is_video, is_iso FROM probes '
+                               'WHERE dev = ? AND ino = ?', (dev, ino)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            if row[0] != size or row[1] != mtime:
+                logger.debug("'%s' changed on disk, invalidating cached probe." % filePath)
+                conn.execute('DELETE FROM probes WHERE dev = ? AND ino = ?', (dev, ino))
+                self.invalidations += 1
+                self.misses += 1
+                self._touch()
+                return None
+
+            conn.execute('UPDATE probes SET last_access = ?, path = ? WHERE dev = ? AND ino = ?',
+                         (time.time(), filePath, dev, ino))
+            self.hits += 1
+            self._touch()
+
+        return {
+            'media_info': row[2],
+            'mime': row[3],
+            'isVideo': bool(row[4]),
+            'isISO': bool(row[5]),
+        }
+
+    def store(self, filePath, media_info, mime, isVideo, isISO):
+        try:
+            dev, ino, size, mtime = self.file_key(filePath)
+        except OSError:
+            return
+
+        if isinstance(media_info, bytes):
+            media_info = media_info.decode('utf-8', 'replace')
+
+        with self.lock:
+            self._connection().execute('INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                       (dev, ino, size, mtime, filePath, media_info, mime,
+                                        int(bool(isVideo)), int(bool(isISO)), time.time()))
+            self.stores += 1
+            self._touch()
+
+    def invalidate(self, filePath):
+        try:
+            fileInfo = stat(filePath)
+        except OSError:
+            return
+
+        with self.lock:
+            self._connection().execute('DELETE FROM probes WHERE dev = ? AND ino = ?',
+                                       (fileInfo.st_dev, fileInfo.st_ino))
+            self.invalidations += 1
+            self._touch()
+
+    def clear(self):
+        with self.lock:
+            self._connection().execute('DELETE FROM probes')
+            self._connection().commit()
+            self._pending = 0
+
+    def _touch(self):
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.flush()
+
+    def _evict(self):
+        conn = self._connection()
+        count = conn.execute('SELECT COUNT(*) FROM probes').fetchone()[0]
+        excess = count - self.maxEntries
+        if self.maxEntries > 0 and excess > 0:
+            conn.execute('DELETE FROM probes WHERE rowid IN '
+                         '(SELECT rowid FROM probes ORDER BY last_access LIMIT ?)', (excess,))
+            self.evictions += excess
+            logger.debug('Probe cache: evicted %d least recently used entries.' % excess)
+
+    def flush(self):
+        with self.lock:
+            if self._conn is None:
+                return
+            self._evict()
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None:
+                self.flush()
+                self._conn.close()
+                self._conn = None
+        self.log_stats()
+
+    def log_stats(self):
+        logger.info('Probe cache: %d hits, %d misses, %d stored, %d invalidated, %d evicted' %
+                    (self.hits, self.misses, self.stores, self.invalidations, self.evictions))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from os.path import splitext
+from multiprocessing.pool import ThreadPool
+
+from .Video import Video
+from .mediaLogger import MediaLogger
+
+logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
+
+# Scan filters, cheapest first. A file reaches mediainfo only if it survived all the others.
+STAGES = ['extension', 'size', 'ledger', 'header', 'mediainfo']
+
+
+def _evaluate(item):
+    """
+    Run the scan filters on one file.
+    Returns (Video, None) for a survivor or (None, name of the stage that eliminated it).
+    """
+    filePath, kwargs, minSize = item
+    try:
+        videoFile = Video(filePath, **kwargs)
+
+        extension = splitext(filePath)[1].lower()
+        if extension in Video.EXCLUDED_EXT or extension in Video.NON_VIDEO_EXT:
+            return None, 'extension'
+
+        if videoFile.fileSize < minSize:
+            return None, 'size'
+
+        # already converted, one of our outputs or given up on after too many failures
+        if Video.JOB_LEDGER and Video.JOB_LEDGER.check(videoFile):
+            return None, 'ledger'
+
+        if not videoFile.load_cached_probe() and not videoFile.sniff_header():
+            return None, 'header'
+
+        if not videoFile.isVideo:
+            return None, 'mediainfo'
+
+        return videoFile, None
+    except Exception:
+        logger.error('Cannot open file \'%s\'' % filePath, exc_info=True)
+        return None, 'error'
+
+
+class ProbeEngine(object):
+    """
+    Bounded pool probing files concurrently.
+
+    The expensive part of a probe is the mediainfo fork and the libmagic call,
+    both of which release the GIL, so a thread pool is enough to keep all the
+    cores and the disks busy. Results always come back in input order.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = max(1, int(workers))
+        self.eliminated = dict((stage, 0) for stage in STAGES + ['error'])
+        self.accepted = 0
+
+    def _map(self, function, items):
+        if self.workers == 1 or len(items) < 2:
+            return [function(item) for item in items]
+
+        pool = ThreadPool(min(self.workers, len(items)))
+        try:
+            return pool.map(function, items, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    @staticmethod
+    def _normalize(items):
+        return [item if type(item) == tuple else (item, {}) for item in items]
+
+    def probe(self, items):
+        """
+        Build a Video for every item, an item is a file path or a (file path, Video kwargs) tuple.
+        Video attributes are lazy, nothing is probed until they are read.
+        """
+        return [Video(filePath, **kwargs) for filePath, kwargs in self._normalize(items)]
+
+    def scan(self, items, minSize=0):
+        """
+        Run the scan filters on every item and return the video files bigger than minSize (MB),
+        in input order.
+        """
+        retList = []
+        items = [(filePath, kwargs, minSize) for filePath, kwargs in self._normalize(items)]
+
+        for videoFile, stage in self._map(_evaluate, items):
+            if videoFile:
+                retList.append(videoFile)
+                self.accepted += 1
+            else:
+                self.eliminated[stage] += 1
+
+        self.log_stats()
+        return retList
+
+    def log_stats(self):
+        logger.info('Scan filters: %s, %d errors, %d accepted' %
+                    (', '.join('%d by %s' % (self.eliminated[stage], stage) for stage in STAGES),
+                     self.eliminated['error'], self.accepted))
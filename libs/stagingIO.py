@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import errno
+import fcntl
+import ctypes
+import ctypes.util
+
+from shutil import copyfileobj
+
+from .commons import convertBytes
+
+from .mediaLogger import MediaLogger
+logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+POSIX_FADV_DONTNEED = 4
+
+CHUNK_SIZE = 64 * 1024 * 1024
+# files below this size are not worth dropping from the page cache
+DONTNEED_SIZE = 64 * 1024 * 1024
+
+_libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+if hasattr(_libc, 'copy_file_range'):
+    _libc.copy_file_range.restype = ctypes.c_ssize_t
+    _libc.copy_file_range.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p,
+                                      ctypes.c_size_t, ctypes.c_uint]
+_libc.sendfile.restype = ctypes.c_ssize_t
+_libc.sendfile.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t]
+_libc.posix_fadvise.argtypes = [ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_int]
+
+# errors meaning "not supported for these files", the next strategy is tried
+UNSUPPORTED = (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF, errno.EPERM)
+
+
+def _copy_file_range(fdIn, fdOut, count):
+    if hasattr(os, 'copy_file_range'):
+        return os.copy_file_range(fdIn, fdOut, count)
+    if not hasattr(_libc, 'copy_file_range'):
+        raise OSError(errno.ENOSYS, 'copy_file_range not available')
+    copied = _libc.copy_file_range(fdIn, None, fdOut, None, count, 0)
+    if copied < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return copied
+
+
+def _sendfile(fdIn, fdOut, count):
+    if hasattr(os, 'sendfile'):
+        return os.sendfile(fdOut, fdIn, None, count)
+    copied = _libc.sendfile(fdOut, fdIn, None, count)
+    if copied < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return copied
+
+
+def drop_cache(fd):
+    """ Tell the kernel we will not read fd again, so it can drop its pages from the cache """
+    try:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, POSIX_FADV_DONTNEED)
+        else:
+            _libc.posix_fadvise(fd, 0, 0, POSIX_FADV_DONTNEED)
+    except OSError:
+        pass
+
+
+def _reflink(fdIn, fdOut):
+    fcntl.ioctl(fdOut, FICLONE, fdIn)
+
+
+def _kernel_copy(fdIn, fdOut, size):
+    """ Copy with copy_file_range or sendfile, returns the call used or None if neither is supported """
+    for name, function in [('copy_file_range', _copy_file_range), ('sendfile', _sendfile)]:
+        copied = 0
+        try:
+            while copied < size:
+                count = function(fdIn, fdOut, min(CHUNK_SIZE, size - copied))
+                if count == 0:
+                    raise IOError(errno.EIO, '%s copied %d of %d bytes' % (name, copied, size))
+                copied += count
+        except (IOError, OSError) as e:
+            # failing before writing anything means the call is not supported for these files
+            if e.errno not in UNSUPPORTED or copied:
+                raise
+            continue
+        return name
+    return None
+
+
+def copy_file(src, dst, reflink=True):
+    """
+    Copy src to dst without moving the data through user space.
+
+    Tries, in order, a reflink (shared extents, instant on btrfs/XFS),
+    copy_file_range, sendfile and finally a plain read/write loop.
+    Big files are dropped from the page cache once copied. Returns the
+    name of the method used.
+    """
+    start = time.time()
+    size = os.stat(src).st_size
+    method = None
+
+    with open(src, 'rb') as fileIn:
+        with open(dst, 'wb') as fileOut:
+            fdIn, fdOut = fileIn.fileno(), fileOut.fileno()
+
+            if reflink:
+                try:
+                    _reflink(fdIn, fdOut)
+                    method = 'reflink'
+                except (IOError, OSError) as e:
+                    if e.errno not in UNSUPPORTED:
+                        raise
+
+            if method is None:
+                method = _kernel_copy(fdIn, fdOut, size)
+
+            if method is None:
+                copyfileobj(fileIn, fileOut, 1024 * 1024)
+                method = 'read/write'
+
+            if size >= DONTNEED_SIZE and method != 'reflink':
+                fileOut.flush()
+                os.fdatasync(fdOut)
+                drop_cache(fdIn)
+                drop_cache(fdOut)
+
+    log_transfer(method, src, dst, size, time.time() - start)
+    return method
+
+
+def move_file(src, dst):
+    """ Rename src to dst, copying and removing the source only across filesystems """
+    start = time.time()
+    try:
+        os.rename(src, dst)
+        log_transfer('rename', src, dst, os.stat(dst).st_size, time.time() - start)
+        return 'rename'
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    try:
+        method = copy_file(src, dst)
+    except:
+        discard_file(dst)  # no partial copy at the destination
+        raise
+    os.remove(src)
+    return method
+
+
+def discard_file(path):
+    """ Remove a staged copy or a partial output if it is there, returns True if it was """
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            logger.error('Cannot remove "%s": %s' % (path, e))
+        return False
+    logger.debug('rm "%s"' % path)
+    return True
+
+
+def log_transfer(method, src, dst, size, elapsed):
+    rate = '%.1f MB/s' % convertBytes(size / elapsed) if elapsed > 0 else 'instant'
+    logger.info('%s "%s" -> "%s": %.1f MB in %.2fs (%s)' % (method, src, dst, convertBytes(size), elapsed, rate))
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import sqlite3
+import threading
+
+from os import getpid
+from os.path import join
+
+from .mediaLogger import MediaLogger
+logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
+
+
+class TorrentCache(object):
+    """
+    Last known state of the torrents of a Transmission server, kept across runs.
+
+    Torrents are keyed by hashString, the only identifier stable across
+    daemon restarts. For each one the session id and whether it was complete
+    are stored, so a poll can tell which torrents reached 100% since the
+    previous one.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS torrents (
+            server      TEXT    NOT NULL,
+            hash        TEXT    NOT NULL,
+            id          INTEGER NOT NULL,
+            name        TEXT,
+            complete    INTEGER NOT NULL,
+            updated     REAL    NOT NULL,
+            PRIMARY KEY (server, hash)
+        )
+        """
+    SYNC_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sync (
+            server      TEXT    PRIMARY KEY,
+            last_full   REAL    NOT NULL,
+            last_poll   REAL    NOT NULL
+        )
+        """
+
+    def __init__(self, server, dbPath=None):
+        self.server = server
+        self.dbPath = dbPath if dbPath else join(logger.logPath, 'torrents.db')
+
+        self.lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+
+        self.torrents = {}
+        self.lastFullSync = 0.0
+        self.lastPoll = 0.0
+        self._load()
+
+    def _connection(self):
+        if self._conn is None or self._pid != getpid():
+            self._conn = sqlite3.connect(self.dbPath, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(self.SCHEMA)
+            self._conn.execute(self.SYNC_SCHEMA)
+            self._conn.commit()
+            self._pid = getpid()
+        return self._conn
+
+    def _load(self):
+        with self.lock:
+            conn = self._connection()
+            for hashString, torrentID, complete in conn.execute('SELECT hash, id, complete FROM torrents '
+                                                                'WHERE server = ?', (self.server,)):
+                self.torrents[hashString] = (torrentID, bool(complete))
+            row = conn.execute('SELECT last_full, last_poll FROM sync WHERE server = ?', (self.server,)).fetchone()
+            if row:
+                self.lastFullSync, self.lastPoll = row
+        logger.debug('Torrent cache: %d torrents known for %s.' % (len(self.torrents), self.server))
+
+    def __len__(self):
+        return len(self.torrents)
+
+    def get(self, hashString):
+        """ Returns (torrent id, complete) or None for an unknown torrent """
+        return self.torrents.get(hashString)
+
+    def put(self, hashString, torrentID, name, complete):
+        state = (torrentID, bool(complete))
+        if self.torrents.get(hashString) == state:
+            return
+        with self.lock:
+            self.torrents[hashString] = state
+            self._connection().execute('INSERT OR REPLACE INTO torrents VALUES (?, ?, ?, ?, ?, ?)',
+                                       (self.server, hashString, torrentID, name, int(bool(complete)),
+                                        time.time()))
+
+    def _delete(self, hashes):
+        with self.lock:
+            for hashString in hashes:
+                del self.torrents[hashString]
+                self._connection().execute('DELETE FROM torrents WHERE server = ? AND hash = ?',
+                                           (self.server, hashString))
+        return len(hashes)
+
+    def remove_ids(self, torrentIDs):
+        """ Forget the torrents with the given session ids """
+        torrentIDs = set(torrentIDs)
+        return self._delete([hashString for hashString, state in self.torrents.items() if state[0] in torrentIDs])
+
+    def retain(self, hashes):
+        """ Forget every torrent not in hashes """
+        hashes = set(hashes)
+        return self._delete([hashString for hashString in self.torrents if hashString not in hashes])
+
+    def mark_sync(self, full=False):
+        """ Record a completed poll and write the changes to disk """
+        with self.lock:
+            self.lastPoll = time.time()
+            if full:
+                self.lastFullSync = self.lastPoll
+            conn = self._connection()
+            conn.execute('INSERT OR REPLACE INTO sync VALUES (?, ?, ?)',
+                         (self.server, self.lastFullSync, self.lastPoll))
+            conn.commit()
+
+    def close(self):
+        with self.lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+from multiprocessing import cpu_count
+
+from .Video import terminate_transcodes
+from .mediaLogger import MediaLogger
+
+logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
+
+
+class TranscodeScheduler(object):
+    """
+    Runs up to `jobs` transcodes at the same time.
+
+    The thread budget is split evenly between the running jobs, every job
+    gets `encoderThreads` x264 threads. A failing job is logged and does not
+    affect the others.
+    """
+
+    def __init__(self, jobs=1, threadBudget=None):
+        self.threadBudget = max(1, int(threadBudget) if threadBudget else cpu_count())
+        self.jobs = max(1, min(int(jobs), self.threadBudget))
+        self.encoderThreads = max(1, self.threadBudget // self.jobs)
+
+        self.queue = Queue()
+        self.stopping = threading.Event()
+        self.workers = []
+
+        self.lock = threading.Lock()
+        self.done = 0
+        self.failed = 0
+
+    def start(self):
+        logger.info('Starting %d transcode jobs with %d encoder threads each.' % (self.jobs, self.encoderThreads))
+        for n in range(self.jobs):
+            worker = threading.Thread(target=self._worker, name='transcode-%d' % n)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, name, function, *args, **kwargs):
+        """ Queue function(*args, encoderThreads=N, **kwargs) """
+        if self.stopping.is_set():
+            logger.info('Scheduler is shutting down, \'%s\' not queued.' % name)
+            return
+        self.queue.put((name, function, args, kwargs))
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.stopping.is_set():
+                continue
+
+            name, function, args, kwargs = item
+
+            try:
+                logger.debug('Job \'%s\' started.' % name)
+                function(*args, encoderThreads=self.encoderThreads, **kwargs)
+                with self.lock:
+                    self.done += 1
+                logger.debug('Job \'%s\' finished.' % name)
+            except (Exception, SystemExit):
+                with self.lock:
+                    self.failed += 1
+                logger.error('Job \'%s\' failed.' % name, exc_info=True)
+
+    def shutdown(self, wait=True, cancel=False):
+        """
+        Stop the workers once the queue is drained (wait) or right away (cancel).
+        Cancelling drops the pending jobs and terminates the running encoders.
+        """
+        if cancel:
+            self.stopping.set()
+            dropped = 0
+            while True:
+                try:
+                    self.queue.get_nowait()
+                    dropped += 1
+                except Empty:
+                    break
+            logger.info('Transcode scheduler cancelled, %d pending jobs dropped.' % dropped)
+            terminate_transcodes()
+
+        # one sentinel per worker, queued after the pending jobs
+        for worker in self.workers:
+            self.queue.put(None)
+
+        if wait:
+            # join with a timeout, a plain join would block signals on Python 2
+            for worker in self.workers:
+                while worker.is_alive():
+                    worker.join(1)
+
+        logger.info('Transcode scheduler stopped: %d jobs done, %d failed.' % (self.done, self.failed))
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+
+from collections import OrderedDict
+from os.path import isdir, join
+
+from .mediaLogger import MediaLogger
+logger = MediaLogger(__name__, level=MediaLogger.DEBUG)
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+IN_ONLYDIR     = 0x01000000
+IN_ISDIR       = 0x40000000
+
+IN_CLOEXEC     = 0o2000000
+IN_NONBLOCK    = 0o0004000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+EVENT_HEADER = struct.Struct('iIII')
+
+_libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+
+def _encode(path):
+    if isinstance(path, bytes):
+        return path
+    return path.encode(sys.getfilesystemencoding())
+
+
+def _decode(path):
+    if str is bytes:
+        return path
+    return path.decode(sys.getfilesystemencoding(), 'surrogateescape')
+
+
+class Inotify(object):
+    """
+    Minimal ctypes binding of the Linux inotify API with recursive directory watches.
+    """
+
+    def __init__(self):
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, 'inotify_init1: %s' % os.strerror(err))
+        self.paths = {}
+
+    def add_watch(self, path):
+        wd = _libc.inotify_add_watch(self.fd, _encode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            logger.error('Cannot watch \'%s\': %s' % (path, os.strerror(err)))
+            return
+        self.paths[wd] = path
+
+    def add_tree(self, root):
+        """ Watch root and all its subdirectories, returns the files already in there """
+        found = []
+        for path, subdirs, files in os.walk(root):
+            self.add_watch(path)
+            found.extend(join(path, name) for name in files)
+        return found
+
+    def read_events(self):
+        """ Returns a list of (path, mask) for all the queued events """
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    return events
+                raise
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    events.append((None, mask))
+                    continue
+                if mask & IN_IGNORED:
+                    self.paths.pop(wd, None)
+                    continue
+                if wd not in self.paths:
+                    continue
+
+                events.append((join(self.paths[wd], _decode(name)) if name else self.paths[wd], mask))
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class EventQueue(object):
+    """
+    Bounded queue coalescing bursts of events on the same file.
+
+    A path is released once it had no events for `settle` seconds, so a file
+    being copied in is processed once, after the copy is over. When the queue
+    is full the oldest path is dropped and `overflowed` is set, the caller is
+    expected to run a reconciliation scan.
+    """
+
+    def __init__(self, maxSize=10000, settle=10.0):
+        self.maxSize = maxSize
+        self.settle = settle
+        self.pending = OrderedDict()
+        self.overflowed = False
+
+    def __len__(self):
+        return len(self.pending)
+
+    def put(self, path):
+        if path in self.pending:
+            del self.pending[path]
+        elif len(self.pending) >= self.maxSize:
+            self.pending.popitem(last=False)
+            self.overflowed = True
+        self.pending[path] = time.time()
+
+    def pop_settled(self):
+        ready = []
+        limit = time.time() - self.settle
+        # ordered by last event, stop at the first path still busy
+        for path, lastEvent in list(self.pending.items()):
+            if lastEvent > limit:
+                break
+            del self.pending[path]
+            ready.append(path)
+        return ready
+
+
+class Watcher(object):
+    """
+    Long running loop feeding new or modified files to a callback.
+
+    onFiles(paths) receives settled files, onReconcile() is called every
+    `reconcileInterval` seconds and after an event queue overflow as a safety
+    net for anything inotify missed.
+    """
+
+    def __init__(self, reconcileInterval=3600, maxEvents=10000, settle=10.0):
+        self.inotify = Inotify()
+        self.queue = EventQueue(maxEvents, settle)
+        self.reconcileInterval = reconcileInterval
+        self.stopping = False
+
+    def add_tree(self, root):
+        logger.info('Watching \'%s\'' % root)
+        self.inotify.add_tree(root)
+
+    def stop(self):
+        self.stopping = True
+
+    def _dispatch(self, events):
+        for path, mask in events:
+            if path is None:
+                logger.info('inotify queue overflow, a reconciliation scan will follow.')
+                self.queue.overflowed = True
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                continue
+            elif mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and isdir(path):
+                    for filePath in self.inotify.add_tree(path):
+                        self.queue.put(filePath)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self.queue.put(path)
+
+    def run(self, onFiles, onReconcile):
+        nextReconcile = time.time() + self.reconcileInterval
+
+        try:
+            while not self.stopping:
+                try:
+                    ready, _, _ = select.select([self.inotify.fd], [], [], 1.0)
+                except (select.error, OSError, IOError) as e:
+                    if e.args[0] != errno.EINTR:
+                        raise
+                    continue
+
+                if ready:
+                    self._dispatch(self.inotify.read_events())
+
+                settled = self.queue.pop_settled()
+                if settled:
+                    logger.debug('%d files changed, %d still pending.' % (len(settled), len(self.queue)))
+                    onFiles(settled)
+
+                if self.queue.overflowed or time.time() >= nextReconcile:
+                    self.queue.overflowed = False
+                    logger.info('Running reconciliation scan.')
+                    onReconcile()
+                    nextReconcile = time.time() + self.reconcileInterval
+        finally:
+            self.inotify.close()
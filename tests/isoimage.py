@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal ISO9660 image writer for the tests and the benchmarks.
+
+Only what the iso9660 package reads is written: the primary volume descriptor, the
+path tables, directory records and file extents. A bare UDF volume can be added next to
+it, its root directory listing the given names, enough for iso9660.disc_type.
+"""
+
+import struct
+
+SECTOR_SIZE = 2048
+UDF_ANCHOR = 256
+UDF_SECTORS = 8  # anchor, volume descriptor sequence and the partition, see _write_udf
+RECORD_DATE = struct.pack('<6Bb', 117, 6, 15, 12, 30, 0, 8)  # 2017-06-15 12:30:00 GMT+2
+
+
+def both16(value):
+    return struct.pack('<H', value) + struct.pack('>H', value)
+
+
+def both32(value):
+    return struct.pack('<I', value) + struct.pack('>I', value)
+
+
+def sectors(length):
+    return max(1, (length + SECTOR_SIZE - 1) // SECTOR_SIZE)
+
+
+class Node(object):
+    def __init__(self, name, parent=None, data=None):
+        self.name = name
+        self.parent = parent
+        self.data = data  # None for directories
+        self.children = {}
+        self.ex_loc = None
+        self.ex_len = None
+
+    @property
+    def is_dir(self):
+        return self.data is None
+
+    def records(self):
+        """ Lengths of the directory records of a directory, '.' and '..' first """
+        return [34, 34] + [record_length(child.record_name) for child in self.sorted_children()]
+
+    def sorted_children(self):
+        return [self.children[name] for name in sorted(self.children)]
+
+    @property
+    def record_name(self):
+        return self.name if self.is_dir else self.name + ';1'
+
+
+def record_length(name):
+    length = 33 + len(name)
+    return length + length % 2
+
+
+def dir_record(node, name):
+    length = record_length(name) if name not in ('\x00', '\x01') else 34
+    record = struct.pack('<BB', length, 0) + both32(node.ex_loc) + both32(node.ex_len) + RECORD_DATE
+    record += struct.pack('<BBB', 2 if node.is_dir else 0, 0, 0) + both16(1) + struct.pack('<B', len(name)) + name
+    return record + '\x00' * (length - len(record))
+
+
+def directory_size(node):
+    """ Records do not cross sectors, a sector is padded when the next record does not fit """
+    size = 0
+    for length in node.records():
+        if size % SECTOR_SIZE + length > SECTOR_SIZE:
+            size += SECTOR_SIZE - size % SECTOR_SIZE
+        size += length
+    return sectors(size) * SECTOR_SIZE
+
+
+def build_image(path, files, directories=(), udf_root=None, volume='TEST'):
+    """
+    Write an image to path.
+
+     * files, {'/DIR/NAME.EXT': data}, parent directories are created as needed.
+     * directories, paths of directories to create even if empty.
+     * udf_root, names of the root directory of a UDF volume written along, None for no UDF.
+    """
+    root = Node('\x00')
+    for name in list(directories) + list(files):
+        parts = name.strip('/').split('/')
+        node = root
+        for part in parts[:-1] if name in files else parts:
+            node = node.children.setdefault(part, Node(part, node))
+        if name in files:
+            node.children[parts[-1]] = Node(parts[-1], node, files[name])
+
+    # breadth first, parents come before their children in the path table
+    dirs = [root]
+    for node in dirs:
+        dirs.extend(child for child in node.sorted_children() if child.is_dir)
+    number = dict((id(node), i + 1) for i, node in enumerate(dirs))
+
+    path_table = ''
+    for node in dirs:
+        name = node.name
+        entry = struct.pack('<BBIH', len(name), 0, 0, number[id(node.parent)] if node.parent else 1) + name
+        path_table += entry + '\x00' * (len(name) % 2)
+    table_sectors = sectors(len(path_table))
+
+    # 16 PVD, 17 terminator, 18-20 UDF volume recognition, then the L and M path tables
+    next_sector = [21 + 2 * table_sectors]
+
+    def allocate(count):
+        start = next_sector[0]
+        if udf_root is not None and start < UDF_ANCHOR + UDF_SECTORS and start + count > UDF_ANCHOR:
+            start = UDF_ANCHOR + UDF_SECTORS
+        next_sector[0] = start + count
+        return start
+
+    for node in dirs:
+        node.ex_len = directory_size(node)
+        node.ex_loc = allocate(node.ex_len // SECTOR_SIZE)
+    for node in dirs:
+        for child in node.sorted_children():
+            if not child.is_dir:
+                child.ex_len = len(child.data)
+                child.ex_loc = allocate(sectors(child.ex_len))
+    total = max(next_sector[0], UDF_ANCHOR + UDF_SECTORS if udf_root is not None else 0)
+
+    image = bytearray(total * SECTOR_SIZE)
+
+    def put(sector, data, offset=0):
+        start = sector * SECTOR_SIZE + offset
+        image[start:start + len(data)] = data
+
+    # path tables, now that the extents are known
+    l_table = m_table = ''
+    for node in dirs:
+        name = node.name
+        parent = number[id(node.parent)] if node.parent else 1
+        pad = '\x00' * (len(name) % 2)
+        l_table += struct.pack('<BBIH', len(name), 0, node.ex_loc, parent) + name + pad
+        m_table += struct.pack('>BBIH', len(name), 0, node.ex_loc, parent) + name + pad
+    put(21, l_table)
+    put(21 + table_sectors, m_table)
+
+    for node in dirs:
+        records = [dir_record(node, '\x00'), dir_record(node.parent or node, '\x01')]
+        records += [dir_record(child, child.record_name) for child in node.sorted_children()]
+        offset = 0
+        for record in records:
+            if offset % SECTOR_SIZE + len(record) > SECTOR_SIZE:
+                offset += SECTOR_SIZE - offset % SECTOR_SIZE
+            put(node.ex_loc, record, offset)
+            offset += len(record)
+        for child in node.sorted_children():
+            if not child.is_dir:
+                put(child.ex_loc, child.data)
+
+    pvd = '\x01CD001\x01\x00' + 'LINUX'.ljust(32) + volume.ljust(32) + '\x00' * 8 + both32(total) + '\x00' * 32
+    pvd += both16(1) + both16(1) + both16(SECTOR_SIZE) + both32(len(path_table))
+    pvd += struct.pack('<II', 21, 0) + struct.pack('>II', 21 + table_sectors, 0)
+    pvd += dir_record(root, '\x00')
+    pvd += ' ' * (128 * 4 + 37 * 3) + ('0' * 16 + '\x00') * 4 + '\x01'
+    put(16, pvd)
+    put(17, '\xffCD001\x01')
+
+    if udf_root is not None:
+        for sector, identifier in ((18, 'BEA01'), (19, 'NSR02'), (20, 'TEA01')):
+            put(sector, '\x00' + identifier + '\x01')
+        _write_udf(put, udf_root)
+
+    with open(path, 'wb') as f:
+        f.write(image)
+    return dict((node_path(node), node) for node in _walk(root))
+
+
+def node_path(node):
+    names = []
+    while node.parent is not None:
+        names.append(node.name)
+        node = node.parent
+    return '/' + '/'.join(reversed(names))
+
+
+def _walk(node):
+    yield node
+    for child in node.sorted_children():
+        for descendant in _walk(child):
+            yield descendant
+
+
+##
+## UDF, one physical partition holding the file set descriptor, the root file entry and its directory
+##
+
+def udf_tag(identifier, location, body):
+    """ A descriptor tag in front of body, checksum filled in and no CRC """
+    tag = bytearray(struct.pack('<HHBBHHHI', identifier, 2, 0, 0, 0, 0, 0, location))
+    tag[4] = sum(tag[:4] + tag[5:]) & 0xFF
+    return str(tag) + body
+
+
+def udf_fid(name, characteristics, icb_lbn):
+    encoded = ('\x08' + name) if name else ''
+    body = struct.pack('<HBB', 1, characteristics, len(encoded))
+    body += struct.pack('<IIH6x', SECTOR_SIZE, icb_lbn, 0) + struct.pack('<H', 0) + encoded
+    fid = udf_tag(257, 0, body)
+    return fid + '\x00' * (-len(fid) % 4)
+
+
+def _write_udf(put, names):
+    vds = UDF_ANCHOR + 1
+    partition = UDF_ANCHOR + 4
+
+    # anchor: main volume descriptor sequence extent
+    put(UDF_ANCHOR, udf_tag(2, UDF_ANCHOR, struct.pack('<II', 3 * SECTOR_SIZE, vds)))
+
+    # partition descriptor, number 0 at offset 22 and start at offset 188
+    body = bytearray(SECTOR_SIZE - 16)
+    body[22 - 16:24 - 16] = struct.pack('<H', 0)
+    body[188 - 16:196 - 16] = struct.pack('<II', partition, UDF_SECTORS - 4)
+    put(vds, udf_tag(5, vds, str(body)))
+
+    # logical volume descriptor, file set descriptor at lbn 0 and one type 1 partition map
+    body = bytearray(SECTOR_SIZE - 16)
+    body[248 - 16:258 - 16] = struct.pack('<IIH', SECTOR_SIZE, 0, 0)
+    body[264 - 16:272 - 16] = struct.pack('<II', 6, 1)
+    body[440 - 16:446 - 16] = struct.pack('<BBHH', 1, 6, 1, 0)
+    put(vds + 1, udf_tag(6, vds + 1, str(body)))
+    put(vds + 2, udf_tag(8, vds + 2, ''))
+
+    # file set descriptor, root directory ICB at offset 400
+    body = bytearray(SECTOR_SIZE - 16)
+    body[400 - 16:410 - 16] = struct.pack('<IIH', SECTOR_SIZE, 1, 0)
+    put(partition, udf_tag(256, 0, str(body)))
+
+    directory = udf_fid('', 8 | 2, 1) + ''.join(udf_fid(name, 2, 1) for name in names)
+
+    # root file entry, short allocation descriptors (ICB flags 0) pointing at lbn 2
+    body = bytearray(176 - 16)
+    body[34 - 16:36 - 16] = struct.pack('<H', 0)
+    body[168 - 16:176 - 16] = struct.pack('<II', 0, 8)
+    put(partition + 1, udf_tag(261, 1, str(body) + struct.pack('<II', len(directory), 2)))
+    put(partition + 2, directory)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in Transmission RPC server for the tests and the benchmarks.
+
+A threaded HTTP/1.1 server answering the 409 session-id handshake and, when asked to,
+Basic or Digest authentication, the way Transmission does. It counts the connections
+and the requests it gets, and can delay, drop or close after a request to reproduce
+the failures of a real server.
+"""
+
+import re
+import json
+import time
+import base64
+import hashlib
+import threading
+
+from six.moves import BaseHTTPServer, socketserver
+
+SESSION_ID = 'x2uvbq7YIaSTUHFAgcBlkPmHbTXFGUkLflJqZnvKNSb9Hqpy'
+REALM = 'Transmission'
+AUTH_PARAM = re.compile(r'(\w+)=(?:"([^"]*)"|([^\s,]*))')
+SESSION = {'rpc-version': 15, 'rpc-version-minimum': 1, 'version': '2.94 (d8e60ee44f)'}
+
+
+def md5(text):
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+class RPCHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    # a response goes out in one write, like Transmission sends it
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.requests.append((self.headers.get('Authorization'), self.headers.get('X-Transmission-Session-Id')))
+            action = server.actions.pop(0) if server.actions else None
+
+        if action == 'drop':  # the request is read, no response comes back
+            self.close_connection = True
+            return
+        if action is not None and action.startswith('delay'):
+            time.sleep(float(action.split(' ')[1]))
+
+        challenge = self._challenge()
+        if challenge:
+            return self._reply(401, '', [('WWW-Authenticate', challenge)])
+        if self.headers.get('X-Transmission-Session-Id') != server.session_id:
+            return self._reply(409, '', [('X-Transmission-Session-Id', server.session_id)])
+
+        query = json.loads(body.decode('utf-8'))
+        arguments = dict(SESSION) if query.get('method') in ('session-get', 'session-stats') else {}
+        arguments.update(server.arguments)
+        self._reply(200, json.dumps({'arguments': arguments, 'result': 'success', 'tag': query.get('tag')}))
+        if action == 'close':  # closes its end without telling the client
+            self.close_connection = True
+
+    def _challenge(self):
+        """ WWW-Authenticate header of a 401 when the request is not authorized, None otherwise """
+        server = self.server
+        authorization = self.headers.get('Authorization') or ''
+        if server.auth == 'basic':
+            credentials = ('%s:%s' % (server.login, server.password)).encode('utf-8')
+            if authorization != 'Basic ' + base64.b64encode(credentials).decode('ascii'):
+                return 'Basic realm="%s"' % REALM
+        elif server.auth == 'digest':
+            params = dict((key, quoted or plain) for key, quoted, plain in AUTH_PARAM.findall(authorization))
+            if not authorization.startswith('Digest ') or 'response' not in params:
+                return self._digest_challenge()
+            ha1 = md5('%s:%s:%s' % (server.login, REALM, server.password))
+            ha2 = md5('POST:%s' % params.get('uri'))
+            expected = md5(':'.join([ha1, params.get('nonce', ''), params.get('nc', ''), params.get('cnonce', ''),
+                                     params.get('qop', ''), ha2]))
+            if params.get('username') != server.login or params['response'] != expected:
+                return self._digest_challenge()
+            if params['nonce'] != server.nonce:
+                return self._digest_challenge(stale=True)
+        return None
+
+    def _digest_challenge(self, stale=False):
+        challenge = 'Digest realm="%s", nonce="%s", qop="auth", opaque="0123"' % (REALM, self.server.nonce)
+        return challenge + (', stale=true' if stale else '')
+
+    def _reply(self, status, body, headers=()):
+        body = body.encode('utf-8')
+        self.send_response(status)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RPCServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    Serves on a free port of 127.0.0.1 from a daemon thread, until stop().
+
+     * auth, None, 'basic' or 'digest'.
+     * actions, queue of what to do with the next requests: None to answer, 'drop' to close
+       without answering, 'close' to answer then close, 'delay <seconds>' to answer late.
+     * arguments, added to the arguments of every response.
+    """
+    daemon_threads = True
+
+    def __init__(self, auth=None, login='user', password='secret'):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), RPCHandler)
+        self.auth = auth
+        self.login = login
+        self.password = password
+        self.session_id = SESSION_ID
+        self.nonce = 'dcd98b7102dd2f0e8b11d0f600bfb0c093'
+        self.actions = []
+        self.arguments = {}
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = []  # (Authorization, X-Transmission-Session-Id) of each request
+        self.port = self.server_address[1]
+        self.url = 'http://127.0.0.1:%d/transmission/rpc' % self.port
+        thread = threading.Thread(target=self.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+
+    def handle_error(self, request, client_address):
+        pass  # clients resetting their connections is what the tests are about
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import json
+import unittest
+
+try:
+    from transmissionrpc import Client
+    from transmissionrpc.error import TransmissionError
+except ImportError:  # six, a dependency of transmissionrpc, is not installed
+    Client = None
+
+if Client is not None:
+    class RecordingClient(Client):
+        """ Client answering its own RPCs, recording the ones sent after the session-get of the constructor """
+
+        def __init__(self, failing=()):
+            self.sent = []
+            self.failing = failing
+            Client.__init__(self, 'localhost', 9091)
+
+        def _http_query(self, query, timeout=None, stream=False):
+            query = json.loads(query)
+            arguments = {}
+            if query['method'] == 'session-get':
+                arguments = {'rpc-version': 15, 'version': '2.94 (d8e60ee44f)'}
+            else:
+                self.sent.append((query['method'], query['arguments']))
+            result = 'failed' if query['method'] in self.failing else 'success'
+            return json.dumps({'arguments': arguments, 'result': result, 'tag': query['tag']})
+
+
+@unittest.skipIf(Client is None, 'transmissionrpc dependencies missing')
+class BatchTest(unittest.TestCase):
+
+    def test_combined(self):
+        client = RecordingClient()
+        with client.batch():
+            client.stop_torrent(1)
+            client.stop_torrent([2, 3])
+            client.stop_torrent(1)
+        self.assertEqual(client.sent, [('torrent-stop', {'ids': [1, 2, 3]})])
+
+    def test_other_arguments(self):
+        client = RecordingClient()
+        with client.batch():
+            client.remove_torrent(1)
+            client.remove_torrent(2, delete_data=True)
+            client.remove_torrent(3)
+        self.assertEqual(client.sent, [('torrent-remove', {'ids': [1, 3], 'delete-local-data': False}),
+                                       ('torrent-remove', {'ids': [2], 'delete-local-data': True})])
+
+    def test_order_on_a_torrent_is_kept(self):
+        client = RecordingClient()
+        with client.batch():
+            client.stop_torrent(1)
+            client.verify_torrent(1)
+            client.verify_torrent(2)
+            client.stop_torrent(2)
+            # stopping 1 again would overtake its verify
+            client.stop_torrent(1)
+        self.assertEqual(client.sent, [('torrent-stop', {'ids': [1]}), ('torrent-verify', {'ids': [1, 2]}),
+                                       ('torrent-stop', {'ids': [2, 1]})])
+
+    def test_not_batched_outside(self):
+        client = RecordingClient()
+        self.assertIsNone(client.stop_torrent(1))
+        self.assertEqual(client.sent, [('torrent-stop', {'ids': [1]})])
+
+    def test_size(self):
+        client = RecordingClient()
+        with client.batch(size=3):
+            first = client.stop_torrent([1, 2])
+            self.assertEqual(client.sent, [])
+            client.stop_torrent(3)
+            # the group reached 3 ids and was sent
+            self.assertEqual(client.sent, [('torrent-stop', {'ids': [1, 2, 3]})])
+            self.assertTrue(first.done)
+            client.stop_torrent(4)
+        self.assertEqual(client.sent[1:], [('torrent-stop', {'ids': [4]})])
+
+    def test_nested(self):
+        client = RecordingClient()
+        with client.batch() as outer:
+            client.stop_torrent(1)
+            with client.batch() as inner:
+                self.assertIs(inner, outer)
+                client.stop_torrent(2)
+            self.assertEqual(client.sent, [])
+            client.stop_torrent(3)
+        self.assertEqual(client.sent, [('torrent-stop', {'ids': [1, 2, 3]})])
+        self.assertIsNone(client._batch)
+
+    def test_results_and_errors(self):
+        client = RecordingClient(failing=['torrent-verify'])
+        with client.batch(raise_errors=False):
+            calls = [client.stop_torrent(1), client.verify_torrent(2), client.stop_torrent(3),
+                     client.verify_torrent(4)]
+            self.assertRaises(TransmissionError, calls[0].get)  # not sent yet
+        self.assertEqual([call.method for call in calls], ['torrent-stop', 'torrent-verify'] * 2)
+        self.assertEqual([call.ids for call in calls], [[1], [2], [3], [4]])
+        self.assertTrue(all(call.done for call in calls))
+        self.assertIsNone(calls[0].get())
+        self.assertIsNone(calls[2].get())
+        for call in calls[1::2]:
+            self.assertIsInstance(call.error, TransmissionError)
+            self.assertRaises(TransmissionError, call.get)
+        self.assertIs(calls[1].error, calls[3].error)
+
+    def test_raise_errors(self):
+        client = RecordingClient(failing=['torrent-verify'])
+        with self.assertRaises(TransmissionError):
+            with client.batch():
+                client.verify_torrent(1)
+                stop = client.stop_torrent(2)
+        # every group is sent before the error is raised
+        self.assertEqual([method for method, _ in client.sent], ['torrent-verify', 'torrent-stop'])
+        self.assertIsNone(stop.get())
+        self.assertIsNone(client._batch)
+
+    def test_body_raising(self):
+        client = RecordingClient()
+        with self.assertRaises(ValueError):
+            with client.batch(size=2):
+                client.remove_torrent([1, 2])
+                client.remove_torrent(3)
+                raise ValueError('failed half way')
+        # the group flushed for its size went out, the queued call did not
+        self.assertEqual(client.sent, [('torrent-remove', {'ids': [1, 2], 'delete-local-data': False})])
+        self.assertIsNone(client._batch)
+        client.remove_torrent(4)
+        self.assertEqual(client.sent[-1], ('torrent-remove', {'ids': [4], 'delete-local-data': False}))
+
+
+if __name__ == '__main__':
+    unittest.main()
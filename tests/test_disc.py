@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+import unittest
+
+from os.path import join
+
+import iso9660
+
+from iso9660 import disc
+from tests.isoimage import build_image
+
+try:
+    from libs.Video import Video
+except ImportError:  # the optional dependencies of Video are not installed
+    Video = None
+
+DVD_FILES = {'/VIDEO_TS/VIDEO_TS.IFO': 'DVDVIDEO-VMG', '/VIDEO_TS/VTS_01_1.VOB': '\x00\x00\x01\xba'}
+DATA_FILES = {'/DOCS/README.TXT': 'hello', '/SETUP.EXE': 'MZ'}
+
+
+class DiscImageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def image(self, name, files, **kwargs):
+        path = join(self.tmpDir, name)
+        build_image(path, files, **kwargs)
+        return path
+
+
+class DiscTypeTest(DiscImageTest):
+
+    def test_dvd(self):
+        self.assertEqual(iso9660.disc_type(self.image('dvd.iso', DVD_FILES, directories=['/AUDIO_TS'])),
+                         iso9660.DVD_VIDEO)
+
+    def test_bluray_in_udf_only(self):
+        # the ISO9660 side of a Blu-ray often holds no BDMV directory
+        path = self.image('bd.iso', DATA_FILES, udf_root=['BDMV', 'CERTIFICATE'])
+        self.assertEqual(iso9660.disc_type(path), iso9660.BLURAY)
+
+    def test_data(self):
+        self.assertEqual(iso9660.disc_type(self.image('data.iso', DATA_FILES)), iso9660.DATA)
+        self.assertEqual(iso9660.disc_type(self.image('data_udf.iso', DATA_FILES, udf_root=['DOCS'])),
+                         iso9660.DATA)
+
+    def test_not_an_image(self):
+        path = join(self.tmpDir, 'movie.iso')
+        with open(path, 'wb') as f:
+            f.write('\x1aE\xdf\xa3' + '\x00' * 100000)
+        self.assertEqual(iso9660.disc_type(path), iso9660.DATA)
+
+    def test_reads_the_root_only(self):
+        files = dict(DVD_FILES)
+        files.update(('/DATA/F%04d.DAT' % i, 'x') for i in range(500))
+        reader = disc.SectorReader(self.image('dvd.iso', files))
+        try:
+            self.assertEqual(disc._classify(reader.read, disc._iso_root_names(reader.read)), iso9660.DVD_VIDEO)
+        finally:
+            reader.close()
+        self.assertEqual(reader.reads, 2)  # primary volume descriptor and root directory
+
+
+@unittest.skipIf(Video is None, 'libs.Video dependencies missing')
+class IsoVideoTest(DiscImageTest):
+
+    def test_extension(self):
+        self.assertTrue(Video(self.image('dvd.iso', DVD_FILES)).is_iso_video())
+        self.assertTrue(Video(self.image('DVD.ISO', DVD_FILES)).is_iso_video())
+        self.assertFalse(Video(self.image('dvd.img', DVD_FILES)).is_iso_video())
+        self.assertFalse(Video(self.image('data.iso', DATA_FILES)).is_iso_video())
+
+    def test_classified_once(self):
+        calls = []
+
+        class Counting(Video):
+            def get_media_info(self):
+                return ''
+
+            def is_iso_video(self):
+                calls.append(self.filePath)
+                return Video.is_iso_video(self)
+
+        video = Counting(self.image('dvd.iso', DVD_FILES))
+        self.assertTrue(video.isVideo)
+        self.assertTrue(video.isISO)
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
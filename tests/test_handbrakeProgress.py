@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from libs.handbrakeProgress import ProgressEvent, ProgressLogger, ProgressNotifier, ProgressParser
+
+
+def event(percent, task=1):
+    return ProgressEvent(percent=percent, fps=None, avgFps=None, eta=None, task=task, taskCount=2)
+
+
+class ProgressParserTest(unittest.TestCase):
+
+    def test_text_split_across_chunks(self):
+        parser = ProgressParser()
+        self.assertEqual(parser.feed('Encoding: task 1 of 2, 45.6'), [])
+        events = parser.feed('7 % (30.12 fps, avg 28.50 fps, ETA 00h12m34s)\rEncoding: task 2 of 2, 1.00 %\r')
+        self.assertEqual(events, [ProgressEvent(45.67, 30.12, 28.5, 754, 1, 2), event(1.0, task=2)])
+
+    def test_json(self):
+        parser = ProgressParser()
+        self.assertEqual(parser.feed('Progress: {"State": "WORKING", "Working": {"Progress": 0.5, '), [])
+        events = parser.feed('"Rate": 30.0, "RateAvg": 29.0, "Hours": 0, "Minutes": 1, "Seconds": 2, '
+                             '"Pass": 1, "PassCount": 1}}\nProgress: {"State": "WORKDONE"}\n')
+        self.assertEqual(events, [ProgressEvent(50.0, 30.0, 29.0, 62, 1, 1)])
+
+
+class ProgressLoggerTest(unittest.TestCase):
+
+    def test_jobs_are_forgotten_when_they_end(self):
+        progressLogger = ProgressLogger(step=25)
+        seen = []
+        notifier = ProgressNotifier(progressLogger, lambda fileName, e: seen.append(fileName))
+        for name in ('a.mkv', 'b.mkv'):
+            notifier.publish(name, event(10.0))
+            notifier.publish(name, event(60.0))
+        self.assertEqual(sorted(progressLogger.lastStep), ['a.mkv', 'b.mkv'])
+
+        notifier.finish('a.mkv')
+        self.assertEqual(list(progressLogger.lastStep), ['b.mkv'])
+        notifier.finish('a.mkv')  # already forgotten
+        notifier.finish('b.mkv')
+        self.assertEqual(progressLogger.lastStep, {})
+        # plain callbacks have no finish and keep getting events
+        self.assertEqual(len(seen), 4)
+
+    def test_failing_finish(self):
+        class Failing(object):
+            def __call__(self, fileName, e):
+                pass
+
+            def finish(self, fileName):
+                raise RuntimeError('broken subscriber')
+
+        progressLogger = ProgressLogger()
+        notifier = ProgressNotifier(Failing(), progressLogger)
+        notifier.publish('a.mkv', event(10.0))
+        notifier.finish('a.mkv')
+        self.assertEqual(progressLogger.lastStep, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import errno
+import socket
+import unittest
+
+try:
+    from six.moves import http_client
+    from transmissionrpc import Client
+    from transmissionrpc.error import HTTPHandlerError
+    from transmissionrpc.httphandler import PooledHTTPHandler
+    from tests.rpcserver import RPCServer, SESSION_ID
+except ImportError:  # six, a dependency of transmissionrpc, is not installed
+    PooledHTTPHandler = None
+
+QUERY = json.dumps({'method': 'session-get', 'arguments': {}, 'tag': 1})
+
+
+class FailingConnection(object):
+    """ Pooled connection failing the way one the server closed does, on request or on getresponse """
+
+    def __init__(self, request_error=None, response_error=None):
+        self.sock, self.peer = socket.socketpair()
+        self.timeout = None
+        self.request_error = request_error
+        self.response_error = response_error
+        self.closed = False
+
+    def request(self, method, path, body, headers):
+        if self.request_error:
+            raise self.request_error
+
+    def getresponse(self, buffering=False):
+        raise self.response_error
+
+    def close(self):
+        self.closed = True
+        self.sock.close()
+        self.peer.close()
+
+
+@unittest.skipIf(PooledHTTPHandler is None, 'transmissionrpc dependencies missing')
+class PooledHTTPHandlerTest(unittest.TestCase):
+    auth = None
+
+    def setUp(self):
+        self.server = RPCServer(self.auth)
+        self.handler = PooledHTTPHandler()
+        self.key = ('http', '127.0.0.1', self.server.port)
+
+    def tearDown(self):
+        self.handler.close()
+        self.server.stop()
+
+    def post(self, timeout=5):
+        return json.loads(self.handler.request(self.server.url, QUERY, {'X-Transmission-Session-Id': SESSION_ID},
+                                               timeout))
+
+    def pooled(self, connection):
+        self.handler.pool.setdefault(self.key, []).append(connection)
+        return connection
+
+    def wait_closed(self, connection):
+        for _ in range(100):
+            if PooledHTTPHandler._dropped(connection):
+                return
+            time.sleep(0.01)
+        self.fail('the server did not close the connection')
+
+
+class KeepAliveTest(PooledHTTPHandlerTest):
+
+    def test_one_connection(self):
+        for _ in range(3):
+            self.assertEqual(self.post()['result'], 'success')
+        self.assertEqual((self.server.connections, len(self.server.requests)), (1, 3))
+        self.assertEqual(len(self.handler.pool[self.key]), 1)
+
+    def test_session_id_handshake(self):
+        client = Client('127.0.0.1', self.server.port, http_handler=self.handler)
+        client.get_session()
+        self.assertEqual(client.session_id, SESSION_ID)
+        # session-get of the constructor: 409 then the request, then the one above
+        self.assertEqual([r[1] for r in self.server.requests], ['0', SESSION_ID, SESSION_ID])
+        self.assertEqual(self.server.connections, 1)
+
+    def test_stream_read_to_the_end_returns_the_connection(self):
+        response = self.handler.request_stream(self.server.url, QUERY, {'X-Transmission-Session-Id': SESSION_ID}, 5)
+        self.assertEqual(json.loads(response.read().decode('utf-8'))['result'], 'success')
+        response.close()
+        self.assertEqual(len(self.handler.pool[self.key]), 1)
+        self.post()
+        self.assertEqual(self.server.connections, 1)
+
+    def test_stream_left_unread_closes_the_connection(self):
+        self.server.arguments = {'padding': 'x' * 100000}
+        response = self.handler.request_stream(self.server.url, QUERY, {'X-Transmission-Session-Id': SESSION_ID}, 5)
+        connection = response.connection
+        response.read(10)
+        response.close()
+        self.assertEqual(self.handler.pool.get(self.key, []), [])
+        self.assertIsNone(connection.sock)
+        self.post()
+        self.assertEqual(self.server.connections, 2)
+
+    def test_dropped(self):
+        self.server.actions = [None, 'close']
+        self.post()
+        connection = self.handler.pool[self.key][0]
+        self.assertFalse(PooledHTTPHandler._dropped(connection))
+        self.post()
+        connection = self.handler.pool[self.key][0]
+        self.wait_closed(connection)
+        # dropped from the pool before use, the request goes out once on a new connection
+        self.post()
+        self.assertEqual((self.server.connections, len(self.server.requests)), (2, 3))
+
+
+class RetryTest(PooledHTTPHandlerTest):
+
+    def assert_retried(self, connection):
+        self.pooled(connection)
+        self.assertEqual(self.post()['result'], 'success')
+        self.assertTrue(connection.closed)
+        self.assertEqual((self.server.connections, len(self.server.requests)), (1, 1))
+
+    def assert_not_retried(self, connection):
+        self.pooled(connection)
+        self.assertRaises(HTTPHandlerError, self.post)
+        self.assertTrue(connection.closed)
+        self.assertEqual((self.server.connections, len(self.server.requests)), (0, 0))
+
+    def test_broken_pipe_while_sending(self):
+        self.assert_retried(FailingConnection(request_error=socket.error(errno.EPIPE, 'Broken pipe')))
+
+    def test_reset_while_sending(self):
+        self.assert_retried(FailingConnection(request_error=socket.error(errno.ECONNRESET, 'Connection reset')))
+
+    def test_reset_before_the_response(self):
+        self.assert_retried(FailingConnection(response_error=socket.error(errno.ECONNRESET, 'Connection reset')))
+
+    def test_closed_before_the_response(self):
+        self.assert_retried(FailingConnection(response_error=http_client.BadStatusLine('')))
+
+    def test_other_errors(self):
+        self.assert_not_retried(FailingConnection(request_error=socket.error(errno.ENETUNREACH, 'Unreachable')))
+
+    def test_timeouts(self):
+        self.assert_not_retried(FailingConnection(request_error=socket.timeout('timed out')))
+        self.assert_not_retried(FailingConnection(response_error=socket.timeout('timed out')))
+
+    def test_server_closed_a_reused_connection(self):
+        class Undropped(PooledHTTPHandler):
+            @staticmethod
+            def _dropped(connection):
+                return False
+
+        self.handler = Undropped()
+        self.server.actions = ['close']
+        self.post()
+        self.wait_closed(self.handler.pool[self.key][0])
+        # sent on the closed connection, failed before any response byte, then once more on a new one
+        self.assertEqual(self.post()['result'], 'success')
+        self.assertEqual((self.server.connections, len(self.server.requests)), (2, 2))
+
+    def test_new_connection_is_not_retried(self):
+        self.server.actions = ['drop']
+        self.assertRaises(HTTPHandlerError, self.post)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_timeout_on_a_live_connection(self):
+        self.post()
+        self.server.actions = ['delay 0.5']
+        self.assertRaises(HTTPHandlerError, self.post, 0.1)
+        time.sleep(0.6)
+        # the server ran the request, it is not sent again
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.post()['result'], 'success')
+
+
+class BasicAuthTest(PooledHTTPHandlerTest):
+    auth = 'basic'
+
+    def test_negotiated_once(self):
+        self.handler.set_authentication(self.server.url, 'user', 'secret')
+        for _ in range(3):
+            self.assertEqual(self.post()['result'], 'success')
+        authorizations = [r[0] for r in self.server.requests]
+        self.assertEqual(authorizations[0], None)
+        self.assertEqual(authorizations[1:], ['Basic dXNlcjpzZWNyZXQ='] * 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_wrong_password(self):
+        self.handler.set_authentication(self.server.url, 'user', 'wrong')
+        with self.assertRaises(HTTPHandlerError) as context:
+            self.post()
+        self.assertEqual(context.exception.code, 401)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_no_credentials(self):
+        self.assertRaises(HTTPHandlerError, self.post)
+        self.assertEqual(len(self.server.requests), 1)
+
+
+class DigestAuthTest(PooledHTTPHandlerTest):
+    auth = 'digest'
+
+    def test_negotiated_once(self):
+        self.handler.set_authentication(self.server.url, 'user', 'secret')
+        for _ in range(3):
+            self.assertEqual(self.post()['result'], 'success')
+        authorizations = [r[0] for r in self.server.requests]
+        self.assertEqual(authorizations[0], None)
+        self.assertTrue(all(a.startswith('Digest username="user"') for a in authorizations[1:]))
+        self.assertEqual([a.split('nc=')[1][:8] for a in authorizations[1:]], ['00000001', '00000002', '00000003'])
+
+    def test_stale_nonce(self):
+        self.handler.set_authentication(self.server.url, 'user', 'secret')
+        self.post()
+        self.server.nonce = 'a5bb0fe7fa3c6a07ac1d2c7e9ee9d4d0'
+        self.assertEqual(self.post()['result'], 'success')
+        # the stale 401 is answered once with the new nonce
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertIn('nonce="a5bb0fe7fa3c6a07ac1d2c7e9ee9d4d0"', self.server.requests[-1][0])
+        self.assertIn('nc=00000001', self.server.requests[-1][0])
+
+    def test_wrong_password(self):
+        self.handler.set_authentication(self.server.url, 'user', 'wrong')
+        with self.assertRaises(HTTPHandlerError) as context:
+            self.post()
+        self.assertEqual(context.exception.code, 401)
+        self.assertEqual(len(self.server.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
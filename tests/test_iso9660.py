@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import io
+import shutil
+import tempfile
+import unittest
+
+from os.path import join
+
+from iso9660.iso9660 import FILE_CHUNK_SIZE, SECTOR_SIZE, ISO9660
+from tests.isoimage import build_image
+
+
+class ConstructorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_failure_closes_the_image(self):
+        opened = []
+
+        class Recording(ISO9660):
+            def _open_file(self):
+                try:
+                    ISO9660._open_file(self)
+                finally:
+                    opened.append(self._file)
+
+        path = join(self.tmpDir, 'empty.iso')
+        open(path, 'w').close()
+        # an empty file cannot be mapped
+        self.assertRaises(ValueError, Recording, path)
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(opened[0].closed)
+
+
+class SeekingISO9660(ISO9660):
+    """ Reads the image with seek and read, like a remote one, without the map """
+
+    def __init__(self, url):
+        self._image = open(url, 'rb')
+        ISO9660.__init__(self, url)
+
+    def close(self):
+        ISO9660.close(self)
+        self._image.close()
+
+    def _get_sector(self, sector, length):
+        self._image.seek(sector * SECTOR_SIZE)
+        self._buff = io.BytesIO(self._image.read(length))
+
+
+class OpenFileTest(unittest.TestCase):
+    reader = ISO9660
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        # every offset tells itself apart, sectors and chunks do not repeat
+        self.data = ''.join('%07d' % i for i in range(0, 2 * FILE_CHUNK_SIZE + 3 * SECTOR_SIZE, 7)) + 'tail'
+        self.path = join(self.tmpDir, 'files.iso')
+        build_image(self.path, {'/DIR/BIG.BIN': self.data, '/DIR/EMPTY.TXT': '', '/SMALL.TXT': 'small'})
+        self.cd = self.reader(self.path)
+
+    def tearDown(self):
+        self.cd.close()
+        shutil.rmtree(self.tmpDir)
+
+    def test_read_matches_get_file(self):
+        for name in ('/DIR/BIG.BIN', '/DIR/EMPTY.TXT', '/SMALL.TXT'):
+            f = self.cd.open_file(name)
+            self.assertEqual(f.read(), self.cd.get_file(name))
+            self.assertEqual(f.read(), '')
+        self.assertEqual(self.cd.get_file('/DIR/BIG.BIN'), self.data)
+
+    def test_readinto(self):
+        f = self.cd.open_file('/dir/big.bin')
+        chunks = []
+        for size in (1, SECTOR_SIZE - 1, 7, FILE_CHUNK_SIZE + 3, 100000):
+            b = bytearray(size)
+            n = f.readinto(b)
+            chunks.append(str(b[:n]))
+        self.assertEqual(''.join(chunks), self.data)
+        self.assertEqual(f.readinto(bytearray(10)), 0)
+
+    def test_seek(self):
+        f = self.cd.open_file('/DIR/BIG.BIN')
+        self.assertEqual(len(f), len(self.data))
+        self.assertEqual(f.seek(SECTOR_SIZE + 3), SECTOR_SIZE + 3)
+        self.assertEqual(f.read(10), self.data[SECTOR_SIZE + 3:SECTOR_SIZE + 13])
+        self.assertEqual(f.seek(-20, io.SEEK_CUR), SECTOR_SIZE - 7)
+        self.assertEqual(f.read(FILE_CHUNK_SIZE), self.data[SECTOR_SIZE - 7:SECTOR_SIZE - 7 + FILE_CHUNK_SIZE])
+        f.seek(-5, io.SEEK_END)
+        self.assertEqual(f.read(), self.data[-5:])
+        f.seek(len(self.data) + 100)
+        self.assertEqual(f.read(), '')
+        self.assertRaises(IOError, f.seek, -1)
+        self.assertRaises(ValueError, f.seek, 0, 3)
+
+    def test_buffered_reader(self):
+        f = io.BufferedReader(self.cd.open_file('/DIR/BIG.BIN'), 10000)
+        self.assertEqual(f.read(3), self.data[:3])
+        self.assertEqual(f.peek(1)[:1], self.data[3])
+        f.seek(FILE_CHUNK_SIZE - 1)
+        self.assertEqual(f.read(SECTOR_SIZE), self.data[FILE_CHUNK_SIZE - 1:FILE_CHUNK_SIZE - 1 + SECTOR_SIZE])
+        self.assertEqual(f.read(), self.data[FILE_CHUNK_SIZE - 1 + SECTOR_SIZE:])
+
+    def test_closed(self):
+        f = self.cd.open_file('/SMALL.TXT')
+        f.close()
+        self.assertRaises(ValueError, f.read)
+        f = self.cd.open_file('/SMALL.TXT')
+        self.cd.close()
+        self.assertRaises(ValueError, f.read)
+
+    def test_truncated_image(self):
+        f = self.cd.open_file('/DIR/BIG.BIN')
+        start = f._ex_loc * SECTOR_SIZE
+        self.cd.close()
+        cut = FILE_CHUNK_SIZE + SECTOR_SIZE + 5
+        with open(self.path, 'r+b') as image:
+            image.truncate(start + cut)
+        self.cd = self.reader(self.path)
+
+        f = self.cd.open_file('/DIR/BIG.BIN')
+        self.assertEqual(len(f), len(self.data))
+        b = bytearray(len(self.data))
+        self.assertEqual(f.readinto(b), cut)
+        self.assertEqual(str(b[:cut]), self.data[:cut])
+        self.assertEqual(f.readinto(b), 0)
+        f.seek(cut - 3)
+        self.assertEqual(f.read(), self.data[cut - 3:cut])
+        f.seek(cut + SECTOR_SIZE)
+        self.assertEqual(f.read(), '')
+
+
+class SeekingOpenFileTest(OpenFileTest):
+    reader = SeekingISO9660
+
+
+if __name__ == '__main__':
+    unittest.main()
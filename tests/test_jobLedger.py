@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from os import stat
+from os.path import basename, join, splitext
+
+from libs.jobLedger import JobLedger
+
+
+class FakeVideo(object):
+    """ The attributes of a Video the ledger reads """
+
+    def __init__(self, filePath):
+        self.filePath = filePath
+        self.fileName = splitext(basename(filePath))[0]
+        self.fileInfo = stat(filePath)
+
+
+class LedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.dbPath = join(self.tmpDir, 'jobs.db')
+        self.source = join(self.tmpDir, 'movie.mkv')
+        with open(self.source, 'w') as f:
+            f.write('movie')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def run_job(self, settings, state):
+        ledger = JobLedger(self.dbPath, settings=settings)
+        video = FakeVideo(self.source)
+        self.assertEqual(ledger.check(video), None)
+        ledger.update(ledger.enqueue(video), state)
+        ledger.close()
+
+    def check(self, settings):
+        ledger = JobLedger(self.dbPath, settings=settings)
+        try:
+            return ledger.check(FakeVideo(self.source))
+        finally:
+            ledger.close()
+
+
+class JobLedgerTest(LedgerTest):
+
+    def test_skip_holds_for_the_same_settings(self):
+        self.run_job('resolution=720 languages=english', 'skipped')
+        self.assertEqual(self.check('resolution=720 languages=english'), 'skipped')
+
+    def test_skip_is_rechecked_with_other_settings(self):
+        self.run_job('resolution=720 languages=english', 'skipped')
+        self.assertEqual(self.check('resolution=480 languages=english'), None)
+        self.assertEqual(self.check('resolution=720 languages='), None)
+        # skipped again under the new settings
+        self.run_job('resolution=480 languages=english', 'skipped')
+        self.assertEqual(self.check('resolution=480 languages=english'), 'skipped')
+
+    def test_done_holds_for_any_settings(self):
+        self.run_job('resolution=720 languages=', 'done')
+        self.assertEqual(self.check('resolution=480 languages='), 'done')
+
+    def test_ledger_without_settings_column(self):
+        ledger = JobLedger(self.dbPath)
+        conn = ledger._connection()
+        conn.execute('DROP TABLE jobs')
+        conn.execute(JobLedger.SCHEMA.replace('settings    TEXT,', ''))
+        conn.commit()
+        ledger.close()
+
+        self.run_job('resolution=720 languages=', 'skipped')
+        self.assertEqual(self.check('resolution=720 languages='), 'skipped')
+
+
+class InFlightTest(LedgerTest):
+
+    def queue_for(self, pid):
+        ledger = JobLedger(self.dbPath)
+        conn = ledger._connection()
+        conn.execute('UPDATE jobs SET pid = ? WHERE id = ?', (pid, ledger.enqueue(FakeVideo(self.source))))
+        conn.commit()
+        ledger.close()
+
+    def test_job_of_a_running_process(self):
+        process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+        try:
+            self.queue_for(process.pid)
+            self.assertEqual(self.check(''), 'running')
+        finally:
+            process.kill()
+            process.wait()
+        # its owner is gone, the job is resumed
+        self.assertEqual(self.check(''), None)
+
+    def test_job_of_this_process(self):
+        ledger = JobLedger(self.dbPath)
+        ledger.enqueue(FakeVideo(self.source))
+        self.assertEqual(ledger.check(FakeVideo(self.source)), 'running')
+        ledger.close()
+
+    def test_alive(self):
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        self.assertFalse(JobLedger._alive(process.pid))
+        self.assertFalse(JobLedger._alive(None))
+        self.assertTrue(JobLedger._alive(1))  # init, owned by another user or not
+
+
+if __name__ == '__main__':
+    unittest.main()
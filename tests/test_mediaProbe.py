@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from os.path import abspath, dirname, join
+
+from libs.mediaProbe import MediaProbe, language_name
+
+FIXTURES = join(dirname(abspath(__file__)), 'fixtures', 'mediainfo')
+
+try:
+    from libs.Video import Video
+except ImportError:  # the optional dependencies of Video are not installed
+    Video = None
+
+
+def load_probe(name):
+    with open(join(FIXTURES, name + '.json')) as f:
+        return MediaProbe.from_json(f.read())
+
+
+class MediaProbeTest(unittest.TestCase):
+
+    def test_video(self):
+        probe = load_probe('movie')
+        self.assertEqual((probe.width, probe.height), (1920, 1080))
+        self.assertEqual(probe.codec, 'AVC')
+        self.assertTrue(probe.hasVideo)
+        self.assertFalse(probe.isISO)
+
+    def test_languages_are_names(self):
+        # the JSON report holds ISO codes, the text output the scan used to read holds names
+        probe = load_probe('movie')
+        self.assertEqual([t.language for t in probe.audioTracks], ['English', 'Italian'])
+        self.assertEqual([t.channels for t in probe.audioTracks], [6, 1])
+        self.assertEqual([t.language for t in probe.subtitleTracks], ['Italian'])
+        self.assertEqual([t.language for t in load_probe('show').audioTracks], ['French'])
+
+    def test_no_language(self):
+        self.assertEqual([t.language for t in load_probe('old').audioTracks], [None])
+
+    def test_language_name(self):
+        self.assertEqual(language_name('en'), 'English')
+        self.assertEqual(language_name('ITA'), 'Italian')
+        self.assertEqual(language_name('en-US'), 'English')
+        self.assertEqual(language_name('ger'), 'German')
+        self.assertEqual(language_name('English'), 'English')
+        self.assertEqual(language_name('xx'), 'xx')
+        self.assertEqual(language_name(None), None)
+
+    def test_bad_report(self):
+        self.assertFalse(MediaProbe.from_json('').hasVideo)
+        self.assertFalse(MediaProbe.from_json('{').hasVideo)
+
+
+@unittest.skipIf(Video is None, 'libs.Video dependencies missing')
+class LangExistsTest(unittest.TestCase):
+
+    def test_names_and_codes(self):
+        tracks = load_probe('movie').audioTracks
+        self.assertEqual(Video.get_video_lang(tracks), ['english', 'italian'])
+        for required in (['english'], ['en'], ['ita'], ['spanish', 'italian']):
+            video = Video('movie.mkv', requiredLang=required)
+            self.assertTrue(video.lang_exists(Video.get_video_lang(tracks)), required)
+        self.assertFalse(Video('movie.mkv', requiredLang=['french']).lang_exists(Video.get_video_lang(tracks)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from os.path import join
+
+from libs.probeCache import ProbeCache
+
+REPORT = '{"media": {"track": [{"@type": "General"}, {"@type": "Video", "Width": "1920", "Height": "1080"}]}}'
+
+
+class ProbeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.dbPath = join(self.tmpDir, 'probe_cache.db')
+        self.cache = ProbeCache(self.dbPath)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmpDir)
+
+    def video(self, name, data='movie'):
+        path = join(self.tmpDir, name)
+        with open(path, 'w') as f:
+            f.write(data)
+        return path
+
+    def counters(self):
+        cache = self.cache
+        return cache.hits, cache.misses, cache.stores, cache.invalidations, cache.evictions
+
+    def test_hit(self):
+        path = self.video('movie.mkv')
+        self.assertEqual(self.cache.lookup(path), None)
+        self.cache.store(path, REPORT, 'video/x-matroska', True, False)
+        self.assertEqual(self.cache.lookup(path), {'media_info': REPORT, 'mime': 'video/x-matroska',
+                                                   'isVideo': True, 'isISO': False})
+        self.assertEqual(self.counters(), (1, 1, 1, 0, 0))
+
+    def test_negative_verdict(self):
+        path = self.video('notes.txt')
+        self.cache.store(path, b'{}', 'text/plain', False, False)
+        self.assertEqual(self.cache.lookup(path), {'media_info': '{}', 'mime': 'text/plain',
+                                                   'isVideo': False, 'isISO': False})
+
+    def test_kept_across_runs_and_renames(self):
+        path = self.video('movie.mkv')
+        self.cache.store(path, REPORT, 'video/x-matroska', True, False)
+        self.cache.close()
+
+        renamed = join(self.tmpDir, 'renamed.mkv')
+        os.rename(path, renamed)
+        self.cache = ProbeCache(self.dbPath)
+        self.assertEqual(self.cache.lookup(renamed)['media_info'], REPORT)
+        self.assertEqual(self.counters(), (1, 0, 0, 0, 0))
+
+    def test_mtime_change(self):
+        path = self.video('movie.mkv')
+        self.cache.store(path, REPORT, 'video/x-matroska', True, False)
+        mtime = os.stat(path).st_mtime
+        os.utime(path, (mtime + 10, mtime + 10))
+        self.assertEqual(self.cache.lookup(path), None)
+        self.assertEqual(self.counters(), (0, 1, 1, 1, 0))
+        # the stale entry is gone, not only skipped
+        os.utime(path, (mtime, mtime))
+        self.assertEqual(self.cache.lookup(path), None)
+
+    def test_size_change(self):
+        path = self.video('movie.mkv')
+        self.cache.store(path, REPORT, 'video/x-matroska', True, False)
+        mtime = os.stat(path).st_mtime
+        with open(path, 'a') as f:
+            f.write(' grown')
+        os.utime(path, (mtime, mtime))
+        self.assertEqual(self.cache.lookup(path), None)
+        self.assertEqual(self.cache.invalidations, 1)
+
+    def test_invalidate(self):
+        path = self.video('movie.mkv')
+        self.cache.store(path, REPORT, 'video/x-matroska', True, False)
+        self.cache.invalidate(path)
+        self.assertEqual(self.cache.lookup(path), None)
+        self.assertEqual(self.counters(), (0, 1, 1, 1, 0))
+
+    def test_missing_file(self):
+        self.assertEqual(self.cache.lookup(join(self.tmpDir, 'gone.mkv')), None)
+        self.cache.store(join(self.tmpDir, 'gone.mkv'), REPORT, 'video/x-matroska', True, False)
+        self.assertEqual(self.counters(), (0, 0, 0, 0, 0))
+
+    def test_least_recently_used_evicted_on_flush(self):
+        self.cache.maxEntries = 2
+        first, second, third = [self.video('movie%d.mkv' % i) for i in range(3)]
+        for path in (first, second):
+            self.cache.store(path, REPORT, 'video/x-matroska', True, False)
+            time.sleep(0.01)
+        self.cache.lookup(first)
+        time.sleep(0.01)
+        self.cache.store(third, REPORT, 'video/x-matroska', True, False)
+        self.cache.flush()
+
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertEqual(self.cache.lookup(second), None)
+        self.assertNotEqual(self.cache.lookup(first), None)
+        self.assertNotEqual(self.cache.lookup(third), None)
+
+    def test_old_schema_dropped(self):
+        path = self.video('movie.mkv')
+        info = os.stat(path)
+        conn = sqlite3.connect(self.dbPath)
+        conn.execute('CREATE TABLE probes (dev INTEGER, ino INTEGER, size INTEGER, mtime REAL, media_info TEXT, '
+                     'mime TEXT, is_video INTEGER, is_iso INTEGER, last_access REAL, PRIMARY KEY (dev, ino))')
+        conn.execute('INSERT INTO probes VALUES (?, ?, ?, ?, ?, ?, 1, 0, 0)',
+                     (info.st_dev, info.st_ino, info.st_size, info.st_mtime, 'Video\nWidth : 1 920 pixels', 'video'))
+        conn.execute('PRAGMA user_version = %d' % (ProbeCache.SCHEMA_VERSION - 1))
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(self.cache.lookup(path), None)
+        self.cache.store(path, REPORT, 'video/x-matroska', True, False)
+        self.assertEqual(self.cache.lookup(path)['media_info'], REPORT)
+        self.cache.close()
+
+        conn = sqlite3.connect(self.dbPath)
+        try:
+            self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], ProbeCache.SCHEMA_VERSION)
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
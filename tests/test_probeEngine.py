@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+import threading
+import unittest
+
+from os.path import basename, join
+
+try:
+    from libs.Video import Video
+    from libs.probeEngine import ProbeEngine
+except ImportError:  # the optional dependencies of Video are not installed
+    Video = None
+
+MB = 1024 * 1024
+MATROSKA = '\x1aE\xdf\xa3\x9fB\x86\x81\x01B\xf7\x81\x01B\xf2\x81\x04B\xf3\x81\x08B\x82\x88matroska'
+
+
+class FakeLedger(object):
+    def __init__(self, finished):
+        self.finished = finished
+
+    def check(self, videoFile):
+        return 'done' if basename(videoFile.filePath) in self.finished else None
+
+
+@unittest.skipIf(Video is None, 'libs.Video dependencies missing')
+class ScanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.probed = []
+        lock = threading.Lock()
+        probed = self.probed
+
+        def run_probe(video):
+            # stands for mediainfo, files named fake* have no video track
+            with lock:
+                probed.append(basename(video.filePath))
+            video._isVideo = not basename(video.filePath).startswith('fake')
+            video._isISO = False
+
+        self._run_probe = Video.__dict__['_run_probe']
+        Video._run_probe = run_probe
+        self.ledger, Video.JOB_LEDGER = Video.JOB_LEDGER, FakeLedger(['done.mkv'])
+        self.cache, Video.PROBE_CACHE = Video.PROBE_CACHE, None
+
+    def tearDown(self):
+        Video._run_probe = self._run_probe
+        Video.JOB_LEDGER = self.ledger
+        Video.PROBE_CACHE = self.cache
+        shutil.rmtree(self.tmpDir)
+
+    def make(self, name, header=MATROSKA, size=2 * MB):
+        path = join(self.tmpDir, name)
+        with open(path, 'wb') as f:
+            f.write(header)
+            f.truncate(size)
+        return path
+
+    def files(self):
+        return [
+            self.make('movie1.mkv'),
+            self.make('notes.nfo'),                            # extension
+            self.make('sample.mkv', size=100 * 1024),          # size
+            self.make('done.mkv'),                             # ledger
+            self.make('readme.mkv', header='not a video\n' * 1000),  # header, text
+            self.make('fake.mkv'),                             # mediainfo
+            self.make('download.mkv.part'),                    # extension
+            self.make('movie2.mkv'),
+            self.make('movie3.avi'),
+        ]
+
+    def test_stages(self):
+        engine = ProbeEngine()
+        videos = engine.scan(self.files(), minSize=1)
+        self.assertEqual([basename(v.filePath) for v in videos], ['movie1.mkv', 'movie2.mkv', 'movie3.avi'])
+        self.assertEqual(engine.eliminated, {'extension': 2, 'size': 1, 'ledger': 1, 'header': 1,
+                                             'mediainfo': 1, 'error': 0})
+        self.assertEqual(engine.accepted, 3)
+        # mediainfo only ran on the files every cheaper stage let through
+        self.assertEqual(self.probed, ['movie1.mkv', 'fake.mkv', 'movie2.mkv', 'movie3.avi'])
+
+    def test_workers_keep_input_order(self):
+        files = [self.make('movie%02d.mkv' % i) for i in range(30)] + self.files()
+        engine = ProbeEngine(workers=4)
+        videos = engine.scan(list(reversed(files)), minSize=1)
+        expected = [basename(path) for path in reversed(files)
+                    if basename(path).startswith('movie')]
+        self.assertEqual([basename(v.filePath) for v in videos], expected)
+        self.assertEqual(engine.accepted, 33)
+        self.assertEqual(sorted(self.probed), sorted(expected + ['fake.mkv']))
+
+    def test_kwargs_and_errors(self):
+        engine = ProbeEngine(workers=2)
+        videos = engine.scan([(self.make('movie.mkv'), {'requiredLang': ['english']}),
+                              join(self.tmpDir, 'missing.mkv')])
+        self.assertEqual(len(videos), 1)
+        self.assertEqual(videos[0].requiredLang, ['english'])
+        self.assertEqual(engine.eliminated['error'], 1)
+
+    def test_counters_add_up_across_scans(self):
+        engine = ProbeEngine()
+        engine.scan(self.files(), minSize=1)
+        engine.scan([self.make('other.txt')])
+        self.assertEqual(engine.eliminated['extension'], 3)
+        self.assertEqual(engine.accepted, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
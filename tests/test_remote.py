@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+import threading
+import unittest
+import BaseHTTPServer
+import SocketServer
+
+from os.path import join
+
+from iso9660.iso9660 import ISO9660
+from iso9660.remote import BlockCache, RangeFetcher
+from tests.isoimage import build_image
+
+
+class RangeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    /img.iso with Range support, /norange.iso ignoring it, and redirects to them:
+    /moved.iso 301, /temp.iso 302 and /away.iso 302 to the other server of the test.
+    """
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.getheader('authorization')))
+        redirects = {'/moved.iso': (301, '/img.iso'), '/temp.iso': (302, '/img.iso'),
+                     '/away.iso': (302, server.away + '/img.iso')}
+        if self.path in redirects:
+            status, location = redirects[self.path]
+            self.send_response(status)
+            self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path == '/norange.iso':
+            return self._send(200, server.data)
+        if self.path != '/img.iso':
+            return self._send(404, '')
+
+        first, _, last = self.headers.getheader('range').split('=', 1)[1].partition('-')
+        first, last = int(first), min(int(last), len(server.data) - 1)
+        if first >= len(server.data):
+            return self._send(416, '', 'bytes */%d' % len(server.data))
+        self._send(206, server.data[first:last + 1], 'bytes %d-%d/%d' % (first, last, len(server.data)))
+
+    def _send(self, status, body, content_range=None):
+        self.send_response(status)
+        if content_range:
+            self.send_header('Content-Range', content_range)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.bytes_sent += len(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RangeServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, data):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), RangeHandler)
+        self.data = data
+        self.away = None
+        self.requests = []
+        self.bytes_sent = 0
+        self.url = 'http://127.0.0.1:%d' % self.server_address[1]
+        thread = threading.Thread(target=self.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class RemoteTest(unittest.TestCase):
+    data = ''.join('%07d' % i for i in range(0, 40000, 7))
+
+    def setUp(self):
+        self.server = RangeServer(self.data)
+        self.other = RangeServer(self.data)
+        self.server.away, self.other.away = self.other.url, self.server.url
+        self.fetchers = []
+
+    def tearDown(self):
+        for fetcher in self.fetchers:
+            fetcher.close()
+        self.server.stop()
+        self.other.stop()
+
+    def fetcher(self, path, netloc=None):
+        fetcher = RangeFetcher(self.server.url.replace('127.0.0.1', netloc or '127.0.0.1') + path, timeout=5)
+        self.fetchers.append(fetcher)
+        return fetcher
+
+
+class BlockCacheTest(RemoteTest):
+
+    def test_runs_and_read_ahead(self):
+        cache = BlockCache(self.fetcher('/img.iso'), block_size=1024, cache_blocks=16, read_ahead=2)
+        self.assertEqual(cache.read(100, 2500), self.data[100:2600])
+        # blocks 0-2 and 2 read ahead in one request
+        self.assertEqual((len(self.server.requests), self.server.bytes_sent), (1, 5 * 1024))
+        self.assertEqual(cache.read(3000, 2000), self.data[3000:5000])
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.assertEqual((cache.hits, cache.misses), (3, 3))
+
+    def test_runs(self):
+        cache = BlockCache(self.fetcher('/img.iso'), block_size=1024, read_ahead=0)
+        cache.read(6 * 1024, 10)
+        self.server.requests, self.server.bytes_sent = [], 0
+        # blocks 5 and 7 are missing and 6 is cached, one request per run
+        self.assertEqual(cache.read(5 * 1024, 3 * 1024), self.data[5 * 1024:8 * 1024])
+        self.assertEqual([r[0] for r in self.server.requests], ['/img.iso', '/img.iso'])
+        self.assertEqual(self.server.bytes_sent, 2 * 1024)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_end_of_file(self):
+        cache = BlockCache(self.fetcher('/img.iso'), block_size=1024, read_ahead=4)
+        self.assertEqual(cache.read(len(self.data) - 10, 100), self.data[-10:])
+        self.assertEqual(cache.read(len(self.data) + 5000, 10), '')
+        # the size is known after the first response, read ahead stops at the last block
+        self.assertEqual(self.server.bytes_sent, len(self.data) - 39 * 1024)
+
+    def test_iso9660(self):
+        tmpDir = tempfile.mkdtemp()
+        try:
+            path = join(tmpDir, 'remote.iso')
+            files = {'/VIDEO_TS/VTS_01_1.VOB': self.data * 3, '/README.TXT': 'remote'}
+            build_image(path, files)
+            with open(path, 'rb') as f:
+                self.server.data = f.read()
+            with ISO9660(self.server.url + '/img.iso', block_size=16 * 1024, read_ahead=1) as cd:
+                self.assertEqual(cd.get_file('/README.TXT'), 'remote')
+                self.assertEqual(cd.open_file('/VIDEO_TS/VTS_01_1.VOB').read(), files['/VIDEO_TS/VTS_01_1.VOB'])
+            self.assertLess(self.server.bytes_sent, 2 * len(self.server.data))
+        finally:
+            shutil.rmtree(tmpDir)
+
+
+class RedirectTest(RemoteTest):
+
+    def test_permanent(self):
+        fetcher = self.fetcher('/moved.iso')
+        self.assertEqual(fetcher.fetch(0, 10), self.data[:10])
+        self.assertEqual(fetcher.url, self.server.url + '/img.iso')
+        fetcher.fetch(10, 10)
+        self.assertEqual([r[0] for r in self.server.requests], ['/moved.iso', '/img.iso', '/img.iso'])
+
+    def test_temporary(self):
+        fetcher = self.fetcher('/temp.iso')
+        self.assertEqual(fetcher.fetch(0, 10), self.data[:10])
+        self.assertEqual(fetcher.url, self.server.url + '/temp.iso')
+        self.assertEqual(fetcher.fetch(10, 10), self.data[10:20])
+        self.assertEqual([r[0] for r in self.server.requests], ['/temp.iso', '/img.iso'] * 2)
+        self.assertEqual(fetcher.requests, 4)
+
+    def test_credentials_stay_on_their_origin(self):
+        fetcher = self.fetcher('/away.iso', 'user:secret@127.0.0.1')
+        self.assertEqual(fetcher.fetch(0, 10), self.data[:10])
+        self.assertEqual(self.server.requests, [('/away.iso', 'Basic dXNlcjpzZWNyZXQ=')])
+        self.assertEqual(self.other.requests, [('/img.iso', None)])
+
+    def test_credentials_follow_a_redirect_on_their_origin(self):
+        fetcher = self.fetcher('/moved.iso', 'user:secret@127.0.0.1')
+        fetcher.fetch(0, 10)
+        self.assertEqual([r[1] for r in self.server.requests], ['Basic dXNlcjpzZWNyZXQ='] * 2)
+
+
+class ErrorTest(RemoteTest):
+
+    def test_no_range_support(self):
+        fetcher = self.fetcher('/norange.iso')
+        self.assertRaises(IOError, fetcher.fetch, 0, 10)
+
+    def test_not_found(self):
+        self.assertRaises(IOError, self.fetcher('/missing.iso').fetch, 0, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import os
+import errno
+import shutil
+import tempfile
+import unittest
+
+from os.path import exists, join
+
+try:
+    import libs.Video as video_module
+    from libs.Video import Video
+    from libs.placement import Placement
+except ImportError:  # the optional dependencies of Video are not installed
+    Video = None
+
+
+@unittest.skipIf(Video is None, 'libs.Video dependencies missing')
+class CopyTranscodeTest(unittest.TestCase):
+    """ Staged through a tmp dir as if it were on another device, then published with a move """
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.srcDir, self.stageDir, self.dstDir = [join(self.tmpDir, name) for name in ('src', 'tmp', 'dst')]
+        for path in (self.srcDir, self.stageDir, self.dstDir):
+            os.mkdir(path)
+        self.source = join(self.srcDir, 'movie.mkv')
+        with open(self.source, 'w') as f:
+            f.write('movie')
+
+        self.states = []
+        self.outcome = 0
+        test = self
+
+        class Recording(Video):
+            def set_job_state(self, state, **kwargs):
+                test.states.append(state)
+
+            @staticmethod
+            def transcode(inPath, outPath, res, ext, threads=None):
+                with open(outPath, 'w') as f:
+                    f.write('partial')
+                if isinstance(test.outcome, BaseException):
+                    raise test.outcome
+                return test.outcome
+
+        self.video = Recording(self.source, newResolution='720')
+        self._plan = video_module.plan
+        video_module.plan = lambda src, tmpDir, outDir, transName, outName: \
+            Placement(join(tmpDir, 'movie.mkv'), join(tmpDir, transName), join(outDir, outName), 'copy', 'rename', 5)
+
+    def tearDown(self):
+        video_module.plan = self._plan
+        shutil.rmtree(self.tmpDir)
+
+    def copy_transcode(self):
+        self.video.copy_transcode(tmpDir=self.stageDir, dstDir=self.dstDir, delSrc=False, newExtension='mkv')
+
+    def test_published(self):
+        self.copy_transcode()
+        self.assertEqual(os.listdir(self.stageDir), [])
+        self.assertEqual(os.listdir(self.dstDir), ['movie.mkv'])
+        self.assertEqual(self.states, ['copying', 'encoding', 'publishing', 'done'])
+
+    def test_failed_transcode(self):
+        self.outcome = 3
+        self.copy_transcode()
+        self.assertEqual(os.listdir(self.stageDir), [])
+        self.assertEqual(os.listdir(self.dstDir), [])
+        self.assertEqual(self.states, ['copying', 'encoding', 'failed'])
+        self.assertTrue(exists(self.source))
+
+    def test_transcode_raising(self):
+        self.outcome = KeyboardInterrupt()
+        self.assertRaises(KeyboardInterrupt, self.copy_transcode)
+        self.assertEqual(os.listdir(self.stageDir), [])
+        self.assertTrue(exists(self.source))
+
+    def test_move_raising(self):
+        def move_file(src, dst):
+            raise OSError(errno.ENOSPC, 'No space left on device')
+
+        _move_file, video_module.move_file = video_module.move_file, move_file
+        try:
+            self.assertRaises(OSError, self.copy_transcode)
+        finally:
+            video_module.move_file = _move_file
+        self.assertEqual(os.listdir(self.stageDir), [])
+        self.assertEqual(os.listdir(self.dstDir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,10 +4,13 @@
 
 from transmissionrpc.constants import DEFAULT_PORT, DEFAULT_TIMEOUT, PRIORITY, RATIO_LIMIT, LOGGER
 from transmissionrpc.error import TransmissionError, HTTPHandlerError
-from transmissionrpc.httphandler import HTTPHandler, DefaultHTTPHandler
+from transmissionrpc.httphandler import HTTPHandler, DefaultHTTPHandler, PooledHTTPHandler
 from transmissionrpc.torrent import Torrent
+from transmissionrpc.filetable import FileTable
 from transmissionrpc.session import Session
+from transmissionrpc.batch import Batch, BatchCall
 from transmissionrpc.client import Client
+from transmissionrpc.multiclient import MultiClient, parse_hosts
 from transmissionrpc.utils import add_stdout_logger, add_file_logger
 
 __author__    		= 'Erik Svensson <erik.public@gmail.com>'
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# Licensed under the MIT license.
+
+import json
+
+from transmissionrpc.constants import LOGGER
+from transmissionrpc.error import TransmissionError
+
+# methods acting on a list of ids and returning nothing, combining their ids does not change the outcome
+BATCH_METHODS = (
+    'torrent-start', 'torrent-start-now', 'torrent-stop', 'torrent-verify', 'torrent-reannounce',
+    'torrent-remove', 'torrent-set', 'torrent-set-location',
+)
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class BatchCall(object):
+    """
+    A call queued in a batch. Once the batch is flushed it holds the result or the error of the
+    request it was sent with.
+    """
+    __slots__ = ['method', 'ids', 'done', 'result', 'error']
+
+    def __init__(self, method, ids):
+        self.method = method
+        self.ids = ids
+        self.done = False
+        self.result = None
+        self.error = None
+
+    def get(self):
+        """Get the result, raising the error of the call if it failed"""
+        if not self.done:
+            raise TransmissionError('Batched %s call not sent yet.' % (self.method))
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class BatchGroup(object):
+    """Calls with the same method and arguments, sent as one request"""
+    __slots__ = ['method', 'arguments', 'key', 'ids', 'id_set', 'timeout', 'calls']
+
+    def __init__(self, method, arguments, key):
+        self.method = method
+        self.arguments = arguments
+        self.key = key
+        self.ids = []
+        self.id_set = set()
+        self.timeout = None
+        self.calls = []
+
+    def add(self, call, timeout):
+        for torrent_id in call.ids:
+            if torrent_id not in self.id_set:
+                self.id_set.add(torrent_id)
+                self.ids.append(torrent_id)
+        if timeout is not None:
+            self.timeout = timeout if self.timeout is None else max(self.timeout, timeout)
+        self.calls.append(call)
+
+
+class Batch(object):
+    """
+    Batch collects mutating calls made on a Client and sends the calls having the same
+    method and arguments as one request with their ids combined.
+
+    Use it through Client.batch(). Calls return a BatchCall instead of None. The batch is
+    flushed when it is left or once a request reaches ``size`` ids.
+    Calls are only combined across calls touching other torrents, so operations on a
+    given torrent id keep their order. Failed calls raise a TransmissionError when the
+    batch is left, unless ``raise_errors`` is False. When the ``with`` body raises, the
+    calls still queued are dropped, not sent.
+    """
+
+    def __init__(self, client, size=DEFAULT_BATCH_SIZE, raise_errors=True):
+        self.client = client
+        self.size = size
+        self.raise_errors = raise_errors
+        self.groups = []
+        self.calls = []
+        self.requests = 0
+        self._outer = None
+
+    def __enter__(self):
+        self._outer = self.client._batch
+        if self._outer is not None:
+            # nested, calls go to the outer batch
+            return self._outer
+        self.client._batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._outer is not None:
+            return False
+        if exc_type is not None:
+            # the caller failed half way, do not act on torrents for it
+            dropped = sum(len(group.calls) for group in self.groups)
+            if dropped:
+                LOGGER.warning('Batch left on %s, %d queued calls dropped.' % (exc_type.__name__, dropped))
+            self.groups = []
+            self.calls = []
+            self.client._batch = None
+            return False
+        try:
+            self.flush()
+        finally:
+            self.client._batch = None
+        failed = [call for call in self.calls if call.error is not None]
+        if failed and self.raise_errors:
+            raise TransmissionError('%d of %d batched calls failed.' % (len(failed), len(self.calls)),
+                                    failed[0].error)
+        return False
+
+    def add(self, method, arguments, ids, timeout=None):
+        """Queue a call, returns its BatchCall"""
+        arguments = dict(arguments)
+        arguments.pop('ids', None)
+        key = (method, json.dumps(arguments, sort_keys=True))
+        call = BatchCall(method, list(ids))
+        self.calls.append(call)
+
+        group = None
+        for candidate in reversed(self.groups):
+            if candidate.key == key:
+                group = candidate
+                break
+            if not candidate.id_set.isdisjoint(call.ids):
+                # an earlier call on these torrents would be overtaken
+                break
+        if group is None:
+            group = BatchGroup(method, arguments, key)
+            self.groups.append(group)
+        group.add(call, timeout)
+
+        if len(group.ids) >= self.size:
+            self.flush()
+        return call
+
+    def flush(self):
+        """Send the queued calls, in the order their groups were created"""
+        groups, self.groups = self.groups, []
+        batch, self.client._batch = self.client._batch, None
+        try:
+            for group in groups:
+                self.requests += 1
+                try:
+                    result = self.client._request(group.method, dict(group.arguments), group.ids, True,
+                                                  timeout=group.timeout)
+                    error = None
+                except TransmissionError as request_error:
+                    result, error = None, request_error
+                    LOGGER.warning('Batched %s of %d ids failed: %s' % (group.method, len(group.ids), error))
+                for call in group.calls:
+                    call.result = result
+                    call.error = error
+                    call.done = True
+        finally:
+            self.client._batch = batch
+        if groups:
+            LOGGER.info('Batch flushed %d calls in %d requests.'
+                        % (sum(len(group.calls) for group in groups), len(groups)))
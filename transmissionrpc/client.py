@@ -6,10 +6,12 @@ import sys, re, time, operator, warnings, os
 import base64
 import json
 
-from transmissionrpc.constants import DEFAULT_PORT, DEFAULT_TIMEOUT
+from transmissionrpc.constants import DEFAULT_PORT, DEFAULT_TIMEOUT, STREAM_MAX_BUFFER, TORRENT_GET_PROFILES
 from transmissionrpc.error import TransmissionError, HTTPHandlerError
-from transmissionrpc.utils import LOGGER, get_arguments, make_rpc_name, argument_value_convert, rpc_bool, is_logger_configured
+from transmissionrpc.utils import LOGGER, get_arguments, make_rpc_name, argument_value_convert, rpc_bool, is_logger_configured, truncate_dump
 from transmissionrpc.httphandler import DefaultHTTPHandler
+from transmissionrpc.jsonstream import StreamDecoder
+from transmissionrpc.batch import Batch, BATCH_METHODS, DEFAULT_BATCH_SIZE
 from transmissionrpc.torrent import Torrent
 from transmissionrpc.session import Session
 
@@ -170,6 +172,8 @@ class Client(object):
         self.session_id = 0
         self.server_version = None
         self.protocol_version = None
+        self._removed_ids = []
+        self._batch = None
         self.get_session()
         self.torrent_get_arguments = get_arguments('torrent-get'
                                                    , self.rpc_version)
@@ -194,9 +198,9 @@ class Client(object):
 
     timeout = property(_get_timeout, _set_timeout, _del_timeout, doc="HTTP query timeout.")
 
-    def _http_query(self, query, timeout=None):
+    def _http_query(self, query, timeout=None, stream=False):
         """
-        Query Transmission through HTTP.
+        Query Transmission through HTTP. With stream, the response body is returned as a file-like object.
         """
         headers = {'x-transmission-session-id': str(self.session_id)}
         result = {}
@@ -206,9 +210,13 @@ class Client(object):
         use_logger = is_logger_configured()
         while True:
             if use_logger:
-                LOGGER.debug(json.dumps({'url': self.url, 'headers': headers, 'query': query, 'timeout': timeout}, indent=2))
+                LOGGER.debug(json.dumps({'url': self.url, 'headers': headers, 'query': truncate_dump(query),
+                                         'timeout': timeout}, indent=2))
             try:
-                result = self.http_handler.request(self.url, query, headers, timeout)
+                if stream:
+                    result = self.http_handler.request_stream(self.url, query, headers, timeout)
+                else:
+                    result = self.http_handler.request(self.url, query, headers, timeout)
                 break
             except HTTPHandlerError as error:
                 if error.code == 409:
@@ -243,16 +251,24 @@ class Client(object):
             arguments = {}
         if not isinstance(arguments, dict):
             raise ValueError('request takes arguments as dict')
-        ids = parse_torrent_ids(ids)
-        if len(ids) > 0:
+        if ids == 'recently-active':
+            # torrents changed in the last minute, the reply also lists the removed ids
             arguments['ids'] = ids
-        elif require_ids:
-            raise ValueError('request require ids')
+        else:
+            ids = parse_torrent_ids(ids)
+            if len(ids) > 0:
+                arguments['ids'] = ids
+            elif require_ids:
+                raise ValueError('request require ids')
+        if self._batch is not None and method in BATCH_METHODS and isinstance(arguments.get('ids'), list):
+            return self._batch.add(method, arguments, arguments['ids'], timeout)
         use_logger = is_logger_configured()
 
         query = json.dumps({'tag': self._sequence, 'method': method
                             , 'arguments': arguments})
         self._sequence += 1
+        if method == 'torrent-get':
+            return self._request_torrents(query, arguments, timeout)
         start = time.time()
         http_data = self._http_query(query, timeout)
         elapsed = time.time() - start
@@ -260,29 +276,23 @@ class Client(object):
             LOGGER.info('http request took %.3f s' % (elapsed))
 
         try:
+            start = time.time()
             data = json.loads(http_data)
+            if use_logger:
+                LOGGER.info('%s response: %d bytes, parsed in %.3f s' % (method, len(http_data), time.time() - start))
         except ValueError as error:
             if use_logger:
                 LOGGER.error('Error: ' + str(error))
-                LOGGER.error('Request: \"%s\"' % (query))
-                LOGGER.error('HTTP data: \"%s\"' % (http_data))
+                LOGGER.error('Request: \"%s\"' % (truncate_dump(query)))
+                LOGGER.error('HTTP data: \"%s\"' % (truncate_dump(http_data)))
             raise
         
         if use_logger:
-            LOGGER.debug(json.dumps(data, indent=2))
-        if 'result' in data:
-            if data['result'] != 'success':
-                raise TransmissionError('Query failed with result \"%s\".' % (data['result']))
-        else:
-            raise TransmissionError('Query failed without result.')
+            LOGGER.debug(truncate_dump(http_data))
+        self._check_result(data)
 
         results = {}
-        if method == 'torrent-get':
-            for item in data['arguments']['torrents']:
-                results[item['id']] = Torrent(self, item)
-                if self.protocol_version == 2 and 'peers' not in item:
-                    self.protocol_version = 1
-        elif method == 'torrent-add':
+        if method == 'torrent-add':
             item = None
             if 'torrent-added' in data['arguments']:
                 item = data['arguments']['torrent-added']
@@ -307,6 +317,79 @@ class Client(object):
 
         return results
 
+    def batch(self, size=DEFAULT_BATCH_SIZE, raise_errors=True):
+        """
+        Context manager collecting the mutating calls, remove_torrent, start_torrent,
+        stop_torrent, verify_torrent, reannounce_torrent, change_torrent,
+        move_torrent_data and locate_torrent_data. Calls with the same method and
+        arguments are sent as one request with their ids combined, when leaving the
+        context or once a request reaches ``size`` ids.
+
+        Inside the context these calls return a BatchCall holding, once flushed, the
+        result or error of the request it was part of.
+
+        ::
+
+            with client.batch():
+                for torrent in done:
+                    client.remove_torrent(torrent.id, delete_data=True)
+        """
+        return Batch(self, size, raise_errors)
+
+    def _check_result(self, data):
+        if 'result' in data:
+            if data['result'] != 'success':
+                raise TransmissionError('Query failed with result \"%s\".' % (data['result']))
+        else:
+            raise TransmissionError('Query failed without result.')
+
+    def _request_torrents(self, query, arguments, timeout):
+        """
+        Send a torrent-get request, building the Torrent objects while the response is read.
+
+        At most one torrent worth of undecoded JSON is held in memory, a single torrent
+        bigger than STREAM_MAX_BUFFER characters fails the request.
+        """
+        use_logger = is_logger_configured()
+        start = time.time()
+        response = self._http_query(query, timeout, stream=True)
+        decoder = StreamDecoder(response, STREAM_MAX_BUFFER)
+        data = {}
+        results = {}
+        try:
+            for key in decoder.members():
+                if key != 'arguments':
+                    data[key] = decoder.value()
+                    continue
+                data[key] = {}
+                for name in decoder.members():
+                    if name != 'torrents':
+                        data[key][name] = decoder.value()
+                        continue
+                    for index in decoder.items():
+                        item = decoder.value()
+                        if index == 0 and use_logger:
+                            LOGGER.debug('first torrent: %s' % truncate_dump(json.dumps(item)))
+                        results[item['id']] = Torrent(self, item)
+                        if self.protocol_version == 2 and 'peers' in arguments['fields'] and 'peers' not in item:
+                            self.protocol_version = 1
+        except HTTPHandlerError as error:
+            raise TransmissionError('Request failed.', error)
+        except TransmissionError:
+            if use_logger:
+                LOGGER.error('Request: \"%s\"' % (truncate_dump(query)))
+            raise
+        finally:
+            response.close()
+        if use_logger:
+            LOGGER.info('torrent-get response: %d bytes, %d torrents, read and decoded in %.3f s'
+                        % (decoder.bytes_read, len(results), time.time() - start))
+            LOGGER.debug(truncate_dump(json.dumps(data)))
+
+        self._check_result(data)
+        self._removed_ids = data.get('arguments', {}).get('removed', [])
+        return results
+
     def _update_session(self, data):
         """
         Update session data.
@@ -484,7 +567,7 @@ class Client(object):
         delete_data is True, otherwise not.
         """
         self._rpc_version_warning(3)
-        self._request('torrent-remove',
+        return self._request('torrent-remove',
                     {'delete-local-data':rpc_bool(delete_data)}, ids, True, timeout=timeout)
 
     def remove(self, ids, delete_data=False, timeout=None):
@@ -501,7 +584,7 @@ class Client(object):
         method = 'torrent-start'
         if bypass_queue and self.rpc_version >= 14:
             method = 'torrent-start-now'
-        self._request(method, {}, ids, True, timeout=timeout)
+        return self._request(method, {}, ids, True, timeout=timeout)
 
     def start(self, ids, bypass_queue=False, timeout=None):
         """
@@ -525,7 +608,7 @@ class Client(object):
 
     def stop_torrent(self, ids, timeout=None):
         """stop torrent(s) with provided id(s)"""
-        self._request('torrent-stop', {}, ids, True, timeout=timeout)
+        return self._request('torrent-stop', {}, ids, True, timeout=timeout)
 
     def stop(self, ids, timeout=None):
         """
@@ -538,7 +621,7 @@ class Client(object):
 
     def verify_torrent(self, ids, timeout=None):
         """verify torrent(s) with provided id(s)"""
-        self._request('torrent-verify', {}, ids, True, timeout=timeout)
+        return self._request('torrent-verify', {}, ids, True, timeout=timeout)
 
     def verify(self, ids, timeout=None):
         """
@@ -552,7 +635,7 @@ class Client(object):
     def reannounce_torrent(self, ids, timeout=None):
         """Reannounce torrent(s) with provided id(s)"""
         self._rpc_version_warning(5)
-        self._request('torrent-reannounce', {}, ids, True, timeout=timeout)
+        return self._request('torrent-reannounce', {}, ids, True, timeout=timeout)
 
     def reannounce(self, ids, timeout=None):
         """
@@ -563,14 +646,25 @@ class Client(object):
         warnings.warn('reannounce has been deprecated, please use reannounce_torrent instead.', DeprecationWarning)
         self.reannounce_torrent(ids, timeout)
 
-    def get_torrent(self, torrent_id, arguments=None, timeout=None):
+    def get_profile_arguments(self, profile):
+        """
+        Get the torrent-get fields of a named profile (see TORRENT_GET_PROFILES) supported by the server.
+        """
+        if profile not in TORRENT_GET_PROFILES:
+            raise ValueError('Unknown torrent-get profile "%s".' % (profile))
+        return [field for field in TORRENT_GET_PROFILES[profile] if field in self.torrent_get_arguments]
+
+    def get_torrent(self, torrent_id, arguments=None, timeout=None, profile=None):
         """
         Get information for torrent with provided id.
         ``arguments`` contains a list of field names to be returned, when None
         all fields are requested. See the Torrent class for more information.
+        ``profile`` names a predefined field set, see get_profile_arguments.
 
         Returns a Torrent object with the requested fields.
         """
+        if not arguments and profile:
+            arguments = self.get_profile_arguments(profile)
         if not arguments:
             arguments = self.torrent_get_arguments
         torrent_id = parse_torrent_id(torrent_id)
@@ -585,16 +679,32 @@ class Client(object):
                     return torrent
             raise KeyError("Torrent not found in result")
 
-    def get_torrents(self, ids=None, arguments=None, timeout=None):
+    def get_torrents(self, ids=None, arguments=None, timeout=None, profile=None):
         """
         Get information for torrents with provided ids. For more information see get_torrent.
 
         Returns a list of Torrent object.
         """
+        if not arguments and profile:
+            arguments = self.get_profile_arguments(profile)
         if not arguments:
             arguments = self.torrent_get_arguments
         return list(self._request('torrent-get', {'fields': arguments}, ids, timeout=timeout).values())
 
+    def get_recently_active_torrents(self, arguments=None, timeout=None, profile=None):
+        """
+        Get the torrents active in the last minute, together with the ids of the torrents removed in that time.
+        Pass either ``arguments`` or ``profile`` as for get_torrents.
+
+        Returns a tuple with a list of Torrent object and a list of removed torrent ids.
+        """
+        if not arguments and profile:
+            arguments = self.get_profile_arguments(profile)
+        if not arguments:
+            arguments = self.torrent_get_arguments
+        torrents = list(self._request('torrent-get', {'fields': arguments}, 'recently-active', timeout=timeout).values())
+        return torrents, self._removed_ids
+
     def info(self, ids=None, arguments=None, timeout=None):
         """
 
@@ -644,11 +754,21 @@ class Client(object):
     			...
     		}
         """
+        result = {}
+        for tid, file_table in iteritems(self.get_file_tables(ids, timeout)):
+            result[tid] = file_table.files()
+        return result
+
+    def get_file_tables(self, ids=None, timeout=None):
+        """
+        Get the files of the provided torrent id(s) as FileTable objects, in a dictionary
+        indexed by torrent id. Cheaper than get_files for torrents with many files.
+        """
         fields = ['id', 'name', 'hashString', 'files', 'priorities', 'wanted']
         request_result = self._request('torrent-get', {'fields': fields}, ids, timeout=timeout)
         result = {}
         for tid, torrent in iteritems(request_result):
-            result[tid] = torrent.files()
+            result[tid] = torrent.file_table()
         return result
 
     def set_files(self, items, timeout=None):
@@ -755,7 +875,7 @@ class Client(object):
             args[arg] = val
 
         if len(args) > 0:
-            self._request('torrent-set', args, ids, True, timeout=timeout)
+            return self._request('torrent-set', args, ids, True, timeout=timeout)
         else:
             ValueError("No arguments to set")
 
@@ -772,7 +892,7 @@ class Client(object):
         """Move torrent data to the new location."""
         self._rpc_version_warning(6)
         args = {'location': location, 'move': True}
-        self._request('torrent-set-location', args, ids, True, timeout=timeout)
+        return self._request('torrent-set-location', args, ids, True, timeout=timeout)
 
     def move(self, ids, location, timeout=None):
         """
@@ -787,7 +907,7 @@ class Client(object):
         """Locate torrent data at the provided location."""
         self._rpc_version_warning(6)
         args = {'location': location, 'move': False}
-        self._request('torrent-set-location', args, ids, True, timeout=timeout)
+        return self._request('torrent-set-location', args, ids, True, timeout=timeout)
 
     def locate(self, ids, location, timeout=None):
         """
@@ -19,6 +19,12 @@ DEFAULT_PORT = 9091
 
 DEFAULT_TIMEOUT = 30.0
 
+# largest single JSON value buffered while streaming a torrent-get response, in characters
+STREAM_MAX_BUFFER = 32 * 1024 * 1024
+
+# longest payload excerpt written to the debug log, in characters
+DEBUG_DUMP_SIZE = 4096
+
 TR_PRI_LOW    = -1
 TR_PRI_NORMAL =  0
 TR_PRI_HIGH   =  1
@@ -189,6 +195,14 @@ TORRENT_ARGS = {
     }
 }
 
+# Named field sets for torrent-get, a listing only transfers the fields its caller reads.
+TORRENT_GET_PROFILES = {
+    'completion': ['id', 'hashString', 'name', 'status', 'percentDone', 'sizeWhenDone', 'leftUntilDone'
+        , 'downloadDir', 'doneDate'],
+    'files': ['id', 'hashString', 'name', 'status', 'percentDone', 'sizeWhenDone', 'leftUntilDone'
+        , 'downloadDir', 'doneDate', 'files', 'priorities', 'wanted'],
+}
+
 # Arguments for session methods
 SESSION_ARGS = {
     'get': {
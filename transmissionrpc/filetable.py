@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Licensed under the MIT license.
+
+from array import array
+
+from transmissionrpc.constants import PRIORITY
+
+try:
+    array('q')
+    SIZE_TYPECODE = 'q'
+except ValueError:
+    # Python 2 has no 'q', long is 64 bits on the platforms Transmission runs on
+    SIZE_TYPECODE = 'l'
+
+
+class FileTable(object):
+    """
+    FileTable holds the files of a torrent column by column.
+
+    Sizes, completed bytes, priorities and wanted flags are typed arrays
+    indexed by file id, names are a list. Filters run over the columns and
+    return file ids, no per-file dictionary is built unless asked for with
+    ``files()``.
+    """
+    __slots__ = ['names', 'sizes', 'completed', 'priorities', 'wanted']
+
+    def __init__(self, names=None, sizes=None, completed=None, priorities=None, wanted=None):
+        self.names = names if names is not None else []
+        self.sizes = array(SIZE_TYPECODE, sizes if sizes is not None else [])
+        self.completed = array(SIZE_TYPECODE, completed if completed is not None else [])
+        self.priorities = array('b', priorities if priorities is not None else [])
+        self.wanted = array('b', wanted if wanted is not None else [])
+
+    @classmethod
+    def from_fields(cls, files, priorities, wanted):
+        """
+        Build a table from the ``files``, ``priorities`` and ``wanted`` torrent fields.
+        """
+        return cls([item['name'] for item in files],
+                   [item['length'] for item in files],
+                   [item['bytesCompleted'] for item in files],
+                   priorities, wanted)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return '<FileTable %d files, %d bytes>' % (len(self), self.total_size())
+
+    def total_size(self):
+        return sum(self.sizes)
+
+    def select(self, min_size=None, complete=None, selected=None, priority=None):
+        """
+        Get the ids of the files matching every given criterion.
+
+         * min_size, files of at least min_size bytes.
+         * complete, True for fully downloaded files, False for the others.
+         * selected, True for files selected for download, False for the others.
+         * priority, 'high', 'normal' or 'low'.
+        """
+        ids = range(len(self.names))
+        if min_size is not None:
+            ids = [fid for fid, size in enumerate(self.sizes) if size >= min_size]
+        if complete is not None:
+            sizes, completed = self.sizes, self.completed
+            ids = [fid for fid in ids if (completed[fid] >= sizes[fid]) == complete]
+        if selected is not None:
+            wanted = self.wanted
+            ids = [fid for fid in ids if bool(wanted[fid]) == selected]
+        if priority is not None:
+            priorities, value = self.priorities, PRIORITY[priority]
+            ids = [fid for fid in ids if priorities[fid] == value]
+        return list(ids)
+
+    def file(self, fid):
+        """
+        Get the file information of one file, in the format of ``files()``.
+        """
+        return {
+            'selected': True if self.wanted[fid] else False,
+            'priority': PRIORITY[self.priorities[fid]],
+            'size': self.sizes[fid],
+            'name': self.names[fid],
+            'completed': self.completed[fid]}
+
+    def files(self, ids=None):
+        """
+        Get a dictionary of file information indexed by file id, for all files or the given ids.
+        """
+        if ids is not None:
+            return dict((fid, self.file(fid)) for fid in ids)
+        return dict((fid, {
+            'selected': True if selected else False,
+            'priority': PRIORITY[priority],
+            'size': size,
+            'name': name,
+            'completed': completed})
+            for fid, (name, size, completed, priority, selected)
+            in enumerate(zip(self.names, self.sizes, self.completed, self.priorities, self.wanted)))
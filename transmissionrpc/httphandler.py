@@ -2,7 +2,8 @@
 # Copyright (c) 2011-2014 Erik Svensson <erik.public@gmail.com>
 # Licensed under the MIT license.
 
-import sys
+import sys, re, os, errno, select, socket, base64, hashlib, threading
+from io import BytesIO
 
 from transmissionrpc.error import HTTPHandlerError
 
@@ -12,12 +13,17 @@ if PY3:
     from urllib.request import Request, build_opener, \
         HTTPPasswordMgrWithDefaultRealm, HTTPBasicAuthHandler, HTTPDigestAuthHandler
     from urllib.error import HTTPError, URLError
-    from http.client import BadStatusLine
+    from http.client import BadStatusLine, HTTPConnection, HTTPSConnection, HTTPException
+    from urllib.parse import urlparse
 else:
     from urllib2 import Request, build_opener, \
         HTTPPasswordMgrWithDefaultRealm, HTTPBasicAuthHandler, HTTPDigestAuthHandler
     from urllib2 import HTTPError, URLError
-    from httplib import BadStatusLine
+    from httplib import BadStatusLine, HTTPConnection, HTTPSConnection, HTTPException
+    from urlparse import urlparse
+
+# send errors of a connection the server already closed
+STALE_ERRNOS = (errno.ECONNRESET, errno.EPIPE)
 
 class HTTPHandler(object):
     """
@@ -45,6 +51,14 @@ class HTTPHandler(object):
         """
         raise NotImplementedError("Bad HTTPHandler, failed to implement request.")
 
+    def request_stream(self, url, query, headers, timeout):
+        """
+        Like request, but return the response body as a file-like object of UTF-8 bytes,
+        read and closed by the caller. Handlers able to stream the body should override this,
+        the default reads it whole.
+        """
+        return BytesIO(self.request(url, query, headers, timeout).encode('utf-8'))
+
 class DefaultHTTPHandler(HTTPHandler):
     """
     The default HTTP handler provided with transmissionrpc.
@@ -59,6 +73,13 @@ class DefaultHTTPHandler(HTTPHandler):
         self.http_opener = build_opener(HTTPBasicAuthHandler(password_manager), HTTPDigestAuthHandler(password_manager))
 
     def request(self, url, query, headers, timeout):
+        response = self.request_stream(url, query, headers, timeout)
+        try:
+            return response.read().decode('utf-8')
+        finally:
+            response.close()
+
+    def request_stream(self, url, query, headers, timeout):
         request = Request(url, query.encode('utf-8'), headers)
         try:
             if (sys.version_info[0] == 2 and sys.version_info[1] > 5) or sys.version_info[0] > 2:
@@ -79,4 +100,246 @@ class DefaultHTTPHandler(HTTPHandler):
                 raise HTTPHandlerError(httpmsg='urllib2.URLError: %s' % (error.reason))
         except BadStatusLine as error:
             raise HTTPHandlerError(httpmsg='httplib.BadStatusLine: %s' % (error.line))
-        return response.read().decode('utf-8')
+        return response
+
+class PooledResponse(object):
+    """
+    Body of a response streamed from a pooled connection. The connection goes
+    back to the pool when the body was read to the end, otherwise it is closed.
+    """
+
+    def __init__(self, handler, key, connection, response):
+        self.handler = handler
+        self.key = key
+        self.connection = connection
+        self.response = response
+
+    def read(self, size=-1):
+        try:
+            return self.response.read() if size is None or size < 0 else self.response.read(size)
+        except (socket.error, HTTPException) as error:
+            self.close()
+            raise HTTPHandlerError(httpmsg='%s: %s' % (type(error).__name__, error))
+
+    def close(self):
+        if self.connection is None:
+            return
+        if self.response.isclosed() and not self.response.will_close:
+            self.handler._release(self.key, self.connection)
+        else:
+            self.connection.close()
+        self.connection = None
+
+class PooledHTTPHandler(HTTPHandler):
+    """
+    HTTP handler keeping persistent HTTP/1.1 connections to the server.
+
+    Connections are reused across requests, a request failing on a reused
+    connection that the server closed in the meantime is retried once on a
+    new one, as long as the failure shows the request was not processed: a
+    reset or broken pipe while sending, a reset or the connection closed
+    before any response byte. Timeouts are never retried. Idle connections
+    the server closed are dropped before they are used. Basic and Digest
+    authentication are negotiated once and then sent preemptively with
+    every request.
+    """
+    AUTH_PARAM = re.compile(r'(\w+)=(?:"([^"]*)"|([^\s,]*))')
+
+    def __init__(self, max_connections=4):
+        HTTPHandler.__init__(self)
+        self.max_connections = max_connections
+        self.lock = threading.Lock()
+        self.pool = {}
+        self.login = None
+        self.password = None
+        self.auth_scheme = None
+        self.digest = None
+        self.nonce_count = 0
+
+    def set_authentication(self, uri, login, password):
+        self.login = login
+        self.password = password
+        self.auth_scheme = None
+        self.digest = None
+
+    def _connection(self, key, timeout):
+        with self.lock:
+            idle = self.pool.get(key)
+            while idle:
+                connection = idle.pop()
+                if not self._dropped(connection):
+                    return connection, True
+                connection.close()
+        scheme, host, port = key
+        connection_class = HTTPSConnection if scheme == 'https' else HTTPConnection
+        connection = connection_class(host, port, timeout=timeout)
+        connection.connect()
+        # small request/response pairs, do not let Nagle wait for delayed ACKs
+        connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection, False
+
+    @staticmethod
+    def _dropped(connection):
+        """ An idle connection is readable only when the server closed it """
+        if connection.sock is None:
+            return True
+        try:
+            return bool(select.select([connection.sock], [], [], 0)[0])
+        except (select.error, socket.error, ValueError):
+            return True
+
+    def _release(self, key, connection):
+        with self.lock:
+            idle = self.pool.setdefault(key, [])
+            if len(idle) < self.max_connections:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self.lock:
+            for idle in self.pool.values():
+                for connection in idle:
+                    connection.close()
+            self.pool = {}
+
+    def _authorization(self, path):
+        if self.auth_scheme == 'basic':
+            credentials = ('%s:%s' % (self.login, self.password)).encode('utf-8')
+            return 'Basic ' + base64.b64encode(credentials).decode('ascii')
+        if self.auth_scheme == 'digest':
+            return self._digest_authorization(path)
+        return None
+
+    def _digest_authorization(self, path):
+        def md5(text):
+            return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+        challenge = self.digest
+        with self.lock:
+            self.nonce_count += 1
+            nonce_count = '%08x' % self.nonce_count
+        cnonce = base64.b16encode(os.urandom(8)).decode('ascii').lower()
+        ha1 = md5('%s:%s:%s' % (self.login, challenge['realm'], self.password))
+        ha2 = md5('POST:%s' % path)
+        qop = 'auth' if 'auth' in challenge.get('qop', '').split(',') else None
+        if qop:
+            response = md5('%s:%s:%s:%s:%s:%s' % (ha1, challenge['nonce'], nonce_count, cnonce, qop, ha2))
+        else:
+            response = md5('%s:%s:%s' % (ha1, challenge['nonce'], ha2))
+
+        header = 'Digest username="%s", realm="%s", nonce="%s", uri="%s", response="%s"' \
+                 % (self.login, challenge['realm'], challenge['nonce'], path, response)
+        if 'opaque' in challenge:
+            header += ', opaque="%s"' % challenge['opaque']
+        if qop:
+            header += ', qop=%s, nc=%s, cnonce="%s"' % (qop, nonce_count, cnonce)
+        return header
+
+    def _negotiate(self, challenge):
+        """ Pick the authentication scheme from a WWW-Authenticate header, returns False if unusable """
+        if self.login is None or not challenge:
+            return False
+        scheme = challenge.split(None, 1)[0].lower()
+        if scheme == 'digest':
+            params = dict((key.lower(), quoted or plain) for key, quoted, plain in self.AUTH_PARAM.findall(challenge))
+            if 'nonce' not in params or params.get('algorithm', 'MD5').upper() != 'MD5':
+                return False
+            retry = self.auth_scheme != 'digest' or params.get('stale', '').lower() == 'true'
+            self.auth_scheme = 'digest'
+            self.digest = params
+            with self.lock:
+                self.nonce_count = 0
+            return retry
+        if scheme == 'basic':
+            retry = self.auth_scheme != 'basic'
+            self.auth_scheme = 'basic'
+            return retry
+        return False
+
+    def _send(self, key, path, body, headers, timeout, stream=False):
+        connection, reused = self._connection(key, timeout)
+        stale = False
+        try:
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            try:
+                connection.request('POST', path, body, headers)
+            except socket.error as error:
+                stale = not isinstance(error, socket.timeout) and error.args[0] in STALE_ERRNOS
+                raise
+            try:
+                # python 2 reads an unbuffered response a byte at a time. Buffering is safe, nothing
+                # is pipelined: the server sends nothing past this response before the next request.
+                response = connection.getresponse() if PY3 else connection.getresponse(buffering=True)
+            except BadStatusLine:
+                # closed before the first byte of a response
+                stale = True
+                raise
+            except socket.error as error:
+                # reset in answer to the request, the server had closed its end already
+                stale = not isinstance(error, socket.timeout) and error.args[0] == errno.ECONNRESET
+                raise
+            if stream:
+                return response, PooledResponse(self, key, connection, response)
+            data = response.read()
+        except (socket.error, HTTPException):
+            connection.close()
+            # an idle connection the server dropped fails before the request is processed, retry once
+            # on a new one. Anything later, a timeout above all, may have run the request already.
+            if reused and stale:
+                return self._send(key, path, body, headers, timeout, stream)
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+        return response, data
+
+    def request(self, url, query, headers, timeout):
+        return self._post(url, query, headers, timeout).decode('utf-8')
+
+    def request_stream(self, url, query, headers, timeout):
+        return self._post(url, query, headers, timeout, stream=True)
+
+    def _post(self, url, query, headers, timeout, stream=False):
+        urlo = urlparse(url)
+        port = urlo.port or (443 if urlo.scheme == 'https' else 80)
+        key = (urlo.scheme, urlo.hostname, port)
+        path = urlo.path or '/'
+        body = query.encode('utf-8')
+
+        for attempt in range(2):
+            request_headers = dict(headers)
+            request_headers['Content-Type'] = 'application/json'
+            authorization = self._authorization(path)
+            if authorization:
+                request_headers['Authorization'] = authorization
+            try:
+                response, data = self._send(key, path, body, request_headers, timeout, stream)
+            except socket.timeout:
+                raise HTTPHandlerError(url, httpmsg='Request timed out after %s seconds.' % (timeout))
+            except socket.error as error:
+                raise HTTPHandlerError(url, httpcode=error.args[0] if len(error.args) == 2 else None,
+                                       httpmsg=str(error))
+            except BadStatusLine as error:
+                raise HTTPHandlerError(url, httpmsg='httplib.BadStatusLine: %s' % (error.line))
+            except HTTPException as error:
+                raise HTTPHandlerError(url, httpmsg='%s: %s' % (type(error).__name__, error))
+
+            if stream and response.status >= 400:
+                # error bodies are small, read them to keep the connection usable
+                stream_data, data = data, data.read()
+                stream_data.close()
+
+            if response.status == 401 and attempt == 0 \
+                    and self._negotiate(response.getheader('www-authenticate')):
+                continue
+            break
+
+        if response.status >= 400:
+            raise HTTPHandlerError(url, response.status, response.reason, dict(response.getheaders()),
+                                   data.decode('utf-8', 'replace'))
+        return data
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Licensed under the MIT license.
+
+import json
+import codecs
+
+from transmissionrpc.error import TransmissionError
+
+WHITESPACE = ' \t\n\r'
+
+
+class StreamDecoder(object):
+    """
+    Incremental JSON decoder reading from a file-like object.
+
+    The document is walked with ``members()`` for objects and ``items()``
+    for arrays, values are decoded one at a time with ``value()``. Only the
+    undecoded text is buffered, a single value bigger than ``max_buffer``
+    characters raises a TransmissionError instead of growing without bound.
+    """
+
+    def __init__(self, fp, max_buffer, chunk_size=64 * 1024):
+        self.fp = fp
+        self.max_buffer = max_buffer
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = u''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _fill(self, size=None):
+        """Read at least one more chunk, returns False at the end of the stream"""
+        if self.eof:
+            return False
+        data = self.fp.read(size or self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.bytes_read += len(data)
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        self.buffer += self.text_decoder.decode(data)
+        if len(self.buffer) > self.max_buffer:
+            raise TransmissionError('JSON value larger than %d characters in response.' % (self.max_buffer))
+        return True
+
+    def _peek(self):
+        """Skip whitespace and return the next character, None at the end of the stream"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char is None or char not in chars:
+            raise TransmissionError('Invalid JSON in response, expected %s after %d bytes, got %r.'
+                                    % (' or '.join(repr(c) for c in chars), self.bytes_read, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete value"""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError as error:
+                # most likely cut in the middle, read more, at least doubling what is pending
+                if not self._fill(max(self.chunk_size, len(self.buffer) - self.pos)):
+                    raise TransmissionError('Invalid JSON in response: %s' % (error))
+                continue
+            # a number may go on in the next chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self):
+        """Walk an object, yields its keys. The caller consumes every value before asking for the next key."""
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self._expect(':')
+            yield key
+            if self._expect(',}') == '}':
+                return
+
+    def items(self):
+        """Walk an array, yields the index of each item. The caller consumes every item before the next one."""
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self._expect(',]') == ']':
+                return
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# Licensed under the MIT license.
+
+import time
+import threading
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+
+from transmissionrpc.constants import DEFAULT_PORT, DEFAULT_TIMEOUT, LOGGER
+from transmissionrpc.error import TransmissionError
+from transmissionrpc.client import Client
+
+from six import integer_types
+
+
+def parse_hosts(hosts, port=DEFAULT_PORT):
+    """
+    Parse a comma separated string or a list of "host" or "host:port" items into a list of (host, port).
+    """
+    if not isinstance(hosts, (list, tuple)):
+        hosts = hosts.split(',')
+    result = []
+    for item in hosts:
+        if isinstance(item, tuple):
+            result.append(item)
+            continue
+        item = item.strip()
+        if not item:
+            continue
+        # leave URLs and bare IPv6 addresses alone
+        if '://' not in item and item.count(':') == 1:
+            host, item_port = item.split(':')
+            result.append((host, int(item_port)))
+        else:
+            result.append((item, port))
+    return result
+
+
+class MultiClient(object):
+    """
+    MultiClient runs the same request against several Transmission daemons at once.
+
+    Every host gets its own Client, hence its own session id negotiation and
+    HTTP connections. Requests run from a thread pool and each host has its
+    own deadline, a host failing or timing out is reported in the errors and
+    does not hold back the others. Clients are created on first use, in the
+    pool as well.
+    """
+
+    def __init__(self, hosts, port=DEFAULT_PORT, user=None, password=None, http_handler_factory=None, timeout=None):
+        self.hosts = parse_hosts(hosts, port)
+        self.user = user
+        self.password = password
+        if isinstance(timeout, (integer_types, float)):
+            self.timeout = float(timeout)
+        else:
+            self.timeout = DEFAULT_TIMEOUT
+        self.http_handler_factory = http_handler_factory
+        self.clients = {}
+        self._lock = threading.Lock()
+        # a Client is not thread safe, calls to the same host never overlap
+        self._host_locks = dict((host, threading.Lock()) for host in self.hosts)
+        self._pool = ThreadPool(max(1, len(self.hosts)))
+
+    @staticmethod
+    def server_name(host):
+        return '%s:%s' % host
+
+    def client(self, host):
+        """
+        Get the Client of a (host, port), connecting to it if needed.
+        """
+        with self._lock:
+            client = self.clients.get(host)
+        if client is None:
+            http_handler = self.http_handler_factory() if self.http_handler_factory else None
+            client = Client(host[0], host[1], self.user, self.password, http_handler=http_handler,
+                            timeout=self.timeout)
+            with self._lock:
+                self.clients[host] = client
+        return client
+
+    def map(self, function, timeout=None):
+        """
+        Call function(server name, Client) for every host concurrently.
+
+        Returns a tuple with a dictionary of results and a dictionary of errors, both indexed by server name.
+        A host not done within ``timeout`` seconds is reported as a TransmissionError.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        pending = []
+        for host in self.hosts:
+            name = self.server_name(host)
+            pending.append((name, self._pool.apply_async(self._call, (function, name, host))))
+
+        results = {}
+        errors = {}
+        deadline = time.time() + timeout
+        for name, async_result in pending:
+            try:
+                results[name] = async_result.get(max(0.0, deadline - time.time()))
+            except TimeoutError:
+                errors[name] = TransmissionError('No answer within %.1f seconds.' % (timeout))
+            except Exception as error:
+                errors[name] = error
+        for name, error in errors.items():
+            LOGGER.warning('%s: %s' % (name, error))
+        return results, errors
+
+    def _call(self, function, name, host):
+        with self._host_locks[host]:
+            return function(name, self.client(host))
+
+    def _request(self, method, arguments=None, ids=None, require_ids=False, timeout=None):
+        return self.map(lambda name, client: client._request(method, dict(arguments or {}), ids, require_ids, timeout),
+                        timeout)
+
+    def get_torrents(self, ids=None, arguments=None, timeout=None, profile=None):
+        """
+        Get the torrents of every host, see Client.get_torrents.
+        """
+        return self.map(lambda name, client: client.get_torrents(ids, arguments, timeout, profile), timeout)
+
+    def get_files(self, ids=None, timeout=None):
+        """
+        Get the files of the torrents of every host, see Client.get_files.
+        """
+        return self.map(lambda name, client: client.get_files(ids, timeout), timeout)
+
+    def get_file_tables(self, ids=None, timeout=None):
+        """
+        Get the FileTable of the torrents of every host, see Client.get_file_tables.
+        """
+        return self.map(lambda name, client: client.get_file_tables(ids, timeout), timeout)
+
+    def remove_torrent(self, ids, delete_data=False, timeout=None):
+        """
+        Remove torrents from every host. Torrent ids are only meaningful within a daemon, use hashStrings.
+        """
+        return self.map(lambda name, client: client.remove_torrent(ids, delete_data, timeout), timeout)
+
+    def close(self):
+        self._pool.close()
+        for client in self.clients.values():
+            if hasattr(client.http_handler, 'close'):
+                client.http_handler.close()
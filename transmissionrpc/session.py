@@ -2,8 +2,6 @@
 # Copyright (c) 2008-2014 Erik Svensson <erik.public@gmail.com>
 # Licensed under the MIT license.
 
-from transmissionrpc.utils import Field
-
 from six import iteritems, integer_types
 
 class Session(object):
@@ -16,22 +14,37 @@ class Session(object):
     ``download-dir`` -> ``download_dir``.
     """
 
+    __slots__ = ['_client', '_fields', '_dirty']
+
+    OUTGOING_KEYS = ('peer_port', 'pex_enabled')
+
     def __init__(self, client=None, fields=None):
         self._client = client
         self._fields = {}
+        self._dirty = None
         if fields is not None:
             self._update_fields(fields)
 
     def __getattr__(self, name):
+        # only reached for names that are not slots, guard against unset slots (e.g. while unpickling)
+        if name in Session.__slots__:
+            raise AttributeError(name)
         try:
-            return self._fields[name].value
+            return self._fields[name]
         except KeyError:
             raise AttributeError('No attribute %s' % name)
 
+    def __getstate__(self):
+        return dict((key, getattr(self, key, None)) for key in Session.__slots__)
+
+    def __setstate__(self, state):
+        for key, value in iteritems(state):
+            setattr(self, key, value)
+
     def __str__(self):
         text = ''
         for key in sorted(self._fields.keys()):
-            text += '% 32s: %s\n' % (key[-32:], self._fields[key].value)
+            text += '% 32s: %s\n' % (key[-32:], self._fields[key])
         return text
 
     def _update_fields(self, other):
@@ -40,29 +53,37 @@ class Session(object):
         """
         if isinstance(other, dict):
             for key, value in iteritems(other):
-                self._fields[key.replace('-', '_')] = Field(value, False)
+                self._fields[key.replace('-', '_')] = value
+            keys = [key.replace('-', '_') for key in other]
         elif isinstance(other, Session):
-            for key in list(other._fields.keys()):
-                self._fields[key] = Field(other._fields[key].value, False)
+            self._fields.update(other._fields)
+            keys = other._fields
         else:
             raise ValueError('Cannot update with supplied data')
+        # fresh data from the server overrides local changes
+        if self._dirty:
+            self._dirty.difference_update(keys)
+
+    def _set(self, key, value):
+        """Change a writable field, it is sent to the server by the next push"""
+        self._fields[key] = value
+        if self._dirty is None:
+            self._dirty = set()
+        self._dirty.add(key)
 
     def _dirty_fields(self):
         """Enumerate changed fields"""
-        outgoing_keys = ['peer_port', 'pex_enabled']
-        fields = []
-        for key in outgoing_keys:
-            if key in self._fields and self._fields[key].dirty:
-                fields.append(key)
-        return fields
+        if not self._dirty:
+            return []
+        return [key for key in self.OUTGOING_KEYS if key in self._dirty and key in self._fields]
 
     def _push(self):
         """Push changed fields to the server"""
         dirty = self._dirty_fields()
         args = {}
         for key in dirty:
-            args[key] = self._fields[key].value
-            self._fields[key] = self._fields[key]._replace(dirty=False)
+            args[key] = self._fields[key]
+        self._dirty = None
         if len(args) > 0:
             self._client.set_session(**args)
 
@@ -82,14 +103,14 @@ class Session(object):
         """
         Get the peer port.
         """
-        return self._fields['peer_port'].value
+        return self._fields['peer_port']
 
     def _set_peer_port(self, port):
         """
         Set the peer port.
         """
         if isinstance(port, integer_types):
-            self._fields['peer_port'] = Field(port, True)
+            self._set('peer_port', port)
             self._push()
         else:
             raise ValueError('Not a valid limit')
@@ -98,12 +119,12 @@ class Session(object):
 
     def _get_pex_enabled(self):
         """Is peer exchange enabled?"""
-        return self._fields['pex_enabled'].value
+        return self._fields['pex_enabled']
 
     def _set_pex_enabled(self, enabled):
         """Enable/disable peer exchange."""
         if isinstance(enabled, bool):
-            self._fields['pex_enabled'] = Field(enabled, True)
+            self._set('pex_enabled', enabled)
             self._push()
         else:
             raise TypeError("Not a valid type")
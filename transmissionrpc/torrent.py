@@ -5,7 +5,8 @@
 import sys, datetime
 
 from transmissionrpc.constants import PRIORITY, RATIO_LIMIT, IDLE_LIMIT
-from transmissionrpc.utils import Field, format_timedelta
+from transmissionrpc.utils import format_timedelta
+from transmissionrpc.filetable import FileTable
 
 from six import integer_types, string_types, text_type, iteritems
 
@@ -40,12 +41,22 @@ class Torrent(object):
 
     All fetched torrent fields are accessible through this class using attributes.
     This class has a few convenience properties using the torrent data.
+
+    Field values are kept as they come from the JSON response, in a plain
+    dictionary. Changes made through the mutators are tracked in a set
+    allocated on the first change, so read-only torrents carry no dirty state.
     """
+    __slots__ = ['_client', '_fields', '_dirty', '_file_table', '_incoming_pending', '_outgoing_pending']
+
+    OUTGOING_KEYS = ('bandwidthPriority', 'downloadLimit', 'downloadLimited', 'peer_limit', 'queuePosition'
+        , 'seedIdleLimit', 'seedIdleMode', 'seedRatioLimit', 'seedRatioMode', 'uploadLimit', 'uploadLimited')
 
     def __init__(self, client, fields):
         if 'id' not in fields:
             raise ValueError('Torrent requires an id')
         self._fields = {}
+        self._dirty = None
+        self._file_table = None
         self._update_fields(fields)
         self._incoming_pending = False
         self._outgoing_pending = False
@@ -58,7 +69,7 @@ class Torrent(object):
         name = None
         # try to find name
         if 'name' in self._fields:
-            name = self._fields['name'].value
+            name = self._fields['name']
         # if name is unicode, try to decode
         if isinstance(name, text_type):
             try:
@@ -68,7 +79,7 @@ class Torrent(object):
         return name
 
     def __repr__(self):
-        tid = self._fields['id'].value
+        tid = self._fields['id']
         name = self._get_name_string()
         if isinstance(name, str):
             return '<Torrent %d \"%s\">' % (tid, name)
@@ -86,34 +97,47 @@ class Torrent(object):
         return Torrent(self._client, self._fields)
 
     def __getattr__(self, name):
+        # only reached for names that are not slots, guard against unset slots (e.g. while unpickling)
+        if name in Torrent.__slots__:
+            raise AttributeError(name)
         try:
-            return self._fields[name].value
+            return self._fields[name]
         except KeyError:
             raise AttributeError('No attribute %s' % name)
 
+    def __getstate__(self):
+        return dict((key, getattr(self, key, None)) for key in Torrent.__slots__)
+
+    def __setstate__(self, state):
+        for key, value in iteritems(state):
+            setattr(self, key, value)
+
     def _rpc_version(self):
         """Get the Transmission RPC API version."""
         if self._client:
             return self._client.rpc_version
         return 2
 
+    def _set(self, key, value):
+        """Change a writable field, it is sent to the server by the next push"""
+        self._fields[key] = value
+        if self._dirty is None:
+            self._dirty = set()
+        self._dirty.add(key)
+
     def _dirty_fields(self):
         """Enumerate changed fields"""
-        outgoing_keys = ['bandwidthPriority', 'downloadLimit', 'downloadLimited', 'peer_limit', 'queuePosition'
-            , 'seedIdleLimit', 'seedIdleMode', 'seedRatioLimit', 'seedRatioMode', 'uploadLimit', 'uploadLimited']
-        fields = []
-        for key in outgoing_keys:
-            if key in self._fields and self._fields[key].dirty:
-                fields.append(key)
-        return fields
+        if not self._dirty:
+            return []
+        return [key for key in self.OUTGOING_KEYS if key in self._dirty and key in self._fields]
 
     def _push(self):
         """Push changed fields to the server"""
         dirty = self._dirty_fields()
         args = {}
         for key in dirty:
-            args[key] = self._fields[key].value
-            self._fields[key] = self._fields[key]._replace(dirty=False)
+            args[key] = self._fields[key]
+        self._dirty = None
         if len(args) > 0:
             self._client.change_torrent(self.id, **args)
 
@@ -121,20 +145,24 @@ class Torrent(object):
         """
         Update the torrent data from a Transmission JSON-RPC arguments dictionary
         """
-        fields = None
         if isinstance(other, dict):
-            for key, value in iteritems(other):
-                self._fields[key.replace('-', '_')] = Field(value, False)
+            self._fields.update(other)
+            for key in [key for key in other if '-' in key]:
+                self._fields[key.replace('-', '_')] = self._fields.pop(key)
         elif isinstance(other, Torrent):
-            for key in list(other._fields.keys()):
-                self._fields[key] = Field(other._fields[key].value, False)
+            self._fields.update(other._fields)
         else:
             raise ValueError('Cannot update with supplied data')
+        # fresh data from the server overrides local changes
+        if self._dirty:
+            self._dirty.difference_update(key.replace('-', '_') for key in
+                                          (other._fields if isinstance(other, Torrent) else other))
+        self._file_table = None
         self._incoming_pending = False
     
     def _status(self):
         """Get the torrent status"""
-        code = self._fields['status'].value
+        code = self._fields['status']
         if self._rpc_version() >= 14:
             return get_status_new(code)
         else:
@@ -159,22 +187,20 @@ class Torrent(object):
                 ...
             }
         """
-        result = {}
-        if 'files' in self._fields:
-            files = self._fields['files'].value
-            indices = range(len(files))
-            priorities = self._fields['priorities'].value
-            wanted = self._fields['wanted'].value
-            for item in zip(indices, files, priorities, wanted):
-                selected = True if item[3] else False
-                priority = PRIORITY[item[2]]
-                result[item[0]] = {
-                    'selected': selected,
-                    'priority': priority,
-                    'size': item[1]['length'],
-                    'name': item[1]['name'],
-                    'completed': item[1]['bytesCompleted']}
-        return result
+        return self.file_table().files()
+
+    def file_table(self):
+        """
+        Get the files of this torrent as a FileTable, built once per update of the torrent data.
+        Empty if the files were not fetched.
+        """
+        if self._file_table is None:
+            if 'files' in self._fields:
+                self._file_table = FileTable.from_fields(self._fields['files'], self._fields['priorities'],
+                                                         self._fields['wanted'])
+            else:
+                self._file_table = FileTable()
+        return self._file_table
 
     @property
     def status(self):
@@ -189,8 +215,8 @@ class Torrent(object):
     def progress(self):
         """Get the download progress in percent."""
         try:
-            size = self._fields['sizeWhenDone'].value
-            left = self._fields['leftUntilDone'].value
+            size = self._fields['sizeWhenDone']
+            left = self._fields['leftUntilDone']
             return 100.0 * (size - left) / float(size)
         except ZeroDivisionError:
             return 0.0
@@ -198,12 +224,12 @@ class Torrent(object):
     @property
     def ratio(self):
         """Get the upload/download ratio."""
-        return float(self._fields['uploadRatio'].value)
+        return float(self._fields['uploadRatio'])
 
     @property
     def eta(self):
         """Get the "eta" as datetime.timedelta."""
-        eta = self._fields['eta'].value
+        eta = self._fields['eta']
         if eta >= 0:
             return datetime.timedelta(seconds=eta)
         else:
@@ -212,22 +238,22 @@ class Torrent(object):
     @property
     def date_active(self):
         """Get the attribute "activityDate" as datetime.datetime."""
-        return datetime.datetime.fromtimestamp(self._fields['activityDate'].value)
+        return datetime.datetime.fromtimestamp(self._fields['activityDate'])
 
     @property
     def date_added(self):
         """Get the attribute "addedDate" as datetime.datetime."""
-        return datetime.datetime.fromtimestamp(self._fields['addedDate'].value)
+        return datetime.datetime.fromtimestamp(self._fields['addedDate'])
 
     @property
     def date_started(self):
         """Get the attribute "startDate" as datetime.datetime."""
-        return datetime.datetime.fromtimestamp(self._fields['startDate'].value)
+        return datetime.datetime.fromtimestamp(self._fields['startDate'])
 
     @property
     def date_done(self):
         """Get the attribute "doneDate" as datetime.datetime. returns None if "doneDate" is invalid."""
-        done_date = self._fields['doneDate'].value
+        done_date = self._fields['doneDate']
         # Transmission might forget to set doneDate which is initialized to zero, so if doneDate is zero return None
         if done_date == 0:
             return None
@@ -242,7 +268,7 @@ class Torrent(object):
         * If eta is -2 the result is 'unknown'
         * Otherwise eta is formatted as <days> <hours>:<minutes>:<seconds>.
         """
-        eta = self._fields['eta'].value
+        eta = self._fields['eta']
         if eta == -1:
             return 'not available'
         elif eta == -2:
@@ -255,8 +281,8 @@ class Torrent(object):
         Get the download limit.
         Can be a number or None.
         """
-        if self._fields['downloadLimited'].value:
-            return self._fields['downloadLimit'].value
+        if self._fields['downloadLimited']:
+            return self._fields['downloadLimit']
         else:
             return None
 
@@ -266,11 +292,11 @@ class Torrent(object):
         Can be a number, 'session' or None.
         """
         if isinstance(limit, integer_types):
-            self._fields['downloadLimited'] = Field(True, True)
-            self._fields['downloadLimit'] = Field(limit, True)
+            self._set('downloadLimited', True)
+            self._set('downloadLimit', limit)
             self._push()
         elif limit == None:
-            self._fields['downloadLimited'] = Field(False, True)
+            self._set('downloadLimited', False)
             self._push()
         else:
             raise ValueError("Not a valid limit")
@@ -281,14 +307,14 @@ class Torrent(object):
         """
         Get the peer limit.
         """
-        return self._fields['peer_limit'].value
+        return self._fields['peer_limit']
 
     def _set_peer_limit(self, limit):
         """
         Set the peer limit.
         """
         if isinstance(limit, integer_types):
-            self._fields['peer_limit'] = Field(limit, True)
+            self._set('peer_limit', limit)
             self._push()
         else:
             raise ValueError("Not a valid limit")
@@ -300,7 +326,7 @@ class Torrent(object):
         Get the priority as string.
         Can be one of 'low', 'normal', 'high'.
         """
-        return PRIORITY[self._fields['bandwidthPriority'].value]
+        return PRIORITY[self._fields['bandwidthPriority']]
 
     def _set_priority(self, priority):
         """
@@ -308,7 +334,7 @@ class Torrent(object):
         Can be one of 'low', 'normal', 'high'.
         """
         if isinstance(priority, string_types):
-            self._fields['bandwidthPriority'] = Field(PRIORITY[priority], True)
+            self._set('bandwidthPriority', PRIORITY[priority])
             self._push()
 
     priority = property(_get_priority, _set_priority, None
@@ -318,14 +344,14 @@ class Torrent(object):
         """
         Get the seed idle limit in minutes.
         """
-        return self._fields['seedIdleLimit'].value
+        return self._fields['seedIdleLimit']
 
     def _set_seed_idle_limit(self, limit):
         """
         Set the seed idle limit in minutes.
         """
         if isinstance(limit, integer_types):
-            self._fields['seedIdleLimit'] = Field(limit, True)
+            self._set('seedIdleLimit', limit)
             self._push()
         else:
             raise ValueError("Not a valid limit")
@@ -337,14 +363,14 @@ class Torrent(object):
         """
         Get the seed ratio mode as string. Can be one of 'global', 'single' or 'unlimited'.
         """
-        return IDLE_LIMIT[self._fields['seedIdleMode'].value]
+        return IDLE_LIMIT[self._fields['seedIdleMode']]
 
     def _set_seed_idle_mode(self, mode):
         """
         Set the seed ratio mode as string. Can be one of 'global', 'single' or 'unlimited'.
         """
         if isinstance(mode, str):
-            self._fields['seedIdleMode'] = Field(IDLE_LIMIT[mode], True)
+            self._set('seedIdleMode', IDLE_LIMIT[mode])
             self._push()
         else:
             raise ValueError("Not a valid limit")
@@ -365,14 +391,14 @@ class Torrent(object):
         """
         Get the seed ratio limit as float.
         """
-        return float(self._fields['seedRatioLimit'].value)
+        return float(self._fields['seedRatioLimit'])
 
     def _set_seed_ratio_limit(self, limit):
         """
         Set the seed ratio limit as float.
         """
         if isinstance(limit, (integer_types, float)) and limit >= 0.0:
-            self._fields['seedRatioLimit'] = Field(float(limit), True)
+            self._set('seedRatioLimit', float(limit))
             self._push()
         else:
             raise ValueError("Not a valid limit")
@@ -384,14 +410,14 @@ class Torrent(object):
         """
         Get the seed ratio mode as string. Can be one of 'global', 'single' or 'unlimited'.
         """
-        return RATIO_LIMIT[self._fields['seedRatioMode'].value]
+        return RATIO_LIMIT[self._fields['seedRatioMode']]
 
     def _set_seed_ratio_mode(self, mode):
         """
         Set the seed ratio mode as string. Can be one of 'global', 'single' or 'unlimited'.
         """
         if isinstance(mode, str):
-            self._fields['seedRatioMode'] = Field(RATIO_LIMIT[mode], True)
+            self._set('seedRatioMode', RATIO_LIMIT[mode])
             self._push()
         else:
             raise ValueError("Not a valid limit")
@@ -413,8 +439,8 @@ class Torrent(object):
         Get the upload limit.
         Can be a number or None.
         """
-        if self._fields['uploadLimited'].value:
-            return self._fields['uploadLimit'].value
+        if self._fields['uploadLimited']:
+            return self._fields['uploadLimit']
         else:
             return None
 
@@ -424,11 +450,11 @@ class Torrent(object):
         Can be a number, 'session' or None.
         """
         if isinstance(limit, integer_types):
-            self._fields['uploadLimited'] = Field(True, True)
-            self._fields['uploadLimit'] = Field(limit, True)
+            self._set('uploadLimited', True)
+            self._set('uploadLimit', limit)
             self._push()
         elif limit == None:
-            self._fields['uploadLimited'] = Field(False, True)
+            self._set('uploadLimited', False)
             self._push()
         else:
             raise ValueError("Not a valid limit")
@@ -438,7 +464,7 @@ class Torrent(object):
     def _get_queue_position(self):
         """Get the queue position for this torrent."""
         if self._rpc_version() >= 14:
-            return self._fields['queuePosition'].value
+            return self._fields['queuePosition']
         else:
             return 0
 
@@ -446,7 +472,7 @@ class Torrent(object):
         """Set the queue position for this torrent."""
         if self._rpc_version() >= 14:
             if isinstance(position, integer_types):
-                self._fields['queuePosition'] = Field(position, True)
+                self._set('queuePosition', position)
                 self._push()
             else:
                 raise ValueError("Not a valid position")
@@ -176,6 +176,14 @@ def get_arguments(method, rpc_version):
             accessible.append(argument)
     return accessible
 
+def truncate_dump(text, size=constants.DEBUG_DUMP_SIZE):
+    """
+    Cut text down to size for the debug log, noting how much was left out.
+    """
+    if len(text) <= size:
+        return text
+    return '%s... (%d more characters)' % (text[:size], len(text) - size)
+
 def is_logger_configured():
     """
     Check if there are any logging handlers.